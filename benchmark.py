@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+抢票流程基准测试 - 针对本地模拟服务器运行 查询 → 建立会话 → 预约 循环
+
+用法:
+    python benchmark.py                          # 自动启动内置模拟服务器
+    python benchmark.py --scenario booked -n 100
+    python benchmark.py --base-url http://127.0.0.1:8765   # 使用已启动的模拟服务器
+    python benchmark.py --replay fixtures/20250101_120000   # 回放 qiangpiao.py --record 录制的真实请求
+"""
+
+import sys
+import os
+import time
+import logging
+import argparse
+import statistics
+import tempfile
+from datetime import datetime, timedelta
+
+from mock_ehall import SCENARIOS, start_mock_server_thread
+
+
+def summarize(values):
+    """计算耗时分布（毫秒）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    p95_index = max(0, int(round(len(ordered) * 0.95)) - 1)
+    return {
+        'count': len(ordered),
+        'mean': statistics.mean(ordered) * 1000,
+        'p50': statistics.median(ordered) * 1000,
+        'p95': ordered[p95_index] * 1000,
+        'max': ordered[-1] * 1000
+    }
+
+
+def run_benchmark(base_url, iterations, book_delay=0.0, replay_dir=None, replay_speed=1.0):
+    """运行基准测试，返回各阶段耗时和请求统计"""
+    from qiangpiao import (CONFIG, session, session_context, get_available_slots, book_slot,
+                           start_request_replay)
+    from history_store import history_store
+
+    # 压低日志输出（需在qiangpiao完成日志配置之后），避免控制台I/O影响测量
+    logging.getLogger().setLevel(logging.WARNING)
+
+    CONFIG['BASE_URL'] = base_url
+    if replay_dir:
+        # 回放按URL路径匹配样本，与BASE_URL无关
+        start_request_replay(replay_dir, replay_speed)
+    CONFIG['BOOK_DELAY'] = book_delay
+    CONFIG['TARGET_DATE'] = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    session_context.invalidate()
+
+    # 历史记录写入临时数据库，既计入写入开销又不污染真实的抢票历史
+    history_dir = tempfile.mkdtemp(prefix='qiangpiao_bench_')
+    history_store.close()
+    original_history_path = history_store.path
+    history_store.path = os.path.join(history_dir, 'booking_history.db')
+
+    # 通过响应钩子统计请求数
+    request_count = [0]
+    def count_response(resp, *args, **kwargs):
+        request_count[0] += 1
+    session.hooks['response'].append(count_response)
+
+    phases = {'query': [], 'session_setup': [], 'booking': []}
+    iteration_wall = []
+    iteration_cpu = []
+    booking_attempts = 0
+    successes = 0
+
+    try:
+        for _ in range(iterations):
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+
+            t0 = time.perf_counter()
+            slots = get_available_slots()
+            phases['query'].append(time.perf_counter() - t0)
+
+            # 每个时间段选择优先级最高的场地
+            picked = {}
+            for slot in slots:
+                picked.setdefault(slot.time_slot, slot)
+
+            for slot in picked.values():
+                t0 = time.perf_counter()
+                session_context.get_token()
+                phases['session_setup'].append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                success = book_slot(slot)
+                phases['booking'].append(time.perf_counter() - t0)
+
+                booking_attempts += 1
+                if success:
+                    successes += 1
+
+            iteration_cpu.append(time.process_time() - cpu_start)
+            iteration_wall.append(time.perf_counter() - wall_start)
+    finally:
+        session.hooks['response'].remove(count_response)
+        history_store.close()
+        history_store.path = original_history_path
+
+    return {
+        'phases': {name: summarize(values) for name, values in phases.items()},
+        'iteration_wall': summarize(iteration_wall),
+        'iteration_cpu': summarize(iteration_cpu),
+        'iterations': iterations,
+        'requests': request_count[0],
+        'booking_attempts': booking_attempts,
+        'successes': successes
+    }
+
+
+def print_report(result):
+    """打印基准测试报告"""
+    print("\n📊 各阶段耗时 (ms)")
+    print(f"   {'阶段':<16}{'次数':>8}{'平均':>10}{'P50':>10}{'P95':>10}{'最大':>10}")
+    rows = list(result['phases'].items()) + [
+        ('iteration_wall', result['iteration_wall']),
+        ('iteration_cpu', result['iteration_cpu'])
+    ]
+    for name, stats in rows:
+        if not stats:
+            print(f"   {name:<16}{0:>8}{'-':>10}{'-':>10}{'-':>10}{'-':>10}")
+            continue
+        print(f"   {name:<16}{stats['count']:>8}{stats['mean']:>10.2f}{stats['p50']:>10.2f}"
+              f"{stats['p95']:>10.2f}{stats['max']:>10.2f}")
+
+    print("\n📈 请求统计")
+    print(f"   循环次数: {result['iterations']}")
+    print(f"   HTTP请求总数: {result['requests']}")
+    print(f"   预约尝试: {result['booking_attempts']}  成功: {result['successes']}")
+    if result['successes']:
+        print(f"   每次成功预约的请求数: {result['requests'] / result['successes']:.2f}")
+    else:
+        print("   每次成功预约的请求数: - (无成功预约)")
+    print(f"   每次循环请求数: {result['requests'] / max(1, result['iterations']):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抢票流程基准测试')
+    parser.add_argument('--base-url', help='已运行的模拟服务器地址，不指定时自动启动内置服务器')
+    parser.add_argument('--scenario', default='available', choices=sorted(SCENARIOS))
+    parser.add_argument('-n', '--iterations', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='内置服务器的模拟延迟（秒）')
+    parser.add_argument('--book-delay', type=float, default=0.0, help='预约前延迟（秒），默认0以只测量程序本身')
+    parser.add_argument('--replay', help='回放录制样本目录中的请求（qiangpiao.py --record），不启动模拟服务器')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='回放速度倍数，0表示不等待原始耗时')
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.replay:
+        base_url = base_url or 'https://ehall.szu.edu.cn'
+    elif not base_url:
+        server, base_url = start_mock_server_thread(scenario=args.scenario, latency=args.latency)
+
+    print("🏁 抢票流程基准测试")
+    print("=" * 60)
+    if args.replay:
+        print(f"📼 回放: {args.replay}  速度: x{args.replay_speed}")
+    else:
+        print(f"🌐 服务器: {base_url}" + (f"  场景: {args.scenario}" if server else ""))
+    print(f"🔄 循环次数: {args.iterations}")
+
+    try:
+        result = run_benchmark(base_url, args.iterations, args.book_delay, args.replay, args.replay_speed)
+        print_report(result)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,65 @@
 # 配置文件
+# 这里是默认配置。通过Web界面修改的配置保存在 config.json（只保存与默认值不同的项），
+# 运行中的程序在下一次循环时自动加载，无需重启；校园网账户单独保存在 account.json。
+import os
+import re
+import copy
+import json
+import tempfile
+import threading
 from datetime import datetime, timedelta
 
-current_date = datetime.now()
-# 计算目标日期（当前日期 + 1 天）
-target_date = current_date + timedelta(days=1)
-# 格式化目标日期为字符串
-target_date = target_date.strftime('%Y-%m-%d')
+# 配置文件（相对于工作目录）
+CONFIG_FILE = 'config.json'
+ACCOUNT_FILE = 'account.json'
 
-# 基础配置
-CONFIG = {
+# 默认配置
+DEFAULT_CONFIG = {
     # 查询参数
     "XQ": "2",        # 校区：1=粤海, 2=丽湖
     "YYLX": "1.0",    # 预约类型
     "XMDM": "001",    # 项目代码：001=羽毛球  003=排球 004=网球 005=篮球 009=游泳 013=乒乓球 016=桌球
     
+    # 服务器地址（可改为本地模拟服务器或缓存代理，如 http://127.0.0.1:8765）
+    "BASE_URL": "https://ehall.szu.edu.cn",
+    # 接口路径（拼接在BASE_URL之后）
+    "ENDPOINTS": {
+        "index": "/qljfwapp/sys/lwSzuCgyy/index.do",                                  # 体育场馆预约主页
+        "query": "/qljfwapp/sys/lwSzuCgyy/modules/sportVenue/getOpeningRoom.do",      # 查询可用场地
+        "book": "/qljfwapp/sys/lwSzuCgyy/sportVenue/insertVenueBookingInfo.do"        # 提交预约
+    },
+    
     # 运行参数
     "MAX_RETRY_TIMES": 200,    # 最大重试次数
     "RETRY_INTERVAL": 1,       # 重试间隔（秒）
+    "SCHEDULER": "adaptive",   # 查询间隔策略：adaptive=自适应，fixed=固定RETRY_INTERVAL
+    "MAX_RETRY_INTERVAL": 30,  # 超时/403/5xx时指数退避的最长间隔（秒）
+    "IDLE_RETRY_INTERVAL": 10, # 所有时段都约满时逐步放宽到的最长间隔（秒）
+    "OPENING_TIME": "",        # 放票时间，如 "12:30:00"，为空则不启用
+    "OPENING_WINDOW": 60,      # 放票时间前后多少秒内使用短间隔
+    "OPENING_RETRY_INTERVAL": 0.5,  # 放票窗口内的查询间隔（秒）
     "REQUEST_TIMEOUT": 10,     # 请求超时时间（秒）
-    # 预约日期
-    "TARGET_DATE": "2025-05-27",
+    "SESSION_TTL": 300,        # 会话上下文（CSRF Token）缓存时间（秒）
+    "BOOK_DELAY": 0.5,         # 提交预约前的延迟（秒），模拟人工操作
+    "LOG_MAX_BYTES": 5242880,  # 日志文件轮转大小（字节），超过后切换到 qiangpiao.log.1
+    "LOG_BACKUP_COUNT": 3,     # 保留的历史日志文件数
+    # 自动获取Cookie时Chrome的用户数据目录，保留统一身份认证的登录状态以减少完整登录；为空则每次使用全新浏览器
+    "CHROME_PROFILE_DIR": "chrome_profile",
+    "CHROME_BLOCK_RESOURCES": True,  # 登录时不加载图片、字体、音视频（需要手动输入验证码时自动恢复）
+    "COOKIE_CHECK_INTERVAL": 600,    # 后台检查Cookie是否有效的间隔（秒，不小于60）
+    "COOKIE_AUTO_REFRESH": True,     # Cookie预计过期前或已失效时，用保存的校园网账户自动重新获取
+    # 预约日期，留空表示自动使用明天（跨天运行时自动更新）
+    "TARGET_DATE": "",
 
     # 优先预约的时段关键词（按优先级排序）
     "PREFERRED_TIMES": ['20:00-21:00', '21:00-22:00'],
     
+    # 场馆优先级：场馆代码（查询结果中的CGBM）-> 优先级，数字越小越优先；未列出的场馆排在最后
+    "VENUE_PRIORITY": {
+        "111": 0,   # 至快体育馆
+        "104": 1    # 至畅体育馆
+    },
+    
     # 用户信息配置
     "USER_INFO": {
         "YYRGH": "2300123999",  # 学号/工号
@@ -48,6 +84,12 @@ CAMPUS_CODES = {
     "丽湖": "2"
 }
 
+# 场馆代码映射（查询结果中的CGBM，预约时作为CGDM提交）
+VENUE_CODES = {
+    "至快体育馆": "111",
+    "至畅体育馆": "104"
+}
+
 # 可选时间段（每小时一个时段）
 TIME_SLOTS = [
     "08:00-09:00", "09:00-10:00", "10:00-11:00", "11:00-12:00",
@@ -56,20 +98,314 @@ TIME_SLOTS = [
     "20:00-21:00", "21:00-22:00"
 ]
 
-# 校园网账户
-CAMPUS_ACCOUNT = {
+# 校园网账户（默认值，实际保存在 account.json）
+DEFAULT_CAMPUS_ACCOUNT = {
     "username": "2300123999",  # 学号或工号
     "password": ""
 }
 
+
+class ConfigError(ValueError):
+    """配置校验失败"""
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_clock(value, formats=('%H:%M:%S', '%H:%M')):
+    """按给定格式之一解析 时:分[:秒]，返回datetime.time；无法解析或超出范围（如25:61）时抛出ValueError"""
+    if isinstance(value, str):
+        for fmt in formats:
+            try:
+                return datetime.strptime(value, fmt).time()
+            except ValueError:
+                pass
+    raise ValueError(f"无效的时间: {value!r}")
+
+
+def _is_clock(value):
+    try:
+        parse_clock(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_time_slot(value):
+    """HH:MM-HH:MM，两端都是有效时间且开始早于结束"""
+    if not isinstance(value, str) or re.match(r'^\d{2}:\d{2}-\d{2}:\d{2}$', value) is None:
+        return False
+    start, end = value.split('-')
+    try:
+        return parse_clock(start, ('%H:%M',)) < parse_clock(end, ('%H:%M',))
+    except ValueError:
+        return False
+
+
+def _is_date_or_auto(value):
+    if value in ("", "auto"):
+        return True
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+# 配置项校验规则：键 -> (检查函数, 说明)
+CONFIG_SCHEMA = {
+    "XQ": (lambda v: v in CAMPUS_CODES.values(), "校区代码"),
+    "YYLX": (lambda v: isinstance(v, str) and v != "", "预约类型"),
+    "XMDM": (lambda v: v in SPORT_CODES.values(), "项目代码"),
+    "BASE_URL": (lambda v: isinstance(v, str) and v.startswith(('http://', 'https://')), "以http://或https://开头的地址"),
+    "ENDPOINTS": (lambda v: isinstance(v, dict) and all(
+        isinstance(v.get(name), str) and v[name].startswith('/') for name in ("index", "query", "book")),
+        "包含index/query/book且以/开头的接口路径"),
+    "MAX_RETRY_TIMES": (lambda v: isinstance(v, int) and not isinstance(v, bool) and v >= 1, "不小于1的整数"),
+    "RETRY_INTERVAL": (lambda v: _is_number(v) and v > 0, "正数（秒）"),
+    "SCHEDULER": (lambda v: v in ("adaptive", "fixed"), "adaptive 或 fixed"),
+    "MAX_RETRY_INTERVAL": (lambda v: _is_number(v) and v > 0, "正数（秒）"),
+    "IDLE_RETRY_INTERVAL": (lambda v: _is_number(v) and v > 0, "正数（秒）"),
+    "OPENING_TIME": (lambda v: v == "" or _is_clock(v), "空或 HH:MM[:SS]"),
+    "OPENING_WINDOW": (lambda v: _is_number(v) and v >= 0, "非负数（秒）"),
+    "OPENING_RETRY_INTERVAL": (lambda v: _is_number(v) and v > 0, "正数（秒）"),
+    "REQUEST_TIMEOUT": (lambda v: _is_number(v) and v > 0, "正数（秒）"),
+    "SESSION_TTL": (lambda v: _is_number(v) and v >= 0, "非负数（秒）"),
+    "BOOK_DELAY": (lambda v: _is_number(v) and v >= 0, "非负数（秒）"),
+    "LOG_MAX_BYTES": (lambda v: isinstance(v, int) and not isinstance(v, bool) and v >= 0, "非负整数（字节）"),
+    "LOG_BACKUP_COUNT": (lambda v: isinstance(v, int) and not isinstance(v, bool) and v >= 0, "非负整数"),
+    "CHROME_PROFILE_DIR": (lambda v: isinstance(v, str), "目录路径或空"),
+    "CHROME_BLOCK_RESOURCES": (lambda v: isinstance(v, bool), "true 或 false"),
+    "COOKIE_CHECK_INTERVAL": (lambda v: _is_number(v) and v >= 60, "不小于60的数（秒）"),
+    "COOKIE_AUTO_REFRESH": (lambda v: isinstance(v, bool), "true 或 false"),
+    "TARGET_DATE": (_is_date_or_auto, "空（自动使用明天）或 YYYY-MM-DD"),
+    "PREFERRED_TIMES": (lambda v: isinstance(v, list) and len(v) > 0 and all(_is_time_slot(t) for t in v),
+                        "非空的 HH:MM-HH:MM 列表（开始早于结束）"),
+    "VENUE_PRIORITY": (lambda v: isinstance(v, dict) and all(
+        isinstance(code, str) and isinstance(p, int) and not isinstance(p, bool) for code, p in v.items()),
+        "场馆代码到整数优先级的对象"),
+    "USER_INFO": (lambda v: isinstance(v, dict) and isinstance(v.get("YYRGH"), str) and isinstance(v.get("YYRXM"), str),
+                  "包含YYRGH和YYRXM的对象"),
+}
+
+
+def validate_config(config):
+    """校验配置，返回错误信息列表（为空表示通过）"""
+    errors = []
+    for key, value in config.items():
+        rule = CONFIG_SCHEMA.get(key)
+        if rule is None:
+            errors.append(f"未知配置项: {key}")
+            continue
+        check, description = rule
+        try:
+            valid = check(value)
+        except Exception:
+            valid = False
+        if not valid:
+            errors.append(f"{key} 无效: {value!r}，应为{description}")
+    return errors
+
+
+def resolve_target_date(value):
+    """TARGET_DATE为空或auto时返回明天的日期"""
+    if value in ("", "auto", None):
+        return (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    return value
+
+
+def atomic_write_json(path, data, private=False):
+    """写入JSON文件：先写同目录的临时文件再原子替换，读取方不会读到写入一半的文件
+    
+    mkstemp创建的文件权限为0600，private=False时放宽为0644（凭证类文件使用private=True）
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}_', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        if not private:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# 按键合并的嵌套配置段（键固定，config.json 中只需写要改的键）；
+# 其他字典类配置（如 VENUE_PRIORITY）是完整的映射表，整体替换，用户可以删除或调低默认表中的项
+MERGED_SECTIONS = ("ENDPOINTS", "USER_INFO")
+
+
+class ConfigStore:
+    """JSON配置存储：启动时加载，之后仅在文件mtime变化时重新读取并校验
+    
+    生效的配置 = DEFAULT_CONFIG + config.json 中的覆盖项，原地更新到 CONFIG，
+    其他模块通过 from config import CONFIG 拿到的字典会自动看到新值。
+    """
+    
+    def __init__(self, path, defaults, target):
+        self.path = path
+        self.defaults = defaults
+        self.target = target
+        self._lock = threading.Lock()
+        self._mtime = -1  # 尚未加载，保证首次refresh时应用默认值
+        self._overrides = {}
+        self._auto_date_for = None
+    
+    def _merge(self, overrides):
+        merged = copy.deepcopy(self.defaults)
+        for key, value in overrides.items():
+            if key in MERGED_SECTIONS and isinstance(merged.get(key), dict) and isinstance(value, dict):
+                merged[key].update(value)
+            else:
+                merged[key] = value
+        return merged
+    
+    def _apply(self, overrides):
+        """校验并应用覆盖项（调用方需持有锁），校验失败时抛出ConfigError"""
+        merged = self._merge(overrides)
+        errors = validate_config(merged)
+        if errors:
+            raise ConfigError('；'.join(errors))
+        self._auto_date_for = datetime.now().date() if self.is_target_date_auto(merged) else None
+        merged["TARGET_DATE"] = resolve_target_date(merged["TARGET_DATE"])
+        # 逐项更新而不是先清空，其他线程不会读到缺少键的配置
+        self.target.update(merged)
+        self._overrides = overrides
+    
+    @staticmethod
+    def is_target_date_auto(config):
+        return config.get("TARGET_DATE") in ("", "auto", None)
+    
+    def target_date_is_auto(self):
+        """当前是否自动使用明天作为预约日期"""
+        with self._lock:
+            return self._auto_date_for is not None
+    
+    def refresh(self):
+        """文件变化时重新加载；自动日期跨天时更新TARGET_DATE。返回配置是否有变化"""
+        with self._lock:
+            changed = False
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            
+            if mtime != self._mtime:
+                overrides = {}
+                if mtime is not None:
+                    try:
+                        with open(self.path, 'r', encoding='utf-8') as f:
+                            overrides = json.load(f)
+                        if not isinstance(overrides, dict):
+                            raise ValueError("顶层必须是对象")
+                    except (OSError, ValueError) as e:
+                        # 文件损坏时保留当前配置，不影响正在运行的程序
+                        print(f"配置存储: 读取 {self.path} 失败 {e}，继续使用当前配置")
+                        self._mtime = mtime
+                        return False
+                try:
+                    self._apply(overrides)
+                    changed = True
+                except ConfigError as e:
+                    print(f"配置存储: {self.path} 校验失败 {e}，继续使用当前配置")
+                self._mtime = mtime
+            
+            today = datetime.now().date()
+            if self._auto_date_for is not None and self._auto_date_for != today:
+                self._auto_date_for = today
+                self.target["TARGET_DATE"] = resolve_target_date("")
+                changed = True
+            return changed
+    
+    def snapshot(self):
+        """当前生效配置的深拷贝；与原地更新互斥，不会拿到更新到一半的配置"""
+        with self._lock:
+            return copy.deepcopy(self.target)
+    
+    def update(self, changes):
+        """校验并保存配置修改（只保存与默认值不同的项），立即生效；校验失败时抛出ConfigError"""
+        with self._lock:
+            overrides = dict(self._overrides)
+            for key, value in changes.items():
+                if key in MERGED_SECTIONS and isinstance(self.defaults.get(key), dict) and isinstance(value, dict):
+                    value = {**overrides.get(key, {}), **value}
+                overrides[key] = value
+            overrides = {key: value for key, value in overrides.items() if self.defaults.get(key) != value}
+            
+            self._apply(overrides)
+            atomic_write_json(self.path, overrides)
+            self._mtime = os.stat(self.path).st_mtime_ns
+        return True
+
+
+class AccountStore:
+    """校园网账户存储：单独的JSON文件，权限0600（仅当前用户可读写）"""
+    
+    def __init__(self, path, target):
+        self.path = path
+        self.target = target
+        self._lock = threading.Lock()
+        self._mtime = None
+    
+    def refresh(self):
+        """文件变化时重新读取到 target"""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.target["username"] = str(data.get("username", ""))
+                self.target["password"] = str(data.get("password", ""))
+            except (OSError, ValueError) as e:
+                print(f"账户存储: 读取 {self.path} 失败 {e}")
+            self._mtime = mtime
+    
+    def save(self, username, password):
+        with self._lock:
+            atomic_write_json(self.path, {"username": username, "password": password}, private=True)
+            self._mtime = os.stat(self.path).st_mtime_ns
+            self.target["username"] = username
+            self.target["password"] = password
+        return True
+
+
+# 生效的配置（默认值 + config.json），其他模块通过 from config import CONFIG 使用
+CONFIG = copy.deepcopy(DEFAULT_CONFIG)
+CONFIG["TARGET_DATE"] = resolve_target_date(CONFIG["TARGET_DATE"])
+config_store = ConfigStore(CONFIG_FILE, DEFAULT_CONFIG, CONFIG)
+config_store.refresh()
+
+# 校园网账户（内存副本，来自 account.json）
+CAMPUS_ACCOUNT = copy.deepcopy(DEFAULT_CAMPUS_ACCOUNT)
+account_store = AccountStore(ACCOUNT_FILE, CAMPUS_ACCOUNT)
+account_store.refresh()
+
 # 导出配置供其他模块使用
+def ehall_url(name=None):
+    """获取接口完整URL，name为ENDPOINTS中的键，不指定时返回服务器根地址"""
+    base_url = CONFIG["BASE_URL"].rstrip('/')
+    if name is None:
+        return base_url
+    return base_url + CONFIG["ENDPOINTS"][name]
+
 def get_campus_account():
     """获取校园网账户信息"""
+    account_store.refresh()
     return CAMPUS_ACCOUNT.copy()
 
 def update_campus_account(username, password):
-    """更新校园网账户信息"""
-    global CAMPUS_ACCOUNT
-    CAMPUS_ACCOUNT["username"] = username
-    CAMPUS_ACCOUNT["password"] = password
-    return True
+    """更新校园网账户信息并保存到 account.json"""
+    return account_store.save(username, password)
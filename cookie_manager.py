@@ -4,22 +4,12 @@ import os
 import time
 from datetime import datetime
 import requests
-import urllib3
 import logging
 
-# 禁用SSL警告
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# 导入配置和session
-try:
-    from qiangpiao import session, headers, CONFIG
-except ImportError:
-    # 如果无法导入，创建基本的session
-    session = requests.Session()
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
-    }
-    CONFIG = {"REQUEST_TIMEOUT": 10}
+from config import ehall_url
+from cookie_store import cookie_store
+# 与抢票脚本、Web界面共用同一个会话工厂（SSL适配器、默认请求头、连接池）
+from http_session import session_with_cookies, PAGE_HEADERS
 
 def extract_cookies_from_text(cookie_text):
     """从文本中提取并解析Cookie"""
@@ -95,20 +85,11 @@ def test_cookie_validity(cookies_dict):
     print(f"Cookie管理器: 开始测试Cookie有效性，共 {len(cookies_dict)} 个字段")
     
     try:
-        # 创建测试用的headers
-        test_headers = headers.copy()
-        test_headers.update({
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Cache-Control": "no-cache",
-            "Pragma": "no-cache"
-        })
-        
+        # 使用独立的Cookie罐测试，不影响正在使用的Cookie
         print("Cookie管理器: 发送测试请求...")
-        resp = session.get(
-            "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do",
-            headers=test_headers,
-            cookies=cookies_dict,
-            verify=False,
+        resp = session_with_cookies(cookies_dict).get(
+            ehall_url("index"),
+            headers=PAGE_HEADERS,
             timeout=15,
             allow_redirects=True
         )
@@ -170,61 +151,12 @@ def test_cookie_validity(cookies_dict):
         return False, f"测试失败: {str(e)}"
 
 def update_cookie_in_file(new_cookie_text):
-    """更新文件中的Cookie"""
+    """更新Cookie存储"""
     try:
-        print(f"Cookie管理器: 开始更新Cookie到文件，长度: {len(new_cookie_text)}")
-        
-        # 读取原文件
-        try:
-            with open('qiangpiao.py', 'r', encoding='utf-8') as f:
-                content = f.read()
-            print("Cookie管理器: 成功读取qiangpiao.py")
-        except Exception as e:
-            print(f"Cookie管理器: 读取文件失败 {e}")
-            return False
-        
-        # 查找并替换cookie
-        start_marker = 'raw_cookie = """'
-        end_marker = '"""'
-        
-        start_idx = content.find(start_marker)
-        if start_idx == -1:
-            print("Cookie管理器: ❌ 未找到cookie起始位置")
-            return False
-        
-        start_idx += len(start_marker)
-        end_idx = content.find(end_marker, start_idx)
-        
-        if end_idx == -1:
-            print("Cookie管理器: ❌ 未找到cookie结束位置")
-            return False
-        
-        print(f"Cookie管理器: 找到Cookie位置 {start_idx}-{end_idx}")
-        
-        # 构造新内容
-        new_content = content[:start_idx] + '\n' + new_cookie_text + '\n' + content[end_idx:]
-        
-        # 写入新文件
-        try:
-            with open('qiangpiao.py', 'w', encoding='utf-8') as f:
-                f.write(new_content)
-            print("Cookie管理器: ✅ Cookie写入成功")
-        except Exception as e:
-            print(f"Cookie管理器: 写入失败 {e}")
-            return False
-        
-        # 验证写入结果
-        try:
-            with open('qiangpiao.py', 'r', encoding='utf-8') as f:
-                verify_content = f.read()
-            if new_cookie_text.strip() in verify_content:
-                print("Cookie管理器: ✅ Cookie更新验证成功")
-            else:
-                print("Cookie管理器: ⚠️ Cookie更新验证失败")
-        except Exception as e:
-            print(f"Cookie管理器: 验证失败 {e}")
+        print(f"Cookie管理器: 开始更新Cookie存储，长度: {len(new_cookie_text)}")
         
-        print("Cookie管理器: ✅ 更新完成")
+        cookie_store.save(new_cookie_text)
+        print(f"Cookie管理器: ✅ Cookie已写入 {cookie_store.path}")
         return True
         
     except Exception as e:
@@ -249,38 +181,30 @@ def check_and_suggest_update():
     print("🔍 Cookie状态检查")
     print("=" * 60)
     
-    # 从当前文件读取Cookie
+    # 从Cookie存储读取
     try:
-        with open('qiangpiao.py', 'r', encoding='utf-8') as f:
-            content = f.read()
+        current_cookie_text = cookie_store.get_text()
+        current_cookies = extract_cookies_from_text(current_cookie_text)
         
-        start_marker = 'raw_cookie = """'
-        end_marker = '"""'
+        print(f"当前Cookie包含 {len(current_cookies)} 个字段")
+        updated_at = cookie_store.get_updated_at()
+        if updated_at:
+            print(f"最后更新时间: {updated_at}")
         
-        start_idx = content.find(start_marker)
-        if start_idx != -1:
-            start_idx += len(start_marker)
-            end_idx = content.find(end_marker, start_idx)
-            if end_idx != -1:
-                current_cookie_text = content[start_idx:end_idx].strip()
-                current_cookies = extract_cookies_from_text(current_cookie_text)
-                
-                print(f"当前Cookie包含 {len(current_cookies)} 个字段")
-                
-                # 测试有效性
-                print("🧪 测试Cookie有效性...")
-                is_valid, message = test_cookie_validity(current_cookies)
-                
-                if is_valid:
-                    print(f"✅ {message}")
-                    print("💡 Cookie状态良好，无需更新")
-                    return True
-                else:
-                    print(f"❌ {message}")
-                    print("\n💡 建议操作:")
-                    print("1. 重新登录获取新Cookie")
-                    print("2. 运行 python cookie_manager.py update")
-                    return False
+        # 测试有效性
+        print("🧪 测试Cookie有效性...")
+        is_valid, message = test_cookie_validity(current_cookies)
+        
+        if is_valid:
+            print(f"✅ {message}")
+            print("💡 Cookie状态良好，无需更新")
+            return True
+        else:
+            print(f"❌ {message}")
+            print("\n💡 建议操作:")
+            print("1. 重新登录获取新Cookie")
+            print("2. 运行 python cookie_manager.py update")
+            return False
     
     except Exception as e:
         print(f"❌ 检查失败: {e}")
@@ -0,0 +1,320 @@
+# Cookie健康检查 - 后台低频检查登录状态，记录每组Cookie的获取时间和最后有效时间，
+# 学习Cookie的典型有效期，在预计过期前通过自动获取Cookie的流程刷新
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+from config import atomic_write_json
+
+# 健康记录文件（相对于工作目录，与cookies.json同级）
+HEALTH_FILE = 'cookie_health.json'
+
+# 保留的有效期样本数
+MAX_SAMPLES = 20
+
+# 至少观察到几次真实过期后才按估计的有效期提前刷新（一两个样本的中位数不可靠）
+MIN_EXPIRED_SAMPLES = 3
+
+# 每隔多少组Cookie让一组不提前刷新、一直用到过期，持续获得真实过期样本
+EXPLORE_EVERY = 5
+
+# 启动后首次检查前的等待时间（秒），不与启动争抢资源
+STARTUP_DELAY = 30
+
+# 两次检查之间的最短间隔（秒），保证低频
+MIN_CHECK_INTERVAL = 60
+
+# 自动刷新失败后，至少间隔多久再尝试（秒）
+REFRESH_RETRY_GAP = 1800
+
+
+def cookie_fingerprint(cookie_text):
+    """Cookie字符串的指纹，用于区分不同的Cookie组；空Cookie返回None"""
+    if not cookie_text:
+        return None
+    return hashlib.blake2b(cookie_text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def estimate_lifetime(samples):
+    """按Kaplan-Meier估计有效期的中位数（秒），观察到的过期样本不足时返回None
+
+    samples: [(时长, 是否删失)]。删失样本是过期前就被替换（如提前刷新）的Cookie，
+    只知道有效期比这更长：丢弃它们会让估计偏短，当作过期处理则更短。
+    """
+    if sum(1 for _, censored in samples if not censored) < MIN_EXPIRED_SAMPLES:
+        return None
+    survival = 1.0
+    at_risk = len(samples)
+    # 时长相同时先处理过期样本（删失样本在该时刻仍视为有效）
+    for duration, censored in sorted(samples):
+        if not censored:
+            survival *= 1 - 1 / at_risk
+            if survival <= 0.5:
+                return duration
+        at_risk -= 1
+    return None
+
+
+def _format_time(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _parse_time(text):
+    try:
+        return datetime.strptime(text, '%Y-%m-%d %H:%M:%S').timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class CookieMonitor:
+    """Cookie健康检查线程
+
+    check() 返回 True（有效）/ False（已失效）/ None（网络错误等，无法判断）；
+    refresh() 返回 (是否成功, 消息)。
+
+    有效期样本：
+    - 检查发现过期时，取最后一次有效和首次失效两次检查的中点（真实过期时刻只能精确到一个检查间隔）；
+    - 过期前就被替换的Cookie（提前刷新、手动更新）记为删失样本：只知道有效期不短于最后一次检查有效的时长。
+    用 estimate_lifetime 估计典型有效期，在 获取时间 + 典型有效期 之前触发刷新。
+
+    局限：提前刷新的Cookie观察不到真正的过期时间，一旦开始提前刷新，新样本大多是删失的，
+    估计会偏保守且难以跟上服务器策略的变化。因此每 EXPLORE_EVERY 组Cookie中有一组不提前刷新、
+    一直用到检查发现过期（随后立即刷新），代价是这组Cookie过期到刷新完成之间会短暂不可用。
+    """
+
+    def __init__(self, store, check, refresh, config, path=HEALTH_FILE):
+        self.store = store
+        self.check = check
+        self.refresh = refresh
+        self.config = config
+        self.path = path
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._current = None
+        self._samples = []        # [(时长, 是否删失)]
+        self._cookie_count = 0    # 见过的Cookie组数，用于选出不提前刷新的组
+        self._next_check_at = 0.0
+        self._last_refresh_at = None
+        self._last_refresh_result = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Cookie监控: 读取 {self.path} 失败 {e}，重新开始记录")
+            return
+        self._current = data.get('current')
+        samples = [(float(duration), bool(censored)) for duration, censored in data.get('samples', [])]
+        # 兼容旧格式：lifetimes 中都是观察到过期的样本
+        samples += [(float(v), False) for v in data.get('lifetimes', [])]
+        self._samples = samples[-MAX_SAMPLES:]
+        self._cookie_count = int(data.get('cookie_count', 0))
+
+    def _save(self):
+        """保存健康记录（调用方需持有锁），写入失败不影响检查"""
+        try:
+            atomic_write_json(self.path, {
+                'current': self._current,
+                'samples': [list(sample) for sample in self._samples],
+                'cookie_count': self._cookie_count
+            })
+        except OSError as e:
+            print(f"Cookie监控: 写入 {self.path} 失败 {e}")
+
+    def check_interval(self):
+        return max(MIN_CHECK_INTERVAL, float(self.config.get("COOKIE_CHECK_INTERVAL", 600)))
+
+    def _add_sample(self, duration, censored):
+        """（调用方需持有锁）"""
+        self._samples.append((max(0.0, duration), censored))
+        self._samples = self._samples[-MAX_SAMPLES:]
+
+    def _sync_current(self, now):
+        """Cookie存储中的Cookie变化时开始记录新的一组（调用方需持有锁）"""
+        fingerprint = cookie_fingerprint(self.store.get_text())
+        current_fingerprint = self._current.get('fingerprint') if self._current else None
+        if fingerprint == current_fingerprint:
+            return
+        previous = self._current
+        if previous is not None and previous['expired_at'] is None and previous['last_valid_at'] is not None:
+            # 过期前被替换：有效期至少为最后一次检查有效的时长
+            self._add_sample(previous['last_valid_at'] - previous['obtained_at'], True)
+        if fingerprint is None:
+            self._current = None
+        else:
+            obtained_at = _parse_time(self.store.get_updated_at()) or now
+            self._cookie_count += 1
+            self._current = {
+                'fingerprint': fingerprint,
+                'obtained_at': obtained_at,
+                'last_valid_at': None,
+                'last_check_at': None,
+                'expired_at': None,
+                # 这一组不提前刷新，用到过期为止以获得真实过期样本
+                'explore': self._cookie_count % EXPLORE_EVERY == 0
+            }
+            # 新Cookie尽快检查一次
+            self._next_check_at = min(self._next_check_at, now + STARTUP_DELAY)
+        self._save()
+
+    def _lifetime(self):
+        """（调用方需持有锁）"""
+        return estimate_lifetime(self._samples)
+
+    def typical_lifetime(self):
+        """学习到的典型有效期（秒），样本不足时返回None"""
+        with self._lock:
+            return self._lifetime()
+
+    def _refresh_at(self):
+        """预计需要刷新的时间（调用方需持有锁）：已失效时为立即，否则为预计过期前留出两次检查间隔"""
+        if self._current is None:
+            return None
+        if self._current['expired_at'] is not None:
+            return self._current['expired_at']
+        if self._current.get('explore'):
+            return None
+        lifetime = self._lifetime()
+        if lifetime is None:
+            return None
+        return self._current['obtained_at'] + lifetime - 2 * self.check_interval()
+
+    def check_now(self):
+        """立即检查一次登录状态并更新记录，返回检查结果"""
+        with self._lock:
+            self._sync_current(time.time())
+            if self._current is None:
+                return None
+            fingerprint = self._current['fingerprint']
+
+        try:
+            result = self.check()
+        except Exception as e:
+            print(f"Cookie监控: 检查登录状态出错 {e}")
+            result = None
+
+        now = time.time()
+        with self._lock:
+            self._next_check_at = now + self.check_interval()
+            current = self._current
+            if current is None or current['fingerprint'] != fingerprint:
+                return result  # 检查期间Cookie已被替换
+            current['last_check_at'] = now
+            if result is True:
+                current['last_valid_at'] = now
+                current['expired_at'] = None
+            elif result is False and current['expired_at'] is None:
+                current['expired_at'] = now
+                # 获取后从未检查有效过的Cookie无法得到有效期样本
+                if current['last_valid_at'] is not None:
+                    expired_after = (current['last_valid_at'] + now) / 2
+                    self._add_sample(expired_after - current['obtained_at'], False)
+                print(f"Cookie监控: Cookie已失效（获取于 {_format_time(current['obtained_at'])}，"
+                      f"最后有效 {_format_time(current['last_valid_at']) or '未知'}）")
+            self._save()
+        return result
+
+    def _try_refresh(self, now):
+        """到达刷新时间时通过自动获取Cookie的流程刷新，失败后间隔 REFRESH_RETRY_GAP 再试"""
+        if not self.config.get("COOKIE_AUTO_REFRESH", True):
+            return
+        with self._lock:
+            refresh_at = self._refresh_at()
+            if refresh_at is None or now < refresh_at:
+                return
+            if self._last_refresh_at is not None and now - self._last_refresh_at < REFRESH_RETRY_GAP:
+                return
+            self._last_refresh_at = now
+
+        print("Cookie监控: Cookie即将过期或已失效，自动重新获取...")
+        try:
+            success, message = self.refresh()
+        except Exception as e:
+            success, message = False, f"自动刷新出错: {e}"
+        print(f"Cookie监控: {'✅' if success else '❌'} {message}")
+        with self._lock:
+            self._last_refresh_result = {'time': time.time(), 'success': success, 'message': message}
+            self._sync_current(time.time())
+
+    def run_once(self):
+        """执行一轮：同步当前Cookie，到期时检查，需要时刷新"""
+        now = time.time()
+        with self._lock:
+            self._sync_current(now)
+            has_cookie = self._current is not None
+            check_due = now >= self._next_check_at
+        if has_cookie and check_due:
+            self.check_now()
+        self._try_refresh(time.time())
+
+    def _seconds_until_next_run(self):
+        now = time.time()
+        with self._lock:
+            wake_at = self._next_check_at
+            refresh_at = self._refresh_at()
+        if refresh_at is not None and refresh_at > now:
+            wake_at = min(wake_at, refresh_at)
+        return min(self.check_interval(), max(MIN_CHECK_INTERVAL / 2, wake_at - now))
+
+    def _loop(self):
+        self._next_check_at = time.time() + STARTUP_DELAY
+        if self._stop_event.wait(STARTUP_DELAY):
+            return
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Cookie监控: 检查出错 {e}")
+            self._stop_event.wait(self._seconds_until_next_run())
+
+    def start(self):
+        """启动后台检查线程（已启动时忽略）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name='cookie-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def snapshot(self):
+        """当前健康状态（供 /api/cookie/health 使用）"""
+        with self._lock:
+            self._sync_current(time.time())
+            current = dict(self._current) if self._current else None
+            lifetime = self._lifetime()
+            refresh_at = self._refresh_at()
+            last_refresh = dict(self._last_refresh_result) if self._last_refresh_result else None
+            expired_samples = sum(1 for _, censored in self._samples if not censored)
+            censored_samples = len(self._samples) - expired_samples
+            next_check_at = self._next_check_at
+
+        if current is not None:
+            for key in ('obtained_at', 'last_valid_at', 'last_check_at', 'expired_at'):
+                current[key] = _format_time(current[key])
+            current['valid'] = current['expired_at'] is None if current['last_check_at'] else None
+            current['explore'] = bool(current.get('explore'))
+        if last_refresh is not None:
+            last_refresh['time'] = _format_time(last_refresh['time'])
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'current': current,
+            'typical_lifetime_seconds': None if lifetime is None else round(lifetime),
+            'lifetime_samples': expired_samples + censored_samples,
+            'expired_samples': expired_samples,
+            'censored_samples': censored_samples,
+            'refresh_at': _format_time(refresh_at),
+            'next_check_at': _format_time(next_check_at) if next_check_at else None,
+            'auto_refresh': bool(self.config.get("COOKIE_AUTO_REFRESH", True)),
+            'last_refresh': last_refresh
+        }
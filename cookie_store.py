@@ -0,0 +1,150 @@
+# Cookie存储 - 独立的JSON凭证文件，内存缓存 + 原子写入
+import os
+import json
+import threading
+from datetime import datetime
+
+from config import atomic_write_json
+
+# Cookie存储文件（相对于工作目录，与qiangpiao.py同级）
+COOKIE_FILE = 'cookies.json'
+
+
+def parse_cookie_text(cookie_text):
+    """将Cookie字符串解析为字典（静默版本，不打印调试信息）"""
+    cookies = {}
+    if not cookie_text:
+        return cookies
+
+    # 分号和换行都视为分隔符
+    for item in cookie_text.replace('\n', ';').split(';'):
+        item = item.strip()
+        if not item or item.startswith('#') or '=' not in item:
+            continue
+        key, value = item.split('=', 1)
+        key = key.strip()
+        value = value.strip()
+        if key and value:
+            cookies[key] = value
+    return cookies
+
+
+class CookieStore:
+    """Cookie存储：首次访问时加载到内存，仅在文件mtime变化时重新读取"""
+
+    def __init__(self, path=COOKIE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._data = {'cookie': '', 'updated_at': None}
+        self._cookies = {}
+
+    def _reload_if_changed(self):
+        """文件修改时间变化时重新加载（调用方需持有锁）"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            if self._mtime is not None:
+                self._mtime = None
+                self._data = {'cookie': '', 'updated_at': None}
+                self._cookies = {}
+            return
+
+        if mtime == self._mtime:
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # 文件损坏时保留内存中的旧值，不影响正在运行的程序
+            print(f"Cookie存储: 读取 {self.path} 失败 {e}")
+            return
+
+        self._mtime = mtime
+        self._data = {
+            'cookie': data.get('cookie', ''),
+            'updated_at': data.get('updated_at')
+        }
+        self._cookies = parse_cookie_text(self._data['cookie'])
+
+    def get_text(self):
+        """获取原始Cookie字符串"""
+        with self._lock:
+            self._reload_if_changed()
+            return self._data['cookie']
+
+    def get_cookies(self):
+        """获取解析后的Cookie字典（副本）"""
+        with self._lock:
+            self._reload_if_changed()
+            return dict(self._cookies)
+
+    def get_updated_at(self):
+        """获取Cookie最后更新时间字符串"""
+        with self._lock:
+            self._reload_if_changed()
+            return self._data['updated_at']
+
+    def save(self, cookie_text):
+        """保存Cookie，先写临时文件再原子替换，避免写入一半的文件"""
+        cookie_text = (cookie_text or '').strip()
+        data = {
+            'cookie': cookie_text,
+            'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        with self._lock:
+            # Cookie是登录凭证，保持0600权限
+            atomic_write_json(self.path, data, private=True)
+            self._mtime = os.stat(self.path).st_mtime_ns
+            self._data = data
+            self._cookies = parse_cookie_text(cookie_text)
+        return True
+
+    def clear(self):
+        """清空Cookie"""
+        return self.save('')
+
+
+class CookieHolder:
+    """线程安全的Cookie持有者：读取方拿到当前字典，更新时整体替换而不修改原字典
+
+    on_change(cookies) 在初始化和每次替换时调用（如同步到共享会话的Cookie罐）
+    """
+
+    def __init__(self, store, on_change=None):
+        self._store = store
+        self._lock = threading.Lock()
+        self._on_change = on_change
+        self._cookies = store.get_cookies()
+        if on_change:
+            on_change(self._cookies)
+
+    def get(self):
+        """获取当前Cookie字典（替换前不会被修改）"""
+        return self._cookies
+
+    def swap(self, cookies):
+        """原子替换当前Cookie字典"""
+        new_cookies = dict(cookies)
+        with self._lock:
+            self._cookies = new_cookies
+            if self._on_change:
+                self._on_change(new_cookies)
+        return new_cookies
+
+    def refresh(self):
+        """从存储重新同步（存储文件未变化时只有一次stat），返回是否有变化"""
+        cookies = self._store.get_cookies()
+        with self._lock:
+            if cookies == self._cookies:
+                return False
+            self._cookies = cookies
+            if self._on_change:
+                self._on_change(cookies)
+        return True
+
+
+# 全局共享的Cookie存储实例
+cookie_store = CookieStore()
@@ -9,11 +9,13 @@ import logging
 
 def suppress_ssl_warnings():
     """抑制SSL相关警告"""
-    try:
-        import urllib3
-        urllib3.disable_warnings()
-    except:
-        pass
+    # 只在urllib3已加载时处理，不为此提前导入requests/urllib3（qiangpiao导入时会自行禁用SSL警告）
+    urllib3 = sys.modules.get('urllib3')
+    if urllib3 is not None:
+        try:
+            urllib3.disable_warnings()
+        except Exception:
+            pass
     
     # 过滤Python警告
     warnings.filterwarnings("ignore", category=UserWarning)
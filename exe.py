@@ -3,6 +3,12 @@
 深大体育场馆预约系统 - 智能打包脚本
 自动检测Chrome版本并下载对应ChromeDriver
 支持Chrome 110-136版本
+
+用法:
+    python exe.py                          # 单文件exe（默认）
+    python exe.py --mode onedir            # 目录版，启动时无需解压，冷启动更快
+    python exe.py --mode both              # 两种都构建，比较体积和冷启动时间
+    python exe.py --exclude selenium       # 不打包Selenium（只手动输入Cookie），体积更小
 """
 
 import os
@@ -13,13 +19,73 @@ import urllib.request
 import zipfile
 import json
 import re
-import winreg
+import time
+import argparse
+import statistics
 from pathlib import Path
 
+try:
+    import winreg  # 仅Windows可用
+except ImportError:
+    winreg = None
+
+APP_NAME = '深大体育场馆预约系统'
+IS_WINDOWS = sys.platform == 'win32'
+DRIVER_NAME = 'chromedriver.exe' if IS_WINDOWS else 'chromedriver'
+
+# 打包模式：onefile 每次启动都要解压到临时目录；onedir 直接从目录加载，启动更快
+BUILD_MODES = ('onefile', 'onedir')
+
+# --exclude 可用的模块组，也可以直接写模块名
+EXCLUDE_GROUPS = {
+    'selenium': ['selenium', 'get_cookie', 'trio', 'trio_websocket', 'websocket'],  # 只使用手动输入Cookie
+    'tkinter': ['tkinter', '_tkinter'],
+    'test': ['unittest', 'doctest', 'test']
+}
+
+SELENIUM_HIDDEN_IMPORTS = [
+    'selenium',
+    'selenium.webdriver',
+    'selenium.webdriver.chrome',
+    'selenium.webdriver.chrome.service',
+    'selenium.webdriver.chrome.options',
+    'selenium.webdriver.common.by',
+    'selenium.webdriver.support.ui',
+    'selenium.webdriver.support.expected_conditions'
+]
+
+# 冷启动测量时等待的输出（start_web.py --startup-check）
+STARTUP_CHECK_MARKER = '启动检查完成'
+
+# 传给程序的启动时刻环境变量（与 start_web.LAUNCH_TIME_ENV 一致），--startup-profile 据此计入解释器启动和解压耗时
+LAUNCH_TIME_ENV = 'SZU_BOOKING_LAUNCH_TIME'
+
+def driver_platform():
+    """Chrome for Testing 下载地址中的平台名"""
+    if IS_WINDOWS:
+        return 'win32'
+    if sys.platform == 'darwin':
+        import platform
+        return 'mac-arm64' if platform.machine() == 'arm64' else 'mac-x64'
+    return 'linux64'
+
+def chrome_executable_paths():
+    """本机可能的Chrome可执行文件路径"""
+    if IS_WINDOWS:
+        return [
+            r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+            r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+            os.path.expanduser(r"~\AppData\Local\Google\Chrome\Application\chrome.exe")
+        ]
+    if sys.platform == 'darwin':
+        return ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"]
+    names = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser']
+    return [path for path in (shutil.which(name) for name in names) if path]
+
 def get_chrome_version():
     """获取本机Chrome浏览器版本"""
     try:
-        # 方法1: 从注册表获取Chrome版本
+        # 方法1: 从注册表获取Chrome版本（仅Windows）
         print("🔍 正在检测Chrome版本...")
         
         chrome_paths = [
@@ -29,7 +95,7 @@ def get_chrome_version():
             r"SOFTWARE\Wow6432Node\Microsoft\Windows\CurrentVersion\Uninstall\Google Chrome"
         ]
         
-        for path in chrome_paths:
+        for path in (chrome_paths if winreg else []):
             try:
                 with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path) as key:
                     version, _ = winreg.QueryValueEx(key, "version")
@@ -39,13 +105,7 @@ def get_chrome_version():
                 continue
         
         # 方法2: 通过Chrome可执行文件获取版本
-        chrome_exe_paths = [
-            r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-            r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-            os.path.expanduser(r"~\AppData\Local\Google\Chrome\Application\chrome.exe")
-        ]
-        
-        for chrome_path in chrome_exe_paths:
+        for chrome_path in chrome_executable_paths():
             if os.path.exists(chrome_path):
                 try:
                     result = subprocess.run([chrome_path, "--version"], 
@@ -125,6 +185,11 @@ def get_compatible_chromedriver_version(chrome_version):
         print(f"⚠️ 版本匹配失败: {e}")
         return "119.0.6045.105"  # 默认版本
 
+def make_executable(path):
+    """非Windows下为解压出的文件加上可执行权限"""
+    if not IS_WINDOWS:
+        os.chmod(path, os.stat(path).st_mode | 0o755)
+
 def download_chromedriver(version=None):
     """下载指定版本的ChromeDriver"""
     try:
@@ -132,7 +197,7 @@ def download_chromedriver(version=None):
         chrome_dir.mkdir(exist_ok=True)
         
         # 检查是否已存在
-        driver_path = chrome_dir / 'chromedriver.exe'
+        driver_path = chrome_dir / DRIVER_NAME
         if driver_path.exists():
             print("📁 发现已存在的ChromeDriver")
             
@@ -170,7 +235,14 @@ def download_chromedriver(version=None):
         major_version = version.split('.')[0]
         
         # Chrome 115+使用新的下载地址格式
-        if int(major_version) >= 115:
+        platform_name = driver_platform()
+        if not IS_WINDOWS:
+            # 非Windows只有Chrome for Testing提供对应平台的下载
+            download_urls = [
+                f"https://storage.googleapis.com/chrome-for-testing-public/{version}/{platform_name}/chromedriver-{platform_name}.zip",
+                f"https://edgedl.me.gvt1.com/edgedl/chrome/chrome-for-testing/{version}/{platform_name}/chromedriver-{platform_name}.zip"
+            ]
+        elif int(major_version) >= 115:
             download_urls = [
                 # 新的Chrome for Testing地址 (Chrome 115+)
                 f"https://storage.googleapis.com/chrome-for-testing-public/{version}/win32/chromedriver-win32.zip",
@@ -210,7 +282,7 @@ def download_chromedriver(version=None):
                     # 新版本可能在子目录中
                     extracted = False
                     for file_info in zip_ref.filelist:
-                        if file_info.filename.endswith('chromedriver.exe'):
+                        if os.path.basename(file_info.filename) == DRIVER_NAME:
                             # 直接提取到目标位置
                             with zip_ref.open(file_info.filename) as source:
                                 with open(driver_path, 'wb') as target:
@@ -223,7 +295,7 @@ def download_chromedriver(version=None):
                         # 如果没找到，解压所有文件然后查找
                         print("🔍 在解压文件中查找ChromeDriver...")
                         zip_ref.extractall(chrome_dir)
-                        for extracted_file in chrome_dir.rglob('chromedriver.exe'):
+                        for extracted_file in chrome_dir.rglob(DRIVER_NAME):
                             shutil.move(str(extracted_file), driver_path)
                             extracted = True
                             print(f"✅ 找到并移动ChromeDriver: {extracted_file}")
@@ -238,6 +310,7 @@ def download_chromedriver(version=None):
                         print(f"🧹 清理临时目录: {item.name}")
                 
                 if driver_path.exists():
+                    make_executable(driver_path)
                     print(f"✅ ChromeDriver {version} 下载完成")
                     success = True
                     break
@@ -279,6 +352,7 @@ def download_fallback_chromedriver(chrome_dir):
         print("📥 正在下载备用ChromeDriver...")
         
         # 使用稳定的备用下载地址 - 更新到较新的稳定版本
+        platform_name = driver_platform()
         fallback_urls = [
             # 最新稳定版本
             "https://storage.googleapis.com/chrome-for-testing-public/119.0.6045.105/win32/chromedriver-win32.zip",
@@ -288,8 +362,13 @@ def download_fallback_chromedriver(chrome_dir):
             # 更早的稳定版本
             "https://storage.googleapis.com/chrome-for-testing-public/114.0.5735.90/win32/chromedriver-win32.zip"
         ]
+        if not IS_WINDOWS:
+            fallback_urls = [
+                f"https://storage.googleapis.com/chrome-for-testing-public/119.0.6045.105/{platform_name}/chromedriver-{platform_name}.zip",
+                f"https://storage.googleapis.com/chrome-for-testing-public/136.0.7103.113/{platform_name}/chromedriver-{platform_name}.zip"
+            ]
         
-        driver_path = chrome_dir / 'chromedriver.exe'
+        driver_path = chrome_dir / DRIVER_NAME
         
         for i, url in enumerate(fallback_urls):
             try:
@@ -306,7 +385,7 @@ def download_fallback_chromedriver(chrome_dir):
                 with zipfile.ZipFile(zip_path, 'r') as zip_ref:
                     # 查找ChromeDriver
                     for file_info in zip_ref.filelist:
-                        if file_info.filename.endswith('chromedriver.exe'):
+                        if os.path.basename(file_info.filename) == DRIVER_NAME:
                             with zip_ref.open(file_info.filename) as source:
                                 with open(driver_path, 'wb') as target:
                                     shutil.copyfileobj(source, target)
@@ -314,13 +393,14 @@ def download_fallback_chromedriver(chrome_dir):
                     else:
                         # 解压所有文件并查找
                         zip_ref.extractall(chrome_dir)
-                        for extracted_file in chrome_dir.rglob('chromedriver.exe'):
+                        for extracted_file in chrome_dir.rglob(DRIVER_NAME):
                             shutil.move(str(extracted_file), driver_path)
                             break
                 
                 zip_path.unlink()
                 
                 if driver_path.exists():
+                    make_executable(driver_path)
                     print("✅ 备用ChromeDriver下载成功")
                     # 清理临时文件夹
                     for item in chrome_dir.iterdir():
@@ -341,13 +421,7 @@ def download_fallback_chromedriver(chrome_dir):
 
 def check_chrome_installation():
     """检查Chrome浏览器是否安装"""
-    chrome_paths = [
-        r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-        r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-        os.path.expanduser(r"~\AppData\Local\Google\Chrome\Application\chrome.exe")
-    ]
-    
-    for path in chrome_paths:
+    for path in chrome_executable_paths():
         if os.path.exists(path):
             print(f"✅ 发现Chrome浏览器: {path}")
             return True
@@ -412,64 +486,77 @@ def clean_build():
     for spec_file in Path('.').glob('*.spec'):
         spec_file.unlink()
 
-def build_exe():
-    """构建exe文件"""
-    print("🔨 开始构建exe...")
+def resolve_excludes(names):
+    """把 --exclude 的模块组名展开为模块名列表（去重，保持顺序）"""
+    modules = []
+    for name in names or []:
+        for module in EXCLUDE_GROUPS.get(name, [name]):
+            if module not in modules:
+                modules.append(module)
+    return modules
+
+def artifact_paths(mode):
+    """构建产物路径：(整个产物, 可执行文件)
+
+    onefile 为 exe/dist/onefile/程序名；onedir 为 exe/dist/onedir/程序名/ 目录，可执行文件在其中
+    """
+    exe_name = APP_NAME + ('.exe' if IS_WINDOWS else '')
+    dist_dir = Path('exe') / 'dist' / mode
+    if mode == 'onedir':
+        bundle = dist_dir / APP_NAME
+        return bundle, bundle / exe_name
+    return dist_dir / exe_name, dist_dir / exe_name
+
+def build_exe(mode='onefile', excludes=None):
+    """构建exe文件
+
+    mode: onefile（单文件）或 onedir（目录）；excludes: 不打包的模块
+    """
+    print(f"🔨 开始构建exe（{mode}）...")
+    excludes = excludes or []
+    with_selenium = 'selenium' not in excludes
     
     # 增强的PyInstaller命令
     cmd = [
         'pyinstaller',
-        '--onefile',                      # 单文件
+        f'--{mode}',                      # 单文件 / 目录
         '--console',                      # 显示控制台
-        '--name=深大体育场馆预约系统',      # 程序名称
-        '--add-data=templates;templates', # 包含模板
-        '--add-data=chrome_driver;chrome_driver',  # 包含ChromeDriver
+        '--noconfirm',
+        f'--name={APP_NAME}',             # 程序名称
+        f'--distpath={Path("exe") / "dist" / mode}',
+        f'--workpath={Path("exe") / "build" / mode}',
+        f'--add-data=templates{os.pathsep}templates', # 包含模板
         '--hidden-import=flask',
         '--hidden-import=requests', 
         '--hidden-import=urllib3',
-        '--hidden-import=selenium',
-        '--hidden-import=selenium.webdriver',
-        '--hidden-import=selenium.webdriver.chrome',
-        '--hidden-import=selenium.webdriver.chrome.service',
-        '--hidden-import=selenium.webdriver.chrome.options',
-        '--hidden-import=selenium.webdriver.common.by',
-        '--hidden-import=selenium.webdriver.support.ui',
-        '--hidden-import=selenium.webdriver.support.expected_conditions',
         '--collect-all=flask',
         '--collect-all=jinja2',
-        '--collect-all=selenium',
         'start_web.py'                    # 入口文件
     ]
     
+    if with_selenium:
+        cmd[-1:-1] = [f'--hidden-import={module}' for module in SELENIUM_HIDDEN_IMPORTS]
+        cmd.insert(-1, '--collect-all=selenium')
+        if os.path.exists('chrome_driver'):
+            cmd.insert(-1, f'--add-data=chrome_driver{os.pathsep}chrome_driver')  # 包含ChromeDriver
+    
+    for module in excludes:
+        cmd.insert(-1, f'--exclude-module={module}')
+    
     # 可选功能
     if os.path.exists('static'):
-        cmd.insert(-1, '--add-data=static;static')
+        cmd.insert(-1, f'--add-data=static{os.pathsep}static')
     
     if os.path.exists('icon.ico'):
         cmd.insert(-1, '--icon=icon.ico')
     
+    if excludes:
+        print(f"🚫 排除模块: {', '.join(excludes)}")
     print(f"🔧 执行PyInstaller...")
     
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
         print("✅ 构建成功!")
-        
-        # 创建exe目录并移动构建文件
-        exe_dir = Path('exe')
-        exe_dir.mkdir(exist_ok=True)
-        
-        if os.path.exists('build'):
-            if (exe_dir / 'build').exists():
-                shutil.rmtree(exe_dir / 'build')
-            shutil.move('build', exe_dir / 'build')
-            print("📁 移动 build 目录到 exe/")
-        
-        if os.path.exists('dist'):
-            if (exe_dir / 'dist').exists():
-                shutil.rmtree(exe_dir / 'dist')
-            shutil.move('dist', exe_dir / 'dist')
-            print("📁 移动 dist 目录到 exe/")
-        
         return True
     except subprocess.CalledProcessError as e:
         print(f"❌ 构建失败: {e}")
@@ -480,36 +567,114 @@ def build_exe():
                     print(f"   {line}")
         return False
 
-def create_release():
-    """创建发布包"""
+def format_size(size):
+    if size > 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f} MB"
+    elif size > 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size} B"
+
+def bundle_size(path):
+    """产物体积：(总字节数, 文件数)"""
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size, 1
+    files = [item for item in path.rglob('*') if item.is_file()]
+    return sum(item.stat().st_size for item in files), len(files)
+
+def measure_cold_start(executable, runs=3, timeout=60):
+    """启动构建好的程序（--startup-check），测量从进程创建到完成启动的时间
+
+    第一次运行最接近冷启动（磁盘缓存未命中、onefile首次解压），之后几次取中位数。
+    返回每次的秒数列表，启动失败的运行不计入。
+    """
+    import threading
+    executable = Path(executable).resolve()
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+    timings = []
+    for i in range(runs):
+        env[LAUNCH_TIME_ENV] = repr(time.time())
+        started = time.perf_counter()
+        try:
+            proc = subprocess.Popen([str(executable), '--startup-check'], cwd=str(executable.parent),
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, env=env)
+        except OSError as e:
+            print(f"⚠️ 无法启动 {executable}: {e}")
+            return timings
+        elapsed = None
+        # 超时仍未退出时结束进程（readline 会一直阻塞到进程输出或退出）
+        killer = threading.Timer(timeout, proc.kill)
+        killer.start()
+        try:
+            for line in iter(proc.stdout.readline, b''):
+                if STARTUP_CHECK_MARKER in line.decode('utf-8', errors='replace'):
+                    elapsed = time.perf_counter() - started
+                    break
+            proc.stdout.read()
+            proc.wait()
+        finally:
+            killer.cancel()
+            proc.stdout.close()
+        if elapsed is None:
+            print(f"⚠️ 第{i + 1}次启动未完成（退出码 {proc.returncode}）")
+            continue
+        timings.append(elapsed)
+        print(f"   第{i + 1}次启动: {elapsed:.2f}秒")
+    return timings
+
+def report_builds(results):
+    """打印各构建产物的体积和冷启动时间"""
+    print("\n📊 构建产物对比")
+    print("-" * 60)
+    print(f"   {'模式':<10}{'体积':>12}{'文件数':>8}{'首次启动':>10}{'中位数':>10}")
+    for mode, result in results.items():
+        timings = result['timings']
+        first = f"{timings[0]:.2f}s" if timings else '-'
+        median = f"{statistics.median(timings):.2f}s" if timings else '-'
+        print(f"   {mode:<10}{format_size(result['size']):>12}{result['files']:>8}{first:>10}{median:>10}")
+    print("-" * 60)
+
+def fastest_mode(results):
+    """冷启动中位数最短的模式；都没有测量结果时优先目录版（不需要解压）"""
+    measured = {mode: statistics.median(r['timings']) for mode, r in results.items() if r['timings']}
+    if measured:
+        return min(measured, key=measured.get)
+    return 'onedir' if 'onedir' in results else next(iter(results))
+
+def create_release(mode='onefile', release_dir=None):
+    """创建发布包，返回发布包中的可执行文件路径（失败时返回None）"""
     exe_dir = Path('exe')
     exe_dir.mkdir(exist_ok=True)
     
-    release_dir = exe_dir / 'release'
+    release_dir = Path(release_dir) if release_dir else exe_dir / 'release'
     
     if release_dir.exists():
         shutil.rmtree(release_dir)
-    release_dir.mkdir()
+    release_dir.mkdir(parents=True)
     
-    # 复制exe文件
-    exe_file = exe_dir / 'dist' / '深大体育场馆预约系统.exe'
+    # 复制exe文件（目录版连同依赖目录一起复制）
+    bundle, exe_file = artifact_paths(mode)
     if not exe_file.exists():
         print("❌ 找不到生成的exe文件")
-        return False
+        return None
     
-    shutil.copy2(exe_file, release_dir)
-    exe_size = exe_file.stat().st_size / 1024 / 1024
-    print(f"📦 复制exe文件 ({exe_size:.1f} MB)")
+    if mode == 'onedir':
+        shutil.copytree(bundle, release_dir, dirs_exist_ok=True)
+    else:
+        shutil.copy2(exe_file, release_dir)
+    size, files = bundle_size(bundle)
+    print(f"📦 复制exe文件 ({format_size(size)}，{files}个文件)")
     
     # 复制必要的配置文件
-    config_files = ['config.py', 'qiangpiao.py', 'web_app.py', 'cookie_manager.py', 'start_web.py', 'get_cookie.py', 'error_filter.py']
+    config_files = ['config.py', 'qiangpiao.py', 'web_app.py', 'cookie_manager.py', 'cookie_store.py', 'history_store.py', 'poll_scheduler.py', 'metrics.py', 'cookie_monitor.py', 'recorder.py', 'http_session.py', 'start_web.py', 'get_cookie.py', 'error_filter.py']
     for file in config_files:
         if os.path.exists(file):
             shutil.copy2(file, release_dir)
     
     # 复制模板目录
     if os.path.exists('templates'):
-        shutil.copytree('templates', release_dir / 'templates')
+        shutil.copytree('templates', release_dir / 'templates', dirs_exist_ok=True)
     
     # 创建便携启动脚本
     start_script = """@echo off
@@ -537,8 +702,14 @@ echo.
 pause
 """
     
-    with open(release_dir / '启动系统.bat', 'w', encoding='gbk') as f:
-        f.write(start_script)
+    if IS_WINDOWS:
+        with open(release_dir / '启动系统.bat', 'w', encoding='gbk') as f:
+            f.write(start_script)
+    else:
+        script_path = release_dir / '启动系统.sh'
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(f'#!/bin/sh\ncd "$(dirname "$0")"\nexec "./{APP_NAME}" "$@"\n')
+        make_executable(script_path)
     
     # 创建详细使用说明
     readme = """# 深大体育场馆预约系统 v1.0 - 智能版
@@ -590,7 +761,7 @@ pause
 - Chrome 110.x - ChromeDriver 110.0.5481.77
 
 ## 🔧 配置说明
-- 修改 config.py 设置学号、姓名等基本信息
+- 在网页配置页面设置学号、姓名等基本信息（保存到 config.json）
 - 在网页界面更新Cookie(自动获取或手动输入)
 - 所有配置都在网页界面完成，简单易用
 
@@ -607,6 +778,7 @@ pause
 - 防火墙提示请选择"允许访问"
 - Cookie获取时会弹出浏览器窗口，这是正常现象
 - 如遇企业微信验证码，请在浏览器中及时输入
+- 目录版(onedir)的 _internal 目录是程序依赖，请与exe放在一起，不要删除
 
 ## 🛠️ 故障排除
 如果遇到问题：
@@ -644,44 +816,58 @@ pause
     print("\n📂 发布包内容:")
     for item in release_dir.iterdir():
         if item.is_file():
-            size = item.stat().st_size
-            if size > 1024 * 1024:
-                size_str = f"{size / 1024 / 1024:.1f} MB"
-            elif size > 1024:
-                size_str = f"{size / 1024:.1f} KB"
-            else:
-                size_str = f"{size} B"
-            print(f"   📄 {item.name} ({size_str})")
+            print(f"   📄 {item.name} ({format_size(item.stat().st_size)})")
+        elif item.is_dir():
+            size, files = bundle_size(item)
+            print(f"   📁 {item.name}/ ({format_size(size)}，{files}个文件)")
     
-    return True
+    return release_dir / exe_file.name
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='深大体育场馆预约系统打包工具')
+    parser.add_argument('--mode', choices=BUILD_MODES + ('both',), default='onefile',
+                        help='onefile: 单文件（默认）；onedir: 目录版，启动不需要解压；both: 两种都构建并比较')
+    parser.add_argument('--exclude', action='append', default=[], metavar='模块',
+                        help=f"不打包的模块，可重复；模块组: {', '.join(EXCLUDE_GROUPS)}（selenium 为只使用手动Cookie）")
+    parser.add_argument('--runs', type=int, default=3, help='测量冷启动的次数（默认3，0为不测量）')
+    return parser.parse_args(argv)
 
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+    modes = list(BUILD_MODES) if args.mode == 'both' else [args.mode]
+    excludes = resolve_excludes(args.exclude)
+    with_selenium = 'selenium' not in excludes
+    
     print("🚀 深大体育场馆预约系统 v1.0 - 智能打包工具")
     print("=" * 60)
     print("🆕 支持Chrome 110-136版本(包括最新版本)")
+    print(f"📦 打包模式: {', '.join(modes)}")
     print("=" * 60)
     
     try:
-        # 1. 检查Chrome浏览器
-        print("\n🌐 检查Chrome浏览器...")
-        chrome_installed = check_chrome_installation()
-        
-        # 2. 检测Chrome版本并下载对应ChromeDriver
-        print("\n📱 智能下载ChromeDriver...")
-        chrome_version = get_chrome_version()
-        if chrome_version:
-            driver_version = get_compatible_chromedriver_version(chrome_version)
-            print(f"🎯 目标ChromeDriver版本: {driver_version}")
-        else:
-            driver_version = None
-            print("🎯 将下载通用版本ChromeDriver")
-        
-        if not download_chromedriver(driver_version):
-            if chrome_installed:
-                print("⚠️ ChromeDriver下载失败，但Chrome已安装，继续构建...")
+        if with_selenium:
+            # 1. 检查Chrome浏览器
+            print("\n🌐 检查Chrome浏览器...")
+            chrome_installed = check_chrome_installation()
+            
+            # 2. 检测Chrome版本并下载对应ChromeDriver
+            print("\n📱 智能下载ChromeDriver...")
+            chrome_version = get_chrome_version()
+            if chrome_version:
+                driver_version = get_compatible_chromedriver_version(chrome_version)
+                print(f"🎯 目标ChromeDriver版本: {driver_version}")
             else:
-                print("❌ Chrome和ChromeDriver都不可用，请先安装Chrome浏览器")
-                return False
+                driver_version = None
+                print("🎯 将下载通用版本ChromeDriver")
+            
+            if not download_chromedriver(driver_version):
+                if chrome_installed:
+                    print("⚠️ ChromeDriver下载失败，但Chrome已安装，继续构建...")
+                else:
+                    print("❌ Chrome和ChromeDriver都不可用，请先安装Chrome浏览器")
+                    return False
+        else:
+            print("\n🚫 不打包Selenium，跳过ChromeDriver下载（只能手动输入Cookie）")
         
         # 3. 检查环境
         print("\n📦 检查构建环境...")
@@ -698,22 +884,42 @@ def main():
         print("\n🧹 清理构建文件...")
         clean_build()
         
-        # 6. 构建exe
-        print("\n🔨 构建v1.0智能版exe文件...")
-        if not build_exe():
-            return False
-        
-        # 7. 创建发布包
-        print("\n📦 创建v1.0智能版发布包...")
-        if not create_release():
-            return False
+        results = {}
+        for mode in modes:
+            # 6. 构建exe
+            print(f"\n🔨 构建v1.0智能版exe文件（{mode}）...")
+            if not build_exe(mode, excludes):
+                return False
+            
+            # 7. 创建发布包（同时构建两种时分别放在 exe/release/<模式>）
+            print(f"\n📦 创建v1.0智能版发布包（{mode}）...")
+            release_dir = Path('exe') / 'release' / mode if len(modes) > 1 else None
+            executable = create_release(mode, release_dir)
+            if not executable:
+                return False
+            
+            # 8. 测量冷启动时间
+            timings = []
+            if args.runs > 0:
+                print(f"\n⏱️ 测量冷启动时间（{args.runs}次）...")
+                timings = measure_cold_start(executable, args.runs)
+            size, files = bundle_size(artifact_paths(mode)[0])
+            results[mode] = {'size': size, 'files': files, 'timings': timings, 'release': executable.parent}
+        
+        report_builds(results)
+        if len(results) > 1:
+            best = fastest_mode(results)
+            print(f"🏆 启动最快: {best}（{results[best]['release']}）")
         
         print("\n" + "=" * 60)
         print("✅ v1.0智能版打包完成!")
         print("\n📋 使用步骤:")
         print("1. 进入 exe/release 目录")
-        print("2. 双击运行 '启动系统.bat'")
-        print("3. 系统自动检测Chrome并下载匹配驱动")
+        print(f"2. 双击运行 '{'启动系统.bat' if IS_WINDOWS else '启动系统.sh'}'")
+        if with_selenium:
+            print("3. 系统自动检测Chrome并下载匹配驱动")
+        else:
+            print("3. 本版本不含自动获取Cookie，请在网页中手动输入Cookie")
         print("4. 等待浏览器自动打开")
         print("5. 在网页中配置个人信息")
         print("6. 开始使用")
@@ -739,4 +945,4 @@ def main():
 
 if __name__ == "__main__":
     success = main()
-    input(f"\n{'✅ 成功' if success else '❌ 失败'}! 按回车键退出...")
\ No newline at end of file
+    input(f"\n{'✅ 成功' if success else '❌ 失败'}! 按回车键退出...")
@@ -1,5 +1,5 @@
+import os
 import time
-import json
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -7,13 +7,41 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.keys import Keys
-from config import CAMPUS_ACCOUNT
+from config import CONFIG
 
-def setup_chrome_driver(headless=False):
-    """配置Chrome浏览器"""
+LOGIN_URL = "https://ehall.szu.edu.cn/login"
+SPORT_PAGE_URL = "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do"
+
+# 体育预约接口需要的关键Cookie
+ESSENTIAL_COOKIES = ['JSESSIONID', 'MOD_AUTH_CAS']
+
+# 登录过程中不需要加载的资源（CSS保留，避免按钮因布局异常无法点击）
+BLOCKED_RESOURCE_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.eot', '*.otf',
+    '*.mp4', '*.webm', '*.mp3'
+]
+
+# 短信验证码按钮
+VERIFICATION_SELECTORS = [
+    (By.ID, "getDynamicCode"),
+    (By.CLASS_NAME, "dynamicCode_btn"),
+    (By.XPATH, "//button[contains(text(), '获取验证码')]"),
+    (By.XPATH, "//button[@onclick='sendDynamicCodeByPhone(this)']")
+]
+
+def setup_chrome_driver(headless=False, profile_dir=None):
+    """配置Chrome浏览器
+    
+    profile_dir: 浏览器用户数据目录，保留统一身份认证的登录状态供下次复用；为空则使用全新浏览器
+    """
     options = Options()
     if headless:
         options.add_argument('--headless')  # 无界面模式
+    if profile_dir:
+        options.add_argument(f'--user-data-dir={os.path.abspath(profile_dir)}')
+    # DOM加载完成即返回，不等待图片等子资源；后续步骤都显式等待所需的元素或Cookie
+    options.page_load_strategy = 'eager'
     
     # 基础配置
     options.add_argument('--no-sandbox')
@@ -61,13 +89,17 @@ def setup_chrome_driver(headless=False):
         driver = webdriver.Chrome(options=options)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
-        # 设置超时时间
+        # 设置超时时间（不使用隐式等待，否则每次查找不存在的元素都要等满10秒）
         driver.set_page_load_timeout(30)
-        driver.implicitly_wait(10)
+        driver.implicitly_wait(0)
         
         return driver
     except Exception as e:
         print(f"⚠️ Chrome浏览器启动警告: {e}")
+        if profile_dir:
+            # 用户数据目录可能被残留的Chrome进程占用，改用全新浏览器
+            print("⚠️ 无法使用浏览器用户数据目录，改用全新浏览器")
+            return setup_chrome_driver(headless=headless)
         # 即使有警告也继续运行
         try:
             driver = webdriver.Chrome(options=options)
@@ -85,15 +117,125 @@ def wait_for_element(driver, by, value, timeout=10):
     except TimeoutException:
         return None
 
+def wait_until(driver, condition, timeout, poll_frequency=0.2):
+    """显式等待条件成立，超时返回False"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(condition)
+        return True
+    except TimeoutException:
+        return False
+
+def is_logged_in(driver):
+    """已离开登录页面并回到ehall"""
+    try:
+        current_url = driver.current_url
+    except Exception:
+        return False
+    return "login" not in current_url.lower() and "ehall.szu.edu.cn" in current_url
+
+def has_cookies(driver, names):
+    """当前域名下是否已有指定的Cookie"""
+    try:
+        present = {cookie['name'] for cookie in driver.get_cookies()}
+    except Exception:
+        return False
+    return all(name in present for name in names)
+
+def find_visible_element(driver, selectors):
+    """立即查找第一个可见的元素（不等待），找不到返回None"""
+    for by, value in selectors:
+        try:
+            for element in driver.find_elements(by, value):
+                if element.is_displayed():
+                    return element
+        except Exception:
+            continue
+    return None
+
+def block_resources(driver):
+    """通过DevTools屏蔽图片、字体、音视频的加载"""
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_RESOURCE_PATTERNS})
+        return True
+    except Exception as e:
+        print(f"⚠️ 无法屏蔽页面资源，继续正常加载: {e}")
+        return False
+
+def show_browser_for_user(driver, resources_blocked):
+    """需要用户手动操作时恢复加载全部资源（如图片验证码）并弹出浏览器窗口"""
+    if resources_blocked:
+        try:
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+        except Exception:
+            pass
+    driver.maximize_window()
+
+def wait_for_manual_login(driver, timeout, callback=None):
+    """等待用户在浏览器中完成登录，每15秒提醒一次"""
+    waited = 0
+    while waited < timeout:
+        step = min(15, timeout - waited)
+        if wait_until(driver, is_logged_in, step, poll_frequency=0.5):
+            return True
+        waited += step
+        if waited < timeout:
+            if callback:
+                callback(f"等待登录中...({waited}秒)，请在浏览器中完成验证码输入")
+            print(f"等待登录...({waited}秒)")
+    return False
+
+def remember_login(driver):
+    """勾选统一身份认证的"记住我"（如果有），使登录状态能保存在浏览器用户数据目录中"""
+    checkbox = find_visible_element(driver, [(By.ID, "rememberMe"), (By.NAME, "rememberMe")])
+    if checkbox is not None:
+        try:
+            if not checkbox.is_selected():
+                checkbox.click()
+        except Exception:
+            pass
+
+def try_saved_session(driver, callback=None):
+    """直接访问体育预约页面，浏览器中保存的登录状态仍有效时无需重新登录"""
+    if callback:
+        callback("检查浏览器中保存的登录状态...")
+    print("检查浏览器中保存的登录状态...")
+    try:
+        driver.get(SPORT_PAGE_URL)
+    except Exception as e:
+        print(f"访问体育预约页面失败: {e}")
+        return False
+    
+    # 被重定向到登录页面说明登录状态已失效，否则等待应用下发Cookie
+    wait_until(driver, lambda d: "login" in d.current_url.lower() or
+               (is_logged_in(d) and has_cookies(d, ['MOD_AUTH_CAS'])), 10)
+    if not is_logged_in(driver):
+        print("保存的登录状态已失效，需要重新登录")
+        return False
+    # 等待超时仍未拿到会话Cookie时不能保存不完整的Cookie，改为重新登录
+    if not has_cookies(driver, ['MOD_AUTH_CAS']):
+        print("保存的登录状态未下发会话Cookie，需要重新登录")
+        return False
+    print("✅ 已复用保存的登录状态，无需重新登录")
+    if callback:
+        callback("✅ 已复用保存的登录状态，无需重新登录")
+    return True
+
 def auto_login_and_get_cookies(username, password, callback=None):
     """自动登录并获取cookies - 始终使用有界面模式"""
     driver = None
+    started = time.perf_counter()
     try:
         # 始终使用有界面模式，因为可能需要用户输入验证码
         if callback:
             callback("正在初始化浏览器...")
         print("正在初始化浏览器...")
-        driver = setup_chrome_driver(headless=False)
+        profile_dir = CONFIG.get("CHROME_PROFILE_DIR") or None
+        driver = setup_chrome_driver(headless=False, profile_dir=profile_dir)
+        resources_blocked = CONFIG.get("CHROME_BLOCK_RESOURCES", True) and block_resources(driver)
+        
+        if profile_dir and try_saved_session(driver, callback):
+            return collect_cookies(driver, callback, started)
         
         if callback:
             callback("正在访问登录页面...")
@@ -103,8 +245,7 @@ def auto_login_and_get_cookies(username, password, callback=None):
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                driver.get("https://ehall.szu.edu.cn/login")
-                time.sleep(2)  # 给页面加载一些时间
+                driver.get(LOGIN_URL)
                 break
             except Exception as e:
                 print(f"尝试 {attempt + 1}/{max_retries} 访问登录页面失败: {e}")
@@ -140,7 +281,6 @@ def auto_login_and_get_cookies(username, password, callback=None):
             if username_input:
                 break
             print(f"第{attempt + 1}次查找用户名输入框失败，重试中...")
-            time.sleep(2)
         
         if not username_input:
             error_msg = "❌ 无法找到用户名输入框，可能页面结构发生变化"
@@ -169,7 +309,6 @@ def auto_login_and_get_cookies(username, password, callback=None):
                 return None
         
         username_input.clear()
-        time.sleep(0.5)
         username_input.send_keys(username)
         print(f"✅ 用户名输入完成: {username}")
         
@@ -184,7 +323,6 @@ def auto_login_and_get_cookies(username, password, callback=None):
             if password_input:
                 break
             print(f"第{attempt + 1}次查找密码输入框失败，重试中...")
-            time.sleep(2)
         
         if not password_input:
             error_msg = "❌ 无法找到密码输入框"
@@ -211,10 +349,12 @@ def auto_login_and_get_cookies(username, password, callback=None):
                 return None
         
         password_input.clear()
-        time.sleep(0.5)
         password_input.send_keys(password)
         print("✅ 密码输入完成")
         
+        if profile_dir:
+            remember_login(driver)
+        
         # 点击登录按钮
         if callback:
             callback("正在提交登录...")
@@ -250,8 +390,8 @@ def auto_login_and_get_cookies(username, password, callback=None):
                 print("尝试按回车键提交...")
                 password_input.send_keys(Keys.RETURN)
         
-        # 等待页面跳转 - 减少等待时间
-        time.sleep(3)
+        # 等待跳转离开登录页面，或出现短信验证码按钮
+        wait_until(driver, lambda d: is_logged_in(d) or find_visible_element(d, VERIFICATION_SELECTORS) is not None, 10)
         
         # 快速检查登录状态
         current_url = driver.current_url
@@ -276,23 +416,10 @@ def auto_login_and_get_cookies(username, password, callback=None):
                     callback("检查是否需要验证码...")
                 print("检查是否需要验证码...")
                 
-                # 快速检查验证码按钮（减少等待时间）
-                verification_selectors = [
-                    (By.ID, "getDynamicCode"),
-                    (By.CLASS_NAME, "dynamicCode_btn"),
-                    (By.XPATH, "//button[contains(text(), '获取验证码')]"),
-                    (By.XPATH, "//button[@onclick='sendDynamicCodeByPhone(this)']")
-                ]
-                
-                verification_button = None
-                for by, value in verification_selectors:
-                    try:
-                        verification_button = wait_for_element(driver, by, value, 2)  # 减少等待时间到2秒
-                        if verification_button:
-                            print(f"✅ 找到验证码按钮: {by}={value}")
-                            break
-                    except:
-                        continue
+                # 上面已等待页面稳定，这里直接查找验证码按钮
+                verification_button = find_visible_element(driver, VERIFICATION_SELECTORS)
+                if verification_button:
+                    print("✅ 找到验证码按钮")
                 
                 if verification_button:
                     if callback:
@@ -305,7 +432,7 @@ def auto_login_and_get_cookies(username, password, callback=None):
                         print(f"点击验证码按钮失败: {e}")
                     
                     # 弹出浏览器窗口并提示用户
-                    driver.maximize_window()
+                    show_browser_for_user(driver, resources_blocked)
                     
                     print("🔍 请在打开的浏览器窗口中:")
                     print("   1. 输入收到的短信验证码")
@@ -313,25 +440,9 @@ def auto_login_and_get_cookies(username, password, callback=None):
                     if callback:
                         callback("请在浏览器中输入短信验证码并完成登录...")
                     
-                    # 等待用户完成验证码输入和登录 - 减少总等待时间
+                    # 等待用户完成验证码输入和登录
                     print("等待登录完成（最多等待90秒）...")
-                    login_success = False
-                    for i in range(90):  # 减少到90秒
-                        try:
-                            current_url = driver.current_url
-                            if "login" not in current_url.lower() and "ehall.szu.edu.cn" in current_url:
-                                login_success = True
-                                break
-                            # 每15秒提醒一次（减少提醒频率）
-                            if i > 0 and i % 15 == 0:
-                                if callback:
-                                    callback(f"等待登录中...({i}秒)，请在浏览器中完成验证码输入")
-                                print(f"等待登录...({i}秒)")
-                            time.sleep(1)
-                        except Exception as e:
-                            continue
-                    
-                    if not login_success:
+                    if not wait_for_manual_login(driver, 90, callback):
                         error_msg = "❌ 登录超时，请确保在浏览器中完成了验证码输入和登录"
                         print(error_msg)
                         if callback:
@@ -345,24 +456,10 @@ def auto_login_and_get_cookies(username, password, callback=None):
                             if callback:
                                 callback("检测到其他验证码，请在浏览器中完成...")
                             print("🔍 检测到其他验证码，请在浏览器中手动完成...")
-                            driver.maximize_window()
-                            
-                            # 等待用户完成登录 - 减少等待时间
-                            login_success = False
-                            for i in range(60):  # 减少到60秒
-                                try:
-                                    current_url = driver.current_url
-                                    if "login" not in current_url.lower() and "ehall.szu.edu.cn" in current_url:
-                                        login_success = True
-                                        break
-                                    if i > 0 and i % 15 == 0:
-                                        if callback:
-                                            callback(f"等待登录中...({i}秒)")
-                                    time.sleep(1)
-                                except:
-                                    continue
+                            show_browser_for_user(driver, resources_blocked)
                             
-                            if not login_success:
+                            # 等待用户完成登录
+                            if not wait_for_manual_login(driver, 60, callback):
                                 error_msg = "❌ 登录超时"
                                 print(error_msg)
                                 if callback:
@@ -380,20 +477,9 @@ def auto_login_and_get_cookies(username, password, callback=None):
                             
                             # 给用户30秒时间手动处理
                             print("🔍 请在浏览器中检查登录状态并手动完成登录（30秒超时）")
-                            driver.maximize_window()
+                            show_browser_for_user(driver, resources_blocked)
                             
-                            login_success = False
-                            for i in range(30):  # 减少到30秒
-                                try:
-                                    current_url = driver.current_url
-                                    if "login" not in current_url.lower() and "ehall.szu.edu.cn" in current_url:
-                                        login_success = True
-                                        break
-                                    time.sleep(1)
-                                except:
-                                    continue
-                            
-                            if not login_success:
+                            if not wait_for_manual_login(driver, 30, callback):
                                 return None
                     except Exception as e:
                         print(f"验证码检查异常: {e}")
@@ -403,21 +489,14 @@ def auto_login_and_get_cookies(username, password, callback=None):
                 if callback:
                     callback("✅ 登录状态检查通过")
         
-        # 最终验证登录状态 - 减少等待时间
+        # 最终验证登录状态（最多等待10秒）
         if callback:
             callback("最终验证登录状态...")
         print("最终验证登录状态...")
-        for i in range(5):  # 减少到5次检查，共10秒
-            try:
-                current_url = driver.current_url
-                if "login" not in current_url.lower() and "ehall.szu.edu.cn" in current_url:
-                    print("✅ 登录成功!")
-                    if callback:
-                        callback("✅ 登录验证成功!")
-                    break
-                time.sleep(2)
-            except:
-                continue
+        if wait_until(driver, is_logged_in, 10):
+            print("✅ 登录成功!")
+            if callback:
+                callback("✅ 登录验证成功!")
         else:
             error_msg = "❌ 登录验证失败，可能未成功登录"
             print(error_msg)
@@ -429,58 +508,8 @@ def auto_login_and_get_cookies(username, password, callback=None):
         if callback:
             callback("正在访问体育预约页面...")
         print("正在访问体育预约页面...")
-        driver.get("https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do")
-        time.sleep(3)  # 减少等待时间
-        
-        # 更宽松的页面验证
-        page_source = driver.page_source
-        if ("体育" in page_source or 
-            "sport" in page_source.lower() or 
-            "venue" in page_source.lower() or
-            "场馆" in page_source or
-            "预约" in page_source):
-            print("✅ 成功进入体育预约页面")
-            if callback:
-                callback("✅ 成功进入体育预约页面")
-        else:
-            # 不完全阻止，给出警告但继续
-            warning_msg = "⚠️ 页面内容可能不完整，但继续获取Cookie"
-            print(warning_msg)
-            if callback:
-                callback(warning_msg)
-        
-        # 获取cookies
-        if callback:
-            callback("正在获取Cookie...")
-        cookies = driver.get_cookies()
-        if not cookies:
-            error_msg = "❌ 未获取到Cookie"
-            print(error_msg)
-            if callback:
-                callback(error_msg)
-            return None
-        
-        success_msg = f"✅ 成功获取 {len(cookies)} 个Cookie"
-        print(success_msg)
-        if callback:
-            callback(success_msg)
-        
-        cookie_str = "; ".join([f"{cookie['name']}={cookie['value']}" for cookie in cookies])
-        
-        # 验证Cookie的基本完整性
-        essential_cookies = ['JSESSIONID', 'MOD_AUTH_CAS']
-        missing_cookies = [name for name in essential_cookies if name not in cookie_str]
-        if missing_cookies:
-            warning_msg = f"⚠️ 缺少部分关键Cookie: {missing_cookies}，但仍可尝试使用"
-            print(warning_msg)
-            if callback:
-                callback(warning_msg)
-        else:
-            if callback:
-                callback("✅ Cookie完整性验证通过")
-        
-        print(f"Cookie示例: {cookie_str[:100]}...")
-        return cookie_str
+        driver.get(SPORT_PAGE_URL)
+        return collect_cookies(driver, callback, started)
         
     except Exception as e:
         error_msg = f"❌ 获取Cookie失败: {e}"
@@ -493,71 +522,77 @@ def auto_login_and_get_cookies(username, password, callback=None):
         return None
     finally:
         if driver:
-            # 减少关闭浏览器的等待时间
             if callback:
                 callback("正在关闭浏览器...")
-            time.sleep(1)  # 减少到1秒
             try:
                 driver.quit()
             except:
                 pass
 
+def collect_cookies(driver, callback=None, started=None):
+    """在体育预约页面等待关键Cookie下发后读取，返回Cookie字符串"""
+    # 等待应用下发关键Cookie（最多10秒），缺少时下面只给出警告
+    wait_until(driver, lambda d: has_cookies(d, ESSENTIAL_COOKIES), 10)
+    
+    # 更宽松的页面验证
+    page_source = driver.page_source
+    if ("体育" in page_source or 
+        "sport" in page_source.lower() or 
+        "venue" in page_source.lower() or
+        "场馆" in page_source or
+        "预约" in page_source):
+        print("✅ 成功进入体育预约页面")
+        if callback:
+            callback("✅ 成功进入体育预约页面")
+    else:
+        # 不完全阻止，给出警告但继续
+        warning_msg = "⚠️ 页面内容可能不完整，但继续获取Cookie"
+        print(warning_msg)
+        if callback:
+            callback(warning_msg)
+    
+    # 获取cookies
+    if callback:
+        callback("正在获取Cookie...")
+    cookies = driver.get_cookies()
+    if not cookies:
+        error_msg = "❌ 未获取到Cookie"
+        print(error_msg)
+        if callback:
+            callback(error_msg)
+        return None
+    
+    success_msg = f"✅ 成功获取 {len(cookies)} 个Cookie"
+    print(success_msg)
+    if callback:
+        callback(success_msg)
+    
+    cookie_str = "; ".join([f"{cookie['name']}={cookie['value']}" for cookie in cookies])
+    
+    # 验证Cookie的基本完整性
+    missing_cookies = [name for name in ESSENTIAL_COOKIES if name not in cookie_str]
+    if missing_cookies:
+        warning_msg = f"⚠️ 缺少部分关键Cookie: {missing_cookies}，但仍可尝试使用"
+        print(warning_msg)
+        if callback:
+            callback(warning_msg)
+    else:
+        if callback:
+            callback("✅ Cookie完整性验证通过")
+    
+    print(f"Cookie示例: {cookie_str[:100]}...")
+    if started is not None:
+        print(f"⏱️ 获取Cookie耗时 {time.perf_counter() - started:.1f}秒")
+    return cookie_str
+
 def update_cookie_in_file(cookie_str):
-    """更新qiangpiao.py文件中的cookie"""
+    """更新Cookie存储中的cookie"""
     try:
-        # 备份原文件
-        import shutil
-        backup_file = f"qiangpiao_backup_{int(time.time())}.py"
-        shutil.copy2('qiangpiao.py', backup_file)
-        
-        with open('qiangpiao.py', 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        start_marker = 'raw_cookie = """'
-        end_marker = '"""'
-        
-        start_idx = content.find(start_marker)
-        if start_idx == -1:
-            print("❌ 未找到cookie配置")
-            return False
-        
-        start_idx += len(start_marker)
-        end_idx = content.find(end_marker, start_idx)
-        if end_idx == -1:
-            print("❌ cookie配置格式错误")
-            return False
-        
-        new_content = content[:start_idx] + '\n' + cookie_str + '\n' + content[end_idx:]
-        
-        with open('qiangpiao.py', 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        
+        from cookie_store import cookie_store
+        cookie_store.save(cookie_str)
         print("✅ Cookie更新成功!")
-        
-        # 清理旧备份文件（保留最近3个）
-        import glob
-        backup_files = glob.glob('qiangpiao_backup_*.py')
-        if len(backup_files) > 3:
-            backup_files.sort()
-            for old_backup in backup_files[:-3]:
-                try:
-                    import os
-                    os.remove(old_backup)
-                except:
-                    pass
-        
         return True
         
-    except FileNotFoundError:
-        print("❌ 未找到qiangpiao.py文件")
-        return False
     except Exception as e:
         print(f"❌ 更新失败: {e}")
-        # 如果更新失败，尝试恢复备份
-        try:
-            if 'backup_file' in locals():
-                shutil.copy2(backup_file, 'qiangpiao.py')
-                print("✅ 已恢复原文件")
-        except:
-            pass
-        return False
\ No newline at end of file
+        return False
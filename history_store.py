@@ -0,0 +1,180 @@
+# 抢票历史存储 - 每次查询/预约请求追加写入本地SQLite，重启后不丢失
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+# 历史数据库文件（相对于工作目录，与cookies.json同级）
+HISTORY_FILE = 'booking_history.db'
+
+# 分页查询时每页的最大条数
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    latency_ms REAL,
+    http_status INTEGER,
+    code TEXT,
+    msg TEXT,
+    success INTEGER NOT NULL DEFAULT 0,
+    target_date TEXT,
+    slot TEXT,
+    venue TEXT,
+    wid TEXT,
+    error TEXT
+)
+'''
+
+_COLUMNS = ('id', 'timestamp', 'endpoint', 'latency_ms', 'http_status', 'code', 'msg',
+            'success', 'target_date', 'slot', 'venue', 'wid', 'error')
+
+
+class Attempt:
+    """一次请求的记录，配合 with 使用：退出时写入历史存储，异常会记录后继续抛出"""
+
+    def __init__(self, store, endpoint, **fields):
+        self._store = store
+        self._started = None
+        self.fields = {
+            'endpoint': endpoint,
+            'latency_ms': None,
+            'http_status': None,
+            'code': None,
+            'msg': None,
+            'success': False,
+            'target_date': fields.get('target_date'),
+            'slot': fields.get('slot'),
+            'venue': fields.get('venue'),
+            'wid': fields.get('wid'),
+            'error': None
+        }
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def response(self, resp):
+        """收到响应时调用，记录状态码和耗时（不含后续的解析时间）"""
+        self.fields['latency_ms'] = (time.perf_counter() - self._started) * 1000
+        self.fields['http_status'] = resp.status_code
+
+    def result(self, data, success):
+        """记录服务器返回的 code/msg 以及是否成功"""
+        if isinstance(data, dict):
+            code = data.get('code')
+            msg = data.get('msg')
+            self.fields['code'] = None if code is None else str(code)
+            self.fields['msg'] = None if msg is None else str(msg)
+        self.fields['success'] = bool(success)
+
+    def cache_hit(self):
+        """响应与上次相同、复用了缓存的解析结果：单独记为 <接口>_cached，不当作服务器确认的成功"""
+        self.fields['endpoint'] = f"{self.fields['endpoint']}_cached"
+        self.fields['msg'] = '响应未变化，复用上次解析结果'
+
+    def fail(self, reason):
+        """记录未抛出异常的失败原因（如被重定向到登录页面）"""
+        self.fields['error'] = reason
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.fields['latency_ms'] is None:
+            self.fields['latency_ms'] = (time.perf_counter() - self._started) * 1000
+        if exc_type is not None:
+            self.fields['error'] = f"{exc_type.__name__}: {exc}"[:500]
+        self._store.record(**self.fields)
+        return False
+
+
+class HistoryStore:
+    """只追加的请求历史：首次写入时建库，写入失败只打印不影响抢票"""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disabled = False
+
+    def _connect(self):
+        """打开数据库连接（调用方需持有锁）"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL + NORMAL 下每次提交无需fsync，写入开销在微秒级
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_attempts_endpoint ON attempts (endpoint, id)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def attempt(self, endpoint, **fields):
+        """创建一次请求记录（with 语句使用）"""
+        return Attempt(self, endpoint, **fields)
+
+    def record(self, endpoint, latency_ms=None, http_status=None, code=None, msg=None,
+               success=False, target_date=None, slot=None, venue=None, wid=None, error=None):
+        """追加一条请求记录"""
+        row = (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3], endpoint,
+               None if latency_ms is None else round(latency_ms, 2), http_status,
+               code, msg, 1 if success else 0, target_date, slot, venue, wid, error)
+        with self._lock:
+            if self._disabled:
+                return False
+            try:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT INTO attempts (timestamp, endpoint, latency_ms, http_status, code, msg, '
+                    'success, target_date, slot, venue, wid, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    row
+                )
+                conn.commit()
+                return True
+            except sqlite3.Error as e:
+                # 数据库不可用时停止记录，避免每次请求都重复报错
+                print(f"历史存储: 写入 {self.path} 失败 {e}，本次运行不再记录历史")
+                self._disabled = True
+                return False
+
+    def query(self, page=1, page_size=50, endpoint=None, success=None):
+        """分页查询历史记录（按时间倒序），返回 (记录列表, 总数)"""
+        page = max(1, int(page))
+        page_size = max(1, min(MAX_PAGE_SIZE, int(page_size)))
+
+        conditions = []
+        params = []
+        if endpoint:
+            conditions.append('endpoint = ?')
+            params.append(endpoint)
+        if success is not None:
+            conditions.append('success = ?')
+            params.append(1 if success else 0)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        with self._lock:
+            conn = self._connect()
+            total = conn.execute(f'SELECT COUNT(*) FROM attempts{where}', params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM attempts{where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                params + [page_size, (page - 1) * page_size]
+            ).fetchall()
+
+        records = []
+        for row in rows:
+            record = dict(zip(_COLUMNS, row))
+            record['success'] = bool(record['success'])
+            records.append(record)
+        return records, total
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 全局共享的历史存储实例
+history_store = HistoryStore()
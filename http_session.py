@@ -0,0 +1,123 @@
+# HTTP会话工厂 - 唯一的requests会话，统一持有Cookie罐、默认请求头和SSL适配器；
+# 抢票脚本、Web界面和cookie_manager共用同一个连接池，keep-alive和TLS会话可以跨模块复用
+import ssl
+import threading
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from requests.cookies import cookiejar_from_dict
+from urllib3.util.ssl_ import create_urllib3_context
+
+from config import CONFIG, ehall_url
+from metrics import request_metrics, instrument_session, endpoint_name
+
+# 禁用SSL警告（会话不校验证书）
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+class SSLAdapter(HTTPAdapter):
+    """自定义SSL适配器，支持更宽松的SSL配置"""
+    def init_poolmanager(self, *args, **kwargs):
+        context = create_urllib3_context()
+        context.set_ciphers('DEFAULT@SECLEVEL=1')  # 降低安全级别
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        kwargs['ssl_context'] = context
+        return super().init_poolmanager(*args, **kwargs)
+
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36"
+
+
+def default_headers():
+    """会话的默认请求头（接口请求）"""
+    return {
+        "User-Agent": USER_AGENT,
+        "Referer": ehall_url("index"),
+        "Origin": ehall_url(),
+        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "Accept": "application/json, text/javascript, */*; q=0.01",
+        "Accept-Language": "zh-CN,zh;q=0.9",
+        "Accept-Encoding": "gzip, deflate, br",
+        "Connection": "keep-alive",
+        "X-Requested-With": "XMLHttpRequest"
+    }
+
+
+# 提交预约时在默认请求头之上追加的请求头
+BOOK_HEADERS = {
+    "Accept": "*/*",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-origin",
+    "sec-ch-ua": '"Chromium";v="136", "Google Chrome";v="136", "Not.A/Brand";v="99"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"'
+}
+
+# 以浏览器方式打开页面（测试Cookie）时追加的请求头
+PAGE_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache"
+}
+
+
+def _instrument(session):
+    # 记录每个请求的耗时、状态码、字节数和错误（/api/metrics 和命令行汇总表）
+    return instrument_session(session, request_metrics, lambda url: endpoint_name(url, CONFIG["ENDPOINTS"]))
+
+
+def create_session(cookies=None):
+    """创建配置好SSL适配器、默认请求头和请求指标的会话"""
+    session = requests.Session()
+    session.mount('https://', SSLAdapter())
+    session.headers.update(default_headers())
+    session.verify = False
+    if cookies:
+        session.cookies = cookiejar_from_dict(dict(cookies))
+    return _instrument(session)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """获取全局共享的会话（首次调用时创建）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def refresh_headers():
+    """BASE_URL变化后更新默认请求头中的Referer/Origin"""
+    get_session().headers.update(default_headers())
+
+
+def load_cookies(cookies):
+    """用Cookie存储中的Cookie替换共享会话的Cookie罐
+
+    整体替换而不是逐个修改，正在进行的请求不受影响；之后服务器下发的Cookie保存在新的Cookie罐中。
+    """
+    get_session().cookies = cookiejar_from_dict(dict(cookies))
+
+
+def session_with_cookies(cookies):
+    """使用独立Cookie罐、但与共享会话共用连接池和请求头的会话，用于测试候选Cookie而不影响正在使用的Cookie
+
+    连接池属于共享会话，不要对返回的会话调用close()。
+    """
+    shared = get_session()
+    session = requests.Session()
+    session.adapters = shared.adapters
+    session.headers = shared.headers.copy()
+    session.verify = False
+    session.cookies = cookiejar_from_dict(dict(cookies))
+    return _instrument(session)
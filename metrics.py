@@ -0,0 +1,220 @@
+# 请求指标 - 按接口统计耗时分布、错误、状态码和流量，输出Prometheus文本格式和命令行汇总表
+import time
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+# 耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 错误分类
+ERROR_TIMEOUT = 'timeout'
+ERROR_SSL = 'ssl'
+ERROR_CONNECTION = 'connection'
+ERROR_OTHER = 'other'
+
+
+class Histogram:
+    """固定桶的耗时直方图（调用方负责加锁）"""
+
+    __slots__ = ('counts', 'total', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个桶为 +Inf
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """按桶上限估算分位数（落在+Inf桶时返回最大值）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            cumulative += self.counts[i]
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def prometheus_lines(self, name, labels):
+        """输出 _bucket/_sum/_count 行"""
+        prefix = f"{labels}," if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.total:.6f}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+class EndpointStats:
+    """单个接口的统计"""
+
+    __slots__ = ('latency', 'status_counts', 'errors', 'bytes_received')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.status_counts = {}
+        self.errors = {}
+        self.bytes_received = 0
+
+
+class RequestMetrics:
+    """线程安全的请求指标，按接口名（CONFIG["ENDPOINTS"]中的键）分别统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._iterations = Histogram()
+        self.started_at = time.time()
+
+    def _stats(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = EndpointStats()
+        return stats
+
+    def observe_response(self, endpoint, seconds, status_code, size):
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats.latency.observe(seconds)
+            stats.status_counts[status_code] = stats.status_counts.get(status_code, 0) + 1
+            stats.bytes_received += size
+
+    def observe_error(self, endpoint, seconds, kind):
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats.latency.observe(seconds)
+            stats.errors[kind] = stats.errors.get(kind, 0) + 1
+
+    def observe_iteration(self, seconds):
+        """记录一次抢票循环（查询+预约，不含等待）的耗时"""
+        with self._lock:
+            self._iterations.observe(seconds)
+
+    def prometheus_text(self):
+        """Prometheus文本格式"""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                '# HELP qiangpiao_request_duration_seconds 请求耗时（含读取响应体）',
+                '# TYPE qiangpiao_request_duration_seconds histogram'
+            ]
+            for endpoint, stats in endpoints:
+                lines.extend(stats.latency.prometheus_lines(
+                    'qiangpiao_request_duration_seconds', f'endpoint="{endpoint}"'))
+
+            lines.append('# HELP qiangpiao_responses_total 按HTTP状态码统计的响应数')
+            lines.append('# TYPE qiangpiao_responses_total counter')
+            for endpoint, stats in endpoints:
+                for status, count in sorted(stats.status_counts.items()):
+                    lines.append(f'qiangpiao_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+            lines.append('# HELP qiangpiao_request_errors_total 未收到响应的请求（超时、SSL错误、连接错误等）')
+            lines.append('# TYPE qiangpiao_request_errors_total counter')
+            for endpoint, stats in endpoints:
+                for kind, count in sorted(stats.errors.items()):
+                    lines.append(f'qiangpiao_request_errors_total{{endpoint="{endpoint}",kind="{kind}"}} {count}')
+
+            lines.append('# HELP qiangpiao_response_bytes_total 接收的响应体字节数')
+            lines.append('# TYPE qiangpiao_response_bytes_total counter')
+            for endpoint, stats in endpoints:
+                lines.append(f'qiangpiao_response_bytes_total{{endpoint="{endpoint}"}} {stats.bytes_received}')
+
+            lines.append('# HELP qiangpiao_loop_iteration_seconds 抢票循环单次耗时（不含等待）')
+            lines.append('# TYPE qiangpiao_loop_iteration_seconds histogram')
+            lines.extend(self._iterations.prometheus_lines('qiangpiao_loop_iteration_seconds', ''))
+
+            lines.append('# HELP qiangpiao_metrics_start_time_seconds 指标开始统计的时间')
+            lines.append('# TYPE qiangpiao_metrics_start_time_seconds gauge')
+            lines.append(f'qiangpiao_metrics_start_time_seconds {self.started_at:.3f}')
+        return '\n'.join(lines) + '\n'
+
+    def summary_lines(self):
+        """命令行汇总表（耗时单位毫秒，分位数按直方图桶估算）"""
+        with self._lock:
+            rows = [(name, stats.latency, stats) for name, stats in sorted(self._endpoints.items())]
+            rows.append(('loop', self._iterations, None))
+            lines = [f"   {'接口':<10}{'次数':>6}{'平均':>9}{'P50≤':>9}{'P95≤':>9}{'最大':>9}{'错误':>6}{'KB':>9}  状态码"]
+            for name, histogram, stats in rows:
+                if not histogram.count:
+                    continue
+                errors = sum(stats.errors.values()) if stats else 0
+                size = f"{stats.bytes_received / 1024:.1f}" if stats else '-'
+                statuses = ' '.join(f"{k}:{v}" for k, v in sorted(stats.status_counts.items())) if stats else ''
+                if stats and stats.errors:
+                    statuses += ' ' + ' '.join(f"{k}:{v}" for k, v in sorted(stats.errors.items()))
+                lines.append(
+                    f"   {name:<10}{histogram.count:>6}"
+                    f"{histogram.total / histogram.count * 1000:>9.1f}"
+                    f"{histogram.quantile(0.5) * 1000:>9.1f}"
+                    f"{histogram.quantile(0.95) * 1000:>9.1f}"
+                    f"{histogram.max * 1000:>9.1f}{errors:>6}{size:>9}  {statuses}"
+                )
+        return lines
+
+
+def classify_error(exc):
+    """请求异常分类（SSLError是ConnectionError的子类，需先判断）"""
+    if isinstance(exc, requests.exceptions.Timeout):
+        return ERROR_TIMEOUT
+    if isinstance(exc, requests.exceptions.SSLError):
+        return ERROR_SSL
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return ERROR_CONNECTION
+    return ERROR_OTHER
+
+
+def instrument_session(session, metrics, endpoint_resolver):
+    """包装 session.send，为每个请求（包括重定向）记录耗时、状态码、字节数和错误
+
+    endpoint_resolver(url) 返回接口名，用作指标标签
+    """
+    original_send = session.send
+
+    def timed_send(request, **kwargs):
+        endpoint = endpoint_resolver(request.url)
+        started = time.perf_counter()
+        try:
+            resp = original_send(request, **kwargs)
+            # 非流式请求在这里读取响应体，使耗时包含下载时间
+            size = 0 if kwargs.get('stream') else len(resp.content)
+        except Exception as e:
+            metrics.observe_error(endpoint, time.perf_counter() - started, classify_error(e))
+            raise
+        metrics.observe_response(endpoint, time.perf_counter() - started, resp.status_code, size)
+        return resp
+
+    session.send = timed_send
+    return session
+
+
+def endpoint_name(url, endpoints):
+    """根据URL路径查找接口名，未知路径返回 other"""
+    path = urlsplit(url).path
+    for name, endpoint_path in endpoints.items():
+        if path == endpoint_path:
+            return name
+    return 'other'
+
+
+# 全局共享的请求指标
+request_metrics = RequestMetrics()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟ehall服务器 - 离线运行 查询 → 预约 流程
+使用 mock_data/ 目录中录制的响应数据
+
+用法:
+    python mock_ehall.py --scenario available --port 8765
+然后在config.py中设置 "BASE_URL": "http://127.0.0.1:8765"
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MOCK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_data')
+
+APP_PREFIX = '/qljfwapp/sys/lwSzuCgyy'
+INDEX_PATH = APP_PREFIX + '/index.do'
+QUERY_PATH = APP_PREFIX + '/modules/sportVenue/getOpeningRoom.do'
+BOOK_PATH = APP_PREFIX + '/sportVenue/insertVenueBookingInfo.do'
+
+# 场景 -> 各接口返回的数据文件
+SCENARIOS = {
+    # 有可预约场地，预约成功
+    'available': {'index': 'index.html', 'query': 'opening_room_available.json', 'book': 'booking_success.json'},
+    # 所有场地已被预约
+    'full': {'index': 'index.html', 'query': 'opening_room_full.json', 'book': 'booking_taken.json'},
+    # 有可预约场地，但提交时已被他人抢先
+    'booked': {'index': 'index.html', 'query': 'opening_room_available.json', 'book': 'booking_taken.json'},
+    # 已达到当日预约上限
+    'limit': {'index': 'index.html', 'query': 'opening_room_available.json', 'book': 'booking_limit.json'},
+    # 预约接口返回403
+    'forbidden': {'index': 'index.html', 'query': 'opening_room_available.json', 'book': 403},
+    # Cookie失效，所有页面跳转到登录页
+    'login': {'index': 'login.html', 'query': 'login.html', 'book': 'login.html'},
+}
+
+
+def load_mock_data():
+    """加载mock_data目录中的全部响应数据"""
+    data = {}
+    for name in os.listdir(MOCK_DATA_DIR):
+        with open(os.path.join(MOCK_DATA_DIR, name), 'rb') as f:
+            data[name] = f.read()
+    return data
+
+
+class MockEhallHandler(BaseHTTPRequestHandler):
+    """按场景返回录制响应的请求处理器"""
+
+    server_version = 'MockEhall/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_fixture(self, fixture):
+        if fixture == 403:
+            self._send(403, self.server.mock_data['forbidden.html'], 'text/html; charset=UTF-8')
+            return
+        body = self.server.mock_data[fixture]
+        if fixture.endswith('.json'):
+            self._send(200, body, 'application/json;charset=UTF-8')
+        else:
+            self._send(200, body, 'text/html; charset=UTF-8')
+
+    def _handle(self):
+        path = self.path.split('?', 1)[0]
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        with self.server.stats_lock:
+            self.server.stats[path] = self.server.stats.get(path, 0) + 1
+
+        scenario = SCENARIOS[self.server.scenario]
+        if path == INDEX_PATH:
+            self._send_fixture(scenario['index'])
+        elif path == QUERY_PATH:
+            self._send_fixture(scenario['query'])
+        elif path == BOOK_PATH:
+            self._send_fixture(scenario['book'])
+        elif path == '/__stats':
+            body = json.dumps(self.server.stats, ensure_ascii=False).encode('utf-8')
+            self._send(200, body, 'application/json;charset=UTF-8')
+        else:
+            self._send(404, b'Not Found', 'text/plain')
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+
+def create_mock_server(host='127.0.0.1', port=0, scenario='available', latency=0.0, verbose=False):
+    """创建模拟服务器（port=0时自动分配端口）"""
+    if scenario not in SCENARIOS:
+        raise ValueError(f"未知场景: {scenario}，可选: {', '.join(SCENARIOS)}")
+
+    server = ThreadingHTTPServer((host, port), MockEhallHandler)
+    server.daemon_threads = True
+    server.scenario = scenario
+    server.latency = latency
+    server.verbose = verbose
+    server.mock_data = load_mock_data()
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def start_mock_server_thread(**kwargs):
+    """在后台线程中启动模拟服务器，返回 (server, base_url)"""
+    server = create_mock_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟ehall服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--scenario', default='available', choices=sorted(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的模拟延迟（秒）')
+    parser.add_argument('--verbose', action='store_true', help='打印每个请求')
+    args = parser.parse_args()
+
+    server = create_mock_server(args.host, args.port, args.scenario, args.latency, args.verbose)
+    print(f"🧪 模拟ehall服务器已启动: http://{args.host}:{args.port}  场景: {args.scenario}")
+    print(f"💡 在config.py中设置 \"BASE_URL\": \"http://{args.host}:{args.port}\"")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⛔ 模拟服务器已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
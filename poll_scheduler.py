@@ -0,0 +1,126 @@
+# 查询间隔调度 - 根据上一次查询结果决定下一次查询前的等待时间
+from datetime import datetime, timedelta
+
+from config import parse_clock
+
+# 查询结果分类
+OUTCOME_AVAILABLE = 'available'    # 有可预约场地
+OUTCOME_FULL = 'full'              # 查询成功，但所有优先时段都已约满
+OUTCOME_THROTTLED = 'throttled'    # 超时、连接错误、403、5xx，服务器繁忙或拒绝
+OUTCOME_ERROR = 'error'            # 其他错误（解析失败、登录页面等），按基础间隔重试
+
+
+class FixedScheduler:
+    """固定间隔（原有行为）：无论查询结果如何都等待 RETRY_INTERVAL 秒"""
+
+    def __init__(self, config):
+        self.config = config
+        self.last_outcome = None
+
+    def record(self, outcome):
+        """记录一次查询结果"""
+        self.last_outcome = outcome
+
+    def next_interval(self, now=None):
+        """下一次查询前的等待时间（秒）"""
+        return float(self.config["RETRY_INTERVAL"])
+
+    def describe(self):
+        return f"固定间隔 {self.config['RETRY_INTERVAL']}秒"
+
+
+class AdaptiveScheduler:
+    """自适应间隔：
+    - 超时/403/5xx 时按指数退避，不超过 MAX_RETRY_INTERVAL
+    - 所有时段都已约满时逐步放宽间隔，不超过 IDLE_RETRY_INTERVAL
+    - 在 OPENING_TIME 前后 OPENING_WINDOW 秒内使用 OPENING_RETRY_INTERVAL 的短间隔
+    """
+
+    BACKOFF_FACTOR = 2.0    # 服务器错误时每次间隔翻倍
+    IDLE_FACTOR = 1.5       # 约满时每次放宽的倍数
+
+    def __init__(self, config):
+        self.config = config
+        self.last_outcome = None
+        self.throttled_streak = 0
+        self.full_streak = 0
+        self._invalid_opening_time = None  # 已提示过的无效放票时间，同一个值只提示一次
+
+    def record(self, outcome):
+        """记录一次查询结果，更新连续失败/约满计数"""
+        self.last_outcome = outcome
+        if outcome == OUTCOME_THROTTLED:
+            self.throttled_streak += 1
+            self.full_streak = 0
+        elif outcome == OUTCOME_FULL:
+            self.throttled_streak = 0
+            self.full_streak += 1
+        else:
+            self.throttled_streak = 0
+            self.full_streak = 0
+
+    def _opening_window(self, now):
+        """返回今天放票时间窗口 (开始, 结束)，未配置时返回None"""
+        opening_time = self.config.get("OPENING_TIME")
+        if not opening_time:
+            return None
+        try:
+            opening = datetime.combine(now.date(), parse_clock(opening_time))
+        except ValueError:
+            # 无效的放票时间（如手工编辑的config.json）不能让每次计算间隔都出错，按未配置处理
+            if opening_time != self._invalid_opening_time:
+                self._invalid_opening_time = opening_time
+                print(f"⚠️ 放票时间 OPENING_TIME={opening_time!r} 无效，忽略放票窗口")
+            return None
+        window = timedelta(seconds=self.config.get("OPENING_WINDOW", 60))
+        return opening - window, opening + window
+
+    def next_interval(self, now=None):
+        """下一次查询前的等待时间（秒）"""
+        now = now or datetime.now()
+        base = float(self.config["RETRY_INTERVAL"])
+        window = self._opening_window(now)
+        in_window = window is not None and window[0] <= now <= window[1]
+
+        if in_window:
+            # 放票窗口内不因约满而放宽，只使用短间隔
+            base = min(base, float(self.config.get("OPENING_RETRY_INTERVAL", base)))
+            interval = base
+        else:
+            idle_cap = max(base, float(self.config.get("IDLE_RETRY_INTERVAL", base)))
+            interval = min(idle_cap, base * self.IDLE_FACTOR ** self.full_streak)
+
+        if self.throttled_streak:
+            max_interval = max(base, float(self.config.get("MAX_RETRY_INTERVAL", base)))
+            interval = min(max_interval, max(interval, base * self.BACKOFF_FACTOR ** self.throttled_streak))
+
+        # 放票窗口即将开始时提前醒来，不错过开放时刻
+        if window is not None and now < window[0]:
+            interval = min(interval, (window[0] - now).total_seconds())
+
+        return max(0.0, interval)
+
+    def describe(self):
+        text = (f"自适应间隔 基础{self.config['RETRY_INTERVAL']}秒，"
+                f"约满时最长{self.config.get('IDLE_RETRY_INTERVAL')}秒，"
+                f"出错退避最长{self.config.get('MAX_RETRY_INTERVAL')}秒")
+        if self.config.get("OPENING_TIME"):
+            text += (f"，放票时间{self.config['OPENING_TIME']}前后"
+                     f"{self.config.get('OPENING_WINDOW', 60)}秒内每{self.config.get('OPENING_RETRY_INTERVAL')}秒查询")
+        return text
+
+
+SCHEDULERS = {
+    'fixed': FixedScheduler,
+    'adaptive': AdaptiveScheduler
+}
+
+
+def create_scheduler(config):
+    """根据 CONFIG["SCHEDULER"] 创建调度器，未知名称时回退到固定间隔"""
+    name = config.get("SCHEDULER", "fixed")
+    scheduler_class = SCHEDULERS.get(name)
+    if scheduler_class is None:
+        print(f"⚠️ 未知的调度器: {name}，使用固定间隔")
+        scheduler_class = FixedScheduler
+    return scheduler_class(config)
@@ -1,70 +1,79 @@
 import requests
 import json
+import math
 import time
 import logging
+import logging.handlers
+import queue
+import atexit
 from datetime import datetime
-import urllib3
-import ssl
-from requests.adapters import HTTPAdapter
-from urllib3.util.ssl_ import create_urllib3_context
 import sys
-
-# 禁用SSL警告
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+import re
+import copy
+import hashlib
+import threading
 
 # 导入配置
 try:
-    from config import CONFIG
+    from config import CONFIG, VENUE_CODES, config_store, ehall_url
 except ImportError:
     print("❌ 配置文件导入失败，请确保config.py文件存在且配置正确")
     exit(1)
 
-class SSLAdapter(HTTPAdapter):
-    """自定义SSL适配器，支持更宽松的SSL配置"""
-    def init_poolmanager(self, *args, **kwargs):
-        context = create_urllib3_context()
-        context.set_ciphers('DEFAULT@SECLEVEL=1')  # 降低安全级别
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        kwargs['ssl_context'] = context
-        return super().init_poolmanager(*args, **kwargs)
+from cookie_store import cookie_store, CookieHolder
+from history_store import history_store
+from metrics import request_metrics, endpoint_name
+from http_session import (get_session, load_cookies, refresh_headers, session_with_cookies,
+                          BOOK_HEADERS, PAGE_HEADERS)
+from poll_scheduler import (create_scheduler, OUTCOME_AVAILABLE, OUTCOME_FULL,
+                            OUTCOME_THROTTLED, OUTCOME_ERROR)
+
+LOG_FILE = 'qiangpiao.log'
+
+
+def setup_logging():
+    """配置日志：调用方只把记录放入内存队列，由后台线程写文件和控制台
+    
+    日志文件按大小轮转（LOG_MAX_BYTES / LOG_BACKUP_COUNT），长时间监控不会无限增长。
+    根日志器已配置过（如被其他程序导入前已配置）时不重复配置，返回None。
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=CONFIG.get("LOG_MAX_BYTES", 5 * 1024 * 1024),
+        backupCount=CONFIG.get("LOG_BACKUP_COUNT", 3),
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    # 退出时写完队列中剩余的日志
+    atexit.register(listener.stop)
+    return listener
+
 
 # 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('qiangpiao.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-
-# 创建全局session对象并配置SSL适配器
-session = requests.Session()
-session.mount('https://', SSLAdapter())
-
-
-raw_cookie = """
-route=07389b9fd090f647166fb5e572add976;
-"""
-
-# 解析Cookie字符串
-cookies = {}
-for item in raw_cookie.strip().split("; "):
-    key, value = item.split("=", 1)
-    cookies[key] = value
-
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
-    "Referer": "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do",
-    "Origin": "https://ehall.szu.edu.cn",
-    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-    "Accept": "application/json, text/javascript, */*; q=0.01",
-    "Accept-Language": "zh-CN,zh;q=0.9",
-    "Accept-Encoding": "gzip, deflate, br",
-    "Connection": "keep-alive",
-    "X-Requested-With": "XMLHttpRequest"
-}
+log_listener = setup_logging()
+
+# 全局共享的会话（SSL适配器、默认请求头、Cookie罐、请求指标见 http_session.py）
+session = get_session()
+headers = session.headers
+
+
+# 从Cookie存储加载（cookies.json，由Web界面或cookie_manager.py写入）
+# Cookie更新时整体替换会话的Cookie罐，无需重启即可生效
+cookie_holder = CookieHolder(cookie_store, on_change=load_cookies)
 
 def get_time_priority(time_name):
     """根据时段名称获取优先级，数字越小优先级越高"""
@@ -91,92 +100,196 @@ def is_time_slot_valid(time_slot, target_date):
         
         return True
     except Exception as e:
-        logging.debug(f"时间验证错误: {e}")
+        logging.debug("时间验证错误: %s", e)
         return True  # 出错时默认认为有效
 
-def get_available_slots():
-    """获取可用时段和场地"""
+# 未在 VENUE_PRIORITY 中列出的场馆的优先级（排在最后）
+UNLISTED_VENUE_PRIORITY = 999
+
+
+def resolve_venue_code(room):
+    """场地所属场馆的代码：优先使用查询结果中的CGBM，没有时按场地名称（CDMC）在 VENUE_CODES 中查找，
+    都无法确定时返回None（不能猜测场馆，否则会预约到错误的场馆）"""
+    venue_code = room.get('CGBM')
+    if venue_code:
+        return venue_code
+    venue_name = room.get('CDMC', '')
+    for name, code in VENUE_CODES.items():
+        if venue_name.startswith(name):
+            return code
+    return None
+
+
+class SlotRecord:
+    """一个可预约场地（某时段的某个场地），场馆代码直接取自查询结果中的CGBM
+    
+    SlotCache 会缓存并复用这些记录，不要修改。
+    """
+    __slots__ = ('wid', 'time_slot', 'start_time', 'end_time', 'venue_name', 'venue_code',
+                 'priority', 'venue_priority')
+    
+    def __init__(self, wid, time_slot, start_time, end_time, venue_name, venue_code, priority, venue_priority):
+        self.wid = wid
+        self.time_slot = time_slot
+        self.start_time = start_time
+        self.end_time = end_time
+        self.venue_name = venue_name
+        self.venue_code = venue_code
+        self.priority = priority                # 时段优先级（PREFERRED_TIMES中的位置）
+        self.venue_priority = venue_priority    # 场馆优先级（VENUE_PRIORITY）
+    
+    @property
+    def name(self):
+        return f"{self.time_slot} - {self.venue_name}"
+    
+    def __repr__(self):
+        return f"SlotRecord({self.name!r}, wid={self.wid!r}, venue_code={self.venue_code!r})"
+
+
+def parse_opening_rooms(data, time_slot, priority, venue_priority_table):
+    """从getOpeningRoom响应中提取可预约场地，场馆优先级按CGBM查 venue_priority_table"""
+    start_time, end_time = time_slot.split("-")
+    slots = []
+    for room in data["datas"].get("getOpeningRoom", {}).get("rows", []):
+        # 只选择可预约的场地
+        if room.get("disabled", True) or room.get("text") != "可预约":
+            continue
+        venue_code = resolve_venue_code(room)
+        if venue_code is None:
+            logging.warning("场地 %s（WID：%s）缺少场馆代码且无法从名称确定，跳过", room.get('CDMC', ''), room.get('WID'))
+            continue
+        slot = SlotRecord(room['WID'], time_slot, start_time, end_time, room.get('CDMC', ''), venue_code,
+                          priority, venue_priority_table.get(venue_code, UNLISTED_VENUE_PRIORITY))
+        slots.append(slot)
+        logging.debug("可预约场地：%s，WID：%s，场馆：%s，场馆优先级：%s",
+                      slot.name, slot.wid, venue_code, slot.venue_priority)
+    return slots
+
+
+class SlotCache:
+    """按时段缓存上一次getOpeningRoom响应的指纹和解析结果（缓存的SlotRecord只读，不要修改）"""
+    
+    def __init__(self):
+        self._entries = {}
+    
+    def get(self, key, fingerprint):
+        """指纹相同时返回缓存的场地列表，否则返回None"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+        return None
+    
+    def put(self, key, fingerprint, slots):
+        self._entries[key] = (fingerprint, slots)
+    
+    def clear(self):
+        self._entries = {}
+
+
+slot_cache = SlotCache()
+
+
+def get_available_slots(scheduler=None, config=None):
+    """获取可用时段和场地
+    
+    scheduler: 可选的查询间隔调度器，本次查询的结果（有可用/全部约满/服务器繁忙/其他错误）会报告给它
+    config: 本次查询使用的配置快照（抢票引擎每轮循环开始时获取），默认为全局CONFIG
+    """
+    if config is None:
+        config = CONFIG
+    outcome = OUTCOME_ERROR
     try:
         # 遍历优先时段，查询每个时段的可用场地
         all_available = []
+        query_failed = False
+        venue_priority_table = config.get("VENUE_PRIORITY", {})
+        # 场馆优先级表变化后不能复用按旧优先级解析的结果
+        venue_key = tuple(sorted(venue_priority_table.items()))
         
-        for time_slot in CONFIG["PREFERRED_TIMES"]:
+        # 时段优先级即在PREFERRED_TIMES中的位置
+        for priority, time_slot in enumerate(config["PREFERRED_TIMES"]):
             # 检查时段是否还有效
-            if not is_time_slot_valid(time_slot, CONFIG["TARGET_DATE"]):
+            if not is_time_slot_valid(time_slot, config["TARGET_DATE"]):
                 logging.info(f"跳过已过期时段: {time_slot}")
                 continue
                 
             start_time, end_time = time_slot.split("-")
             
             payload = {
-                "XMDM": CONFIG["XMDM"],
-                "YYRQ": CONFIG["TARGET_DATE"], 
-                "YYLX": CONFIG["YYLX"],
+                "XMDM": config["XMDM"],
+                "YYRQ": config["TARGET_DATE"], 
+                "YYLX": config["YYLX"],
                 "KSSJ": start_time,
                 "JSSJ": end_time,
-                "XQDM": CONFIG["XQ"]
+                "XQDM": config["XQ"]
             }
 
-            logging.info(f"正在查询 {CONFIG['TARGET_DATE']} {time_slot} 的可用场地...")
-            
-            resp = session.post(
-                "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/modules/sportVenue/getOpeningRoom.do",
-                headers=headers,
-                cookies=cookies,
-                data=payload,
-                verify=False,
-                timeout=CONFIG["REQUEST_TIMEOUT"]
-            )
-            
-            resp.raise_for_status()
-            data = resp.json()
+            logging.debug("正在查询 %s %s 的可用场地...", config['TARGET_DATE'], time_slot)
             
-            # 解析响应数据
-            if data.get("code") == "0" and "datas" in data:
-                rooms = data["datas"].get("getOpeningRoom", {}).get("rows", [])
+            # 每次查询都记录到历史存储（耗时、状态码、服务器返回的code/msg）
+            with history_store.attempt('query', target_date=config["TARGET_DATE"], slot=time_slot) as attempt:
+                resp = session.post(
+                    ehall_url("query"),
+                    data=payload,
+                    timeout=config["REQUEST_TIMEOUT"]
+                )
+                attempt.response(resp)
                 
-                available_count = 0
-                for room in rooms:
-                    # 只选择可预约的场地
-                    if not room.get("disabled", True) and room.get("text") == "可预约":
-                        venue_name = room.get('CDMC', '')
-                        
-                        # 设置场馆优先级：至快 > 至畅 > 其他
-                        venue_priority = 2  # 默认优先级
-                        if "至快" in venue_name:
-                            venue_priority = 0  # 最高优先级
-                        elif "至畅" in venue_name:
-                            venue_priority = 1  # 中等优先级
-                        
-                        slot_info = {
-                            'name': f"{time_slot} - {venue_name}",
-                            'wid': room['WID'],
-                            'time_slot': time_slot,
-                            'start_time': start_time,
-                            'end_time': end_time,
-                            'venue_name': venue_name,
-                            'venue_code': room.get('CGBM', ''),
-                            'priority': CONFIG["PREFERRED_TIMES"].index(time_slot),
-                            'venue_priority': venue_priority  # 添加场馆优先级
-                        }
-                        all_available.append(slot_info)
-                        available_count += 1
-                        logging.info(f"可预约场地：{slot_info['name']}，WID：{slot_info['wid']}，场馆优先级：{venue_priority}")
+                resp.raise_for_status()
                 
-                if available_count == 0:
-                    logging.info(f"时段 {time_slot} 暂无可预约场地")
-            else:
-                logging.warning(f"查询时段 {time_slot} 失败: {data}")
+                # 响应与上次完全相同时直接复用上次的解析结果，跳过JSON解析和重新构建
+                cache_key = (config["TARGET_DATE"], config["XMDM"], config["XQ"], time_slot, priority, venue_key)
+                fingerprint = hashlib.blake2b(resp.content, digest_size=16).digest()
+                slots = slot_cache.get(cache_key, fingerprint)
+                if slots is None:
+                    data = resp.json()
+                    attempt.result(data, success=data.get("code") == "0")
+                else:
+                    attempt.cache_hit()
+            
+            if slots is None:
+                # 响应有变化，重新解析
+                if data.get("code") != "0" or "datas" not in data:
+                    logging.warning(f"查询时段 {time_slot} 失败: {data}")
+                    query_failed = True
+                    continue
+                
+                slots = parse_opening_rooms(data, time_slot, priority, venue_priority_table)
+                slot_cache.put(cache_key, fingerprint, slots)
+                if slots:
+                    logging.info("时段 %s 有 %d 个可预约场地", time_slot, len(slots))
+                else:
+                    logging.debug("时段 %s 暂无可预约场地", time_slot)
+            
+            all_available.extend(slots)
         
-        # 先按场馆优先级排序（至快优先），再按时间优先级排序
-        all_available.sort(key=lambda x: (x['venue_priority'], x['priority']))
+        if all_available:
+            outcome = OUTCOME_AVAILABLE
+        elif not query_failed:
+            outcome = OUTCOME_FULL
+        
+        # 先按场馆优先级排序（VENUE_PRIORITY），再按时间优先级排序
+        all_available.sort(key=lambda x: (x.venue_priority, x.priority))
         return all_available
         
     except requests.exceptions.SSLError as e:
         logging.error(f"SSL错误: {e}")
+        outcome = OUTCOME_THROTTLED
         return []
     except requests.exceptions.Timeout as e:
         logging.error(f"请求超时: {e}")
+        outcome = OUTCOME_THROTTLED
+        return []
+    except requests.exceptions.HTTPError as e:
+        logging.error(f"请求错误: {e}")
+        # 403和5xx说明服务器在拒绝或过载，需要退避
+        status = e.response.status_code if e.response is not None else 0
+        if status == 403 or status >= 500:
+            outcome = OUTCOME_THROTTLED
+        return []
+    except requests.exceptions.ConnectionError as e:
+        logging.error(f"连接错误: {e}")
+        outcome = OUTCOME_THROTTLED
         return []
     except requests.exceptions.RequestException as e:
         logging.error(f"请求错误: {e}")
@@ -187,28 +300,42 @@ def get_available_slots():
     except Exception as e:
         logging.error(f"未知错误: {e}")
         return []
+    finally:
+        if scheduler is not None:
+            scheduler.record(outcome)
 
 
-def get_csrf_token():
-    """获取CSRF Token"""
+# CSRF Token匹配规则（预编译，避免每次预约都重新编译）
+CSRF_PATTERN = re.compile(r'csrfToken["\']?\s*[:=]\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+
+def is_login_page(resp):
+    """判断响应是否为登录页面（会话已失效）"""
+    if "login" in resp.url.lower():
+        return True
+    content_type = resp.headers.get('Content-Type', '')
+    return 'html' in content_type and "登录" in resp.text
+
+
+def get_csrf_token(page_text=None, config=None):
+    """获取CSRF Token，已有预约页面内容时直接从中提取"""
+    if config is None:
+        config = CONFIG
     try:
-        # 先访问预约页面，获取必要的token
-        resp = session.get(
-            "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do",
-            headers=headers,
-            cookies=cookies,
-            verify=False,
-            timeout=CONFIG["REQUEST_TIMEOUT"]
-        )
+        if page_text is None:
+            # 先访问预约页面，获取必要的token
+            resp = session.get(
+                ehall_url("index"),
+                timeout=config["REQUEST_TIMEOUT"]
+            )
+            page_text = resp.text
         
         # 尝试从页面中提取CSRF token
-        import re
-        csrf_pattern = r'csrfToken["\']?\s*[:=]\s*["\']([^"\']+)["\']'
-        csrf_match = re.search(csrf_pattern, resp.text, re.IGNORECASE)
+        csrf_match = CSRF_PATTERN.search(page_text)
         
         if csrf_match:
             csrf_token = csrf_match.group(1)
-            logging.debug(f"找到CSRF Token: {csrf_token}")
+            logging.debug("找到CSRF Token: %s", csrf_token)
             return csrf_token
         else:
             logging.debug("未找到CSRF Token")
@@ -218,95 +345,176 @@ def get_csrf_token():
         logging.error(f"获取CSRF Token失败: {e}")
         return None
 
-def establish_session():
+def _establish_session_context(config):
+    """按给定配置（抢票引擎本轮的快照）建立会话状态并返回CSRF Token，失败时抛出异常"""
+    logging.debug("正在建立会话状态...")
+    
+    # 1. 访问主页（同一页面内容用于提取CSRF Token）
+    resp1 = session.get(
+        ehall_url("index"),
+        timeout=config["REQUEST_TIMEOUT"]
+    )
+    logging.debug("主页访问: %s", resp1.status_code)
+    
+    if resp1.status_code == 403:
+        raise RuntimeError("主页访问返回403，Cookie可能已失效")
+    if is_login_page(resp1):
+        raise RuntimeError("主页跳转到登录页面，Cookie已失效")
+    
+    # 2. 先查询一个时段来建立上下文
+    if config["PREFERRED_TIMES"]:
+        start_time, end_time = config["PREFERRED_TIMES"][0].split("-")
+        query_payload = {
+            "XMDM": config["XMDM"],
+            "YYRQ": config["TARGET_DATE"],
+            "YYLX": config["YYLX"],
+            "KSSJ": start_time,
+            "JSSJ": end_time,
+            "XQDM": config["XQ"]
+        }
+        
+        resp2 = session.post(
+            ehall_url("query"),
+            data=query_payload,
+            timeout=config["REQUEST_TIMEOUT"]
+        )
+        logging.debug("场地查询: %s", resp2.status_code)
+    
+    # 3. 从主页内容中提取CSRF Token
+    return get_csrf_token(resp1.text, config)
+
+def establish_session(config=None):
     """建立完整的会话状态"""
     try:
-        logging.debug("正在建立会话状态...")
-        
-        # 1. 访问主页
-        resp1 = session.get(
-            "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do",
-            headers=headers,
-            cookies=cookies,
-            verify=False,
-            timeout=CONFIG["REQUEST_TIMEOUT"]
-        )
-        logging.debug(f"主页访问: {resp1.status_code}")
-        
-        # 2. 先查询一个时段来建立上下文
-        if CONFIG["PREFERRED_TIMES"]:
-            start_time, end_time = CONFIG["PREFERRED_TIMES"][0].split("-")
-            query_payload = {
-                "XMDM": CONFIG["XMDM"],
-                "YYRQ": CONFIG["TARGET_DATE"],
-                "YYLX": CONFIG["YYLX"],
-                "KSSJ": start_time,
-                "JSSJ": end_time,
-                "XQDM": CONFIG["XQ"]
-            }
-            
-            resp2 = session.post(
-                "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/modules/sportVenue/getOpeningRoom.do",
-                headers=headers,
-                cookies=cookies,
-                data=query_payload,
-                verify=False,
-                timeout=CONFIG["REQUEST_TIMEOUT"]
-            )
-            logging.debug(f"场地查询: {resp2.status_code}")
-        
-        # 3. 获取CSRF Token
-        csrf_token = get_csrf_token()
-        
-        return csrf_token
-        
+        return _establish_session_context(CONFIG if config is None else config)
     except Exception as e:
         logging.error(f"建立会话状态失败: {e}")
         return None
 
 
-def book_slot(wid, slot_name):
-    """预约指定场地时段"""
-    try:
-        # 建立会话状态并获取CSRF token
-        csrf_token = establish_session()
-        
-        # 从slot_name中提取时间信息
-        time_slot = None
-        venue_code = "111" # 默认场馆代码
-        
-        for preferred_time in CONFIG["PREFERRED_TIMES"]:
-            if preferred_time in slot_name:
-                time_slot = preferred_time
-                break
-        
-        if not time_slot:
-            logging.error(f"无法从 {slot_name} 中提取时间信息")
+class SessionContext:
+    """会话上下文缓存：保存CSRF Token，超过TTL、Cookie更换或收到403/登录页时才重新建立"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.token = None
+        self.established_at = None
+        self._cookies = None
+    
+    def is_valid(self, config=None):
+        """缓存是否仍然可用"""
+        if config is None:
+            config = CONFIG
+        if self.established_at is None:
             return False
+        # Cookie被替换后，旧的会话上下文不再适用
+        if self._cookies is not cookie_holder.get():
+            return False
+        ttl = config.get("SESSION_TTL", 300)
+        return time.monotonic() - self.established_at < ttl
+    
+    def get_token(self, config=None):
+        """获取CSRF Token，必要时按给定配置（默认为全局CONFIG）重新建立会话"""
+        if config is None:
+            config = CONFIG
+        with self._lock:
+            if self.is_valid(config):
+                logging.debug("复用已缓存的会话上下文")
+                return self.token
+            
+            cookies = cookie_holder.get()
+            try:
+                token = _establish_session_context(config)
+            except Exception as e:
+                logging.error(f"建立会话状态失败: {e}")
+                self.invalidate()
+                return None
+            
+            self.token = token
+            self.established_at = time.monotonic()
+            self._cookies = cookies
+            return token
+    
+    def invalidate(self):
+        """使缓存失效，下次预约前重新建立会话"""
+        self.established_at = None
+        self.token = None
+        self._cookies = None
+
+
+# 全局会话上下文缓存
+session_context = SessionContext()
+
+
+# 达到当日预约上限时服务器返回的提示关键词
+LIMIT_KEYWORDS = ("只能预订", "已预订2次", "超过限制")
+
+
+def is_limit_message(msg):
+    """判断服务器提示是否为达到预约上限"""
+    return bool(msg) and any(keyword in msg for keyword in LIMIT_KEYWORDS)
+
+
+class BookingResult:
+    """预约结果：可直接当作bool使用，同时携带服务器返回的code/msg、预约单号以及是否达到上限"""
+    
+    __slots__ = ('success', 'code', 'msg', 'dhid')
+    
+    def __init__(self, success, code=None, msg=None, dhid=None):
+        self.success = success
+        self.code = code
+        self.msg = msg
+        self.dhid = dhid
+    
+    def __bool__(self):
+        return self.success
+    
+    @property
+    def limit_reached(self):
+        return not self.success and is_limit_message(self.msg)
+    
+    def __repr__(self):
+        return f"BookingResult(success={self.success}, code={self.code!r}, msg={self.msg!r}, dhid={self.dhid!r})"
+
+
+def book_slot(slot, config=None, delay=True):
+    """预约指定场地时段（SlotRecord），返回BookingResult（可直接当作bool使用）
+    
+    config: 本次预约使用的配置快照，默认为全局CONFIG
+    delay: 提交前是否等待 BOOK_DELAY 秒（抢票引擎自行等待，以便从循环耗时中扣除）
+    """
+    if config is None:
+        config = CONFIG
+    
+    # 场馆代码来自查询结果（见 resolve_venue_code），缺少时不提交，避免预约到错误的场馆
+    venue_code = slot.venue_code
+    if not venue_code:
+        logging.error(f"{slot.name} 缺少场馆代码，跳过预约")
+        return BookingResult(False, msg="缺少场馆代码")
+    
+    try:
+        # 获取CSRF token（缓存有效时不再重新建立会话）
+        csrf_token = session_context.get_token(config)
         
-        # 从场地名称推断场馆代码
-        if "至畅" in slot_name:
-            venue_code = "104"  # 至畅体育馆
-        elif "至快" in slot_name:
-            venue_code = "111"  # 至快体育馆
-        
-        start_time, end_time = time_slot.split("-")
+        wid = slot.wid
+        time_slot = slot.time_slot
+        start_time, end_time = slot.start_time, slot.end_time
         
         # 构建预约请求的payload
         book_payload = {
             "DHID": "",  # 空的DHID
-            "YYRGH": CONFIG["USER_INFO"]["YYRGH"],  # 从配置获取学号/工号
+            "YYRGH": config["USER_INFO"]["YYRGH"],  # 从配置获取学号/工号
             "CYRS": "",  # 参与人数
-            "YYRXM": CONFIG["USER_INFO"]["YYRXM"],  # 从配置获取姓名
-            "CGDM": venue_code,  # 根据场地动态设置场馆代码
+            "YYRXM": config["USER_INFO"]["YYRXM"],  # 从配置获取姓名
+            "CGDM": venue_code,  # 场馆代码（查询结果中的CGBM）
             "CDWID": wid,  # 场地WID
-            "XMDM": CONFIG["XMDM"],  # 项目代码
-            "XQWID": CONFIG["XQ"],  # 校区代码
+            "XMDM": config["XMDM"],  # 项目代码
+            "XQWID": config["XQ"],  # 校区代码
             "KYYSJD": time_slot,  # 可用时间段
-            "YYRQ": CONFIG["TARGET_DATE"],  # 预约日期
-            "YYLX": CONFIG["YYLX"],  # 预约类型
-            "YYKS": f"{CONFIG['TARGET_DATE']} {start_time}",  # 预约开始时间
-            "YYJS": f"{CONFIG['TARGET_DATE']} {end_time}",   # 预约结束时间
+            "YYRQ": config["TARGET_DATE"],  # 预约日期
+            "YYLX": config["YYLX"],  # 预约类型
+            "YYKS": f"{config['TARGET_DATE']} {start_time}",  # 预约开始时间
+            "YYJS": f"{config['TARGET_DATE']} {end_time}",   # 预约结束时间
             "PC_OR_PHONE": "pc"  # 平台标识
         }
         
@@ -315,132 +523,347 @@ def book_slot(wid, slot_name):
             book_payload["csrfToken"] = csrf_token
             book_payload["_token"] = csrf_token
         
-        # 创建增强的请求头
-        enhanced_headers = headers.copy()
-        enhanced_headers.update({
-            "Accept": "*/*",  # 改为通配符
-            "Cache-Control": "no-cache",
-            "Pragma": "no-cache",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors", 
-            "Sec-Fetch-Site": "same-origin",
-            "sec-ch-ua": '"Chromium";v="136", "Google Chrome";v="136", "Not.A/Brand";v="99"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"Windows"'
-        })
-        
-        logging.info(f"正在预约场地：{slot_name} (WID: {wid}, 场馆: {venue_code})")
-        logging.debug(f"预约参数: {book_payload}")
+        logging.info(f"正在预约场地：{slot.name} (WID: {wid}, 场馆: {venue_code})")
+        logging.debug("预约参数: %s", book_payload)
         
         # 添加短暂延迟，模拟人工操作
-        time.sleep(0.5)
+        if delay:
+            time.sleep(config.get("BOOK_DELAY", 0.5))
         
         # 使用正确的预约接口
-        booking_url = "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/sportVenue/insertVenueBookingInfo.do"
-        
-        resp = session.post(
-            booking_url,
-            headers=enhanced_headers,
-            cookies=cookies,
-            data=book_payload,
-            verify=False,
-            timeout=CONFIG["REQUEST_TIMEOUT"]
-        )
-        
-        logging.debug(f"响应状态码: {resp.status_code}")
-        logging.debug(f"响应头: {dict(resp.headers)}")
+        booking_url = ehall_url("book")
         
-        # 如果是403错误，记录详细信息
-        if resp.status_code == 403:
-            logging.error(f"403 Forbidden错误:")
-            logging.error(f"URL: {resp.url}")
-            logging.error(f"响应内容: {resp.text[:500]}")
-            return False
-        
-        resp.raise_for_status()
-        
-        # 解析JSON响应
-        try:
-            result = resp.json()
-            logging.debug(f"预约响应: {result}")
+        # 记录本次预约请求到历史存储
+        with history_store.attempt('book', target_date=config["TARGET_DATE"], slot=time_slot,
+                                   venue=slot.venue_name, wid=wid) as attempt:
+            resp = session.post(
+                booking_url,
+                headers=BOOK_HEADERS,
+                data=book_payload,
+                timeout=config["REQUEST_TIMEOUT"]
+            )
+            attempt.response(resp)
             
-            # 检查预约结果 - 根据真实API响应格式
-            if result.get("code") == "0" and result.get("msg") == "成功":
-                dhid = result.get("data", {}).get("DHID", "")
-                logging.info(f"✅ 预约成功！场地：{slot_name}")
-                logging.info(f"✅ 预约单号：{dhid}")
-                print(f"🎉 预约详情:")
-                print(f"   📅 日期: {CONFIG['TARGET_DATE']}")
-                print(f"   ⏰ 时间: {time_slot}")
-                print(f"   🏟️  场地: {slot_name}")
-                print(f"   📋 单号: {dhid}")
-                
-                # 更新全局预约记录中的单号
-                global successful_bookings
-                if 'successful_bookings' in globals():
-                    for booking in successful_bookings:
-                        if booking.get('dhid') == 'Unknown' and booking['time_slot'] == time_slot:
-                            booking['dhid'] = dhid
-                            break
+            logging.debug("响应状态码: %s", resp.status_code)
+            logging.debug("响应头: %s", resp.headers)
+            
+            # 如果是403错误，记录详细信息
+            if resp.status_code == 403:
+                logging.error(f"403 Forbidden错误:")
+                logging.error(f"URL: {resp.url}")
+                logging.error(f"响应内容: {resp.text[:500]}")
+                session_context.invalidate()
+                return BookingResult(False, msg="403 Forbidden")
+            
+            resp.raise_for_status()
+            
+            # 被重定向到登录页面，说明会话已失效
+            if is_login_page(resp):
+                logging.error("❌ 预约请求返回登录页面，会话已失效")
+                attempt.fail("会话已失效（登录页面）")
+                session_context.invalidate()
+                return BookingResult(False, msg="会话已失效")
+            
+            # 解析JSON响应
+            try:
+                result = resp.json()
+                logging.debug("预约响应: %s", result)
+                attempt.result(result, success=result.get("code") == "0" and result.get("msg") == "成功")
+            
+                # 检查预约结果 - 根据真实API响应格式
+                if result.get("code") == "0" and result.get("msg") == "成功":
+                    dhid = result.get("data", {}).get("DHID", "")
+                    logging.info(f"✅ 预约成功！场地：{slot.name}")
+                    logging.info(f"✅ 预约单号：{dhid}")
+                    print(f"🎉 预约详情:")
+                    print(f"   📅 日期: {config['TARGET_DATE']}")
+                    print(f"   ⏰ 时间: {time_slot}")
+                    print(f"   🏟️  场地: {slot.name}")
+                    print(f"   📋 单号: {dhid}")
                 
-                return True
-            else:
-                error_msg = result.get("msg", "未知错误")
-                error_code = result.get("code", "")
-                logging.warning(f"❌ 预约失败：[{error_code}] {error_msg}")
+                    return BookingResult(True, code=result.get("code"), msg=result.get("msg"), dhid=dhid)
+                else:
+                    error_msg = result.get("msg", "未知错误")
+                    error_code = result.get("code", "")
+                    logging.warning(f"❌ 预约失败：[{error_code}] {error_msg}")
                 
-                # 检查具体的失败原因并给出建议
-                if "已过该预约时间" in error_msg:
-                    logging.info("💡 建议：请将目标日期设置为明天或更晚的日期")
-                elif "已被预约" in error_msg or "已满员" in error_msg:
-                    logging.info("💡 该场地已被他人预约，尝试其他场地")
-                elif "权限" in error_msg:
-                    logging.info("💡 可能没有预约权限，请检查账号状态")
-                elif "时间" in error_msg:
-                    logging.info("💡 时间相关错误，建议检查预约时间设置")
-                elif "只能预订2次" in error_msg or "超过限制" in error_msg:
-                    logging.info("🎊 恭喜！您已达到预约上限")
-                    print("🎊 检测到已达到当日预约上限！")
+                    # 检查具体的失败原因并给出建议
+                    if "已过该预约时间" in error_msg:
+                        logging.info("💡 建议：请将目标日期设置为明天或更晚的日期")
+                    elif "已被预约" in error_msg or "已满员" in error_msg:
+                        logging.info("💡 该场地已被他人预约，尝试其他场地")
+                    elif "权限" in error_msg:
+                        logging.info("💡 可能没有预约权限，请检查账号状态")
+                    elif "时间" in error_msg:
+                        logging.info("💡 时间相关错误，建议检查预约时间设置")
+                    elif is_limit_message(error_msg):
+                        logging.info("🎊 恭喜！您已达到预约上限")
+                        print("🎊 检测到已达到当日预约上限！")
                 
-                return False
+                    return BookingResult(False, code=error_code, msg=error_msg)
                 
-        except json.JSONDecodeError as e:
-            logging.error(f"JSON解析错误: {e}")
-            logging.error(f"响应内容: {resp.text[:500]}")
+            except json.JSONDecodeError as e:
+                logging.error(f"JSON解析错误: {e}")
+                logging.error(f"响应内容: {resp.text[:500]}")
             
-            # 检查是否有成功的HTML响应
-            if ("成功" in resp.text or 
-                "success" in resp.text.lower() or
-                "预约完成" in resp.text):
-                logging.info(f"✅ 预约成功！场地：{slot_name} (HTML响应)")
-                return True
+                # 检查是否有成功的HTML响应
+                if ("成功" in resp.text or 
+                    "success" in resp.text.lower() or
+                    "预约完成" in resp.text):
+                    logging.info(f"✅ 预约成功！场地：{slot.name} (HTML响应)")
+                    attempt.result(None, success=True)
+                    return BookingResult(True, msg="HTML响应")
             
-            return False
+                return BookingResult(False, msg="响应无法解析")
             
     except requests.exceptions.HTTPError as e:
         logging.error(f"HTTP错误: {e}")
         if e.response:
             logging.error(f"响应状态码: {e.response.status_code}")
             logging.error(f"响应内容: {e.response.text[:500]}")
-        return False
+        return BookingResult(False, msg=f"HTTP错误: {e}")
     except Exception as e:
         logging.error(f"预约时发生错误: {e}")
+        return BookingResult(False, msg=f"预约时发生错误: {e}")
+
+
+# 抢票引擎状态
+ENGINE_IDLE = 'idle'                  # 未开始
+ENGINE_QUERYING = 'querying'          # 查询可用场地
+ENGINE_BOOKING = 'booking'            # 提交预约
+ENGINE_WAITING = 'waiting'            # 等待下一次查询
+ENGINE_COMPLETED = 'completed'        # 已预约满
+ENGINE_LIMIT_REACHED = 'limit_reached'  # 服务器提示已达当日预约上限
+ENGINE_STOPPED = 'stopped'            # 收到停止信号
+ENGINE_EXHAUSTED = 'exhausted'        # 达到最大重试次数
+
+ENGINE_FINAL_STATES = (ENGINE_COMPLETED, ENGINE_LIMIT_REACHED, ENGINE_STOPPED, ENGINE_EXHAUSTED)
+
+
+class BookingEngine:
+    """查询 → 按时段分组 → 选场地 → 预约 的主循环，命令行和Web界面共用
+    
+    on_event(event, data) 在每个阶段被调用，event 取值:
+        state            状态变化            data: state
+        query            开始第N次查询       data: retry_count
+        config_refreshed 检测到config.json有修改
+        cookie_refreshed 检测到新Cookie
+        slots            可用场地有变化      data: available, groups（时段 -> 场地列表，已排除已预约时段）,
+                                             opened（新开放的场地）, closed（不再可约的场地）
+        booking          开始预约            data: slot
+        booked           预约成功            data: slot, booking, result
+        booking_failed   预约失败            data: slot, result
+        waiting          等待中（每秒一次）  data: remaining, next_query_at（下一次查询的时间戳，同一次等待内不变）
+        error            单次循环出错        data: error
+    """
+    
+    def __init__(self, config=None, max_bookings=2, stop_event=None, on_event=None, scheduler=None):
+        self.config = config if config is not None else CONFIG
+        self.max_bookings = max_bookings
+        self.stop_event = stop_event or threading.Event()
+        self.on_event = on_event
+        self.scheduler = scheduler or create_scheduler(self.config)
+        self.state = ENGINE_IDLE
+        self.retry_count = 0
+        self.bookings = []
+        self.start_time = None
+        self._known_slots = {}   # (时段, WID) -> 上一次查询到的可约场地
+        self._groups = {}
+        self._groups_booked = -1  # 分组时的已预约数，-1 保证首次成功查询时一定分组
+        self._paused = 0.0  # 本轮循环中主动等待（BOOK_DELAY、两次预约之间）的秒数，不计入循环耗时
+    
+    def snapshot_config(self):
+        """本轮循环使用的配置快照"""
+        if self.config is CONFIG:
+            return config_store.snapshot()
+        return copy.deepcopy(self.config)
+    
+    def _emit(self, event, **data):
+        if self.on_event:
+            self.on_event(event, data)
+    
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self._emit('state', state=state)
+    
+    def stop(self):
+        """请求停止（当前请求结束后生效）"""
+        self.stop_event.set()
+    
+    @property
+    def booked_time_slots(self):
+        return {booking['time_slot'] for booking in self.bookings}
+    
+    def group_slots(self, available_slots):
+        """按时间段分组并排除已预约的时段，每组内保持场馆优先级顺序"""
+        booked = self.booked_time_slots
+        groups = {}
+        for slot in available_slots:
+            if slot.time_slot not in booked:
+                groups.setdefault(slot.time_slot, []).append(slot)
+        for slots in groups.values():
+            slots.sort(key=lambda x: x.venue_priority)
+        return groups
+    
+    def diff_slots(self, available_slots):
+        """与上一次查询结果比较，返回 (新开放的场地, 不再可约的场地)"""
+        # 同一场地在不同时段的WID相同，需要按 (时段, WID) 区分
+        current = {(slot.time_slot, slot.wid): slot for slot in available_slots}
+        opened = [slot for key, slot in current.items() if key not in self._known_slots]
+        closed = [slot for key, slot in self._known_slots.items() if key not in current]
+        self._known_slots = current
+        return opened, closed
+    
+    def _record_changes(self, opened, closed, config):
+        """记录场地开放/关闭事件（日志 + 历史存储，便于分析放票时间）"""
+        target_date = config["TARGET_DATE"]
+        for event, slots in (('slot_opened', opened), ('slot_closed', closed)):
+            for slot in slots:
+                history_store.record(event, success=True, target_date=target_date, slot=slot.time_slot,
+                                     venue=slot.venue_name, wid=slot.wid)
+        if opened:
+            logging.info("🆕 新开放 %d 个场地: %s", len(opened), '，'.join(slot.name for slot in opened))
+        if closed:
+            logging.info("🔒 %d 个场地不再可约: %s", len(closed), '，'.join(slot.name for slot in closed))
+    
+    def _book_groups(self, groups, config):
+        """按时段优先级依次预约每个时段的第一个场地，返回是否应结束抢票"""
+        for time_slot in config["PREFERRED_TIMES"]:
+            if self.stop_event.is_set() or len(self.bookings) >= self.max_bookings:
+                break
+            if time_slot not in groups:
+                continue
+            
+            slot = groups[time_slot][0]
+            self._set_state(ENGINE_BOOKING)
+            self._emit('booking', slot=slot)
+            # 模拟人工操作的短暂延迟（可中断）
+            if self._pause(config.get("BOOK_DELAY", 0.5)):
+                break
+            result = book_slot(slot, config, delay=False)
+            
+            if result:
+                booking = {
+                    'time_slot': slot.time_slot,
+                    'venue_name': slot.venue_name,
+                    'venue_code': slot.venue_code,
+                    'slot_name': slot.name,
+                    'dhid': result.dhid or 'Unknown',
+                    'timestamp': datetime.now().strftime('%H:%M:%S')
+                }
+                self.bookings.append(booking)
+                self._emit('booked', slot=slot, booking=booking, result=result)
+                if len(self.bookings) >= self.max_bookings:
+                    self._set_state(ENGINE_COMPLETED)
+                    return True
+            else:
+                self._emit('booking_failed', slot=slot, result=result)
+                if result.limit_reached:
+                    self._set_state(ENGINE_LIMIT_REACHED)
+                    return True
+            
+            # 可中断的短暂延迟
+            if self._pause(1):
+                break
         return False
+    
+    def _pause(self, seconds):
+        """可中断的主动等待，计入本轮的等待时间，收到停止信号时返回True"""
+        started = time.perf_counter()
+        try:
+            return self.stop_event.wait(seconds)
+        finally:
+            self._paused += time.perf_counter() - started
+    
+    def _wait(self, interval):
+        """可中断的等待，每秒发出一次waiting事件，收到停止信号时返回True"""
+        self._set_state(ENGINE_WAITING)
+        deadline = time.monotonic() + interval
+        next_query_at = time.time() + interval
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._emit('waiting', remaining=remaining, next_query_at=next_query_at)
+            if self.stop_event.wait(min(1, remaining)):
+                return True
+    
+    def run(self):
+        """运行抢票主循环直到预约满、达到上限、达到最大重试次数或收到停止信号，返回最终状态"""
+        self.start_time = datetime.now()
+        max_retry_times = self.config["MAX_RETRY_TIMES"]
+        # 缓存按目标日期等分键，每次开始抢票时清空，避免历次运行的旧日期条目一直累积
+        slot_cache.clear()
+        
+        while self.retry_count < max_retry_times and not self.stop_event.is_set():
+            try:
+                # 同步外部写入的新配置（config.json）和新Cookie，无需重启
+                if config_store.refresh():
+                    refresh_headers()
+                    self._emit('config_refreshed')
+                if cookie_holder.refresh():
+                    self._emit('cookie_refreshed')
+                
+                # 本轮循环只读这份快照：Web界面在循环中途保存的配置从下一轮开始生效
+                config = self.snapshot_config()
+                
+                self.retry_count += 1
+                self._set_state(ENGINE_QUERYING)
+                self._emit('query', retry_count=self.retry_count)
+                
+                iteration_started = time.perf_counter()
+                self._paused = 0.0
+                available_slots = get_available_slots(scheduler=self.scheduler, config=config)
+                
+                # 只在查询成功时比较差异，避免把超时等错误当作所有场地都已关闭
+                if self.scheduler.last_outcome in (OUTCOME_AVAILABLE, OUTCOME_FULL):
+                    opened, closed = self.diff_slots(available_slots)
+                    if opened or closed or len(self.bookings) != self._groups_booked:
+                        self._groups = self.group_slots(available_slots)
+                        self._groups_booked = len(self.bookings)
+                        self._record_changes(opened, closed, config)
+                        self._emit('slots', available=available_slots, groups=self._groups,
+                                   opened=opened, closed=closed)
+                    groups = self._groups
+                else:
+                    groups = {}
+                
+                finished = bool(groups) and self._book_groups(groups, config)
+                # 循环耗时只算查询和预约请求，扣除主动等待
+                request_metrics.observe_iteration(time.perf_counter() - iteration_started - self._paused)
+                if finished:
+                    return self.state
+                
+                if self.retry_count < max_retry_times and not self.stop_event.is_set():
+                    self._wait(self.scheduler.next_interval())
+            
+            except Exception as e:
+                logging.error(f"程序执行错误: {e}")
+                self._emit('error', error=e)
+                if self.retry_count < max_retry_times:
+                    # 出错的可能正是调度器本身，计算间隔失败时按固定间隔重试，保证正常走到最终状态
+                    try:
+                        interval = self.scheduler.next_interval()
+                    except Exception as e:
+                        logging.error(f"计算查询间隔出错: {e}，按固定间隔重试")
+                        interval = float(self.config.get("RETRY_INTERVAL", 1))
+                    self._wait(interval)
+        
+        self._set_state(ENGINE_STOPPED if self.stop_event.is_set() else ENGINE_EXHAUSTED)
+        return self.state
 
 
 def check_login_status():
     """检查登录状态"""
     try:
         resp = session.get(
-            "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do",
-            headers=headers,
-            cookies=cookies,
-            verify=False,
+            ehall_url("index"),
             timeout=CONFIG["REQUEST_TIMEOUT"]
         )
         
-        logging.debug(f"登录检查 - 状态码: {resp.status_code}")
-        logging.debug(f"响应长度: {len(resp.text)}")
+        logging.debug("登录检查 - 状态码: %s", resp.status_code)
+        logging.debug("响应长度: %d", len(resp.content))
         
         if resp.status_code == 403:
             logging.error("收到403错误，可能是Cookie已失效或IP被限制")
@@ -457,13 +880,53 @@ def check_login_status():
             return True
         else:
             logging.warning("页面内容异常，可能需要重新登录")
-            logging.debug(f"页面内容片段: {resp.text[:200]}")
+            logging.debug("页面内容片段: %s", resp.text[:200])
             return False
         
     except Exception as e:
         logging.error(f"检查登录状态时出错: {e}")
         return False
 
+def probe_login_status():
+    """轻量级登录状态检查（供后台Cookie监控使用）：不跟随重定向，只读取页面开头
+    
+    返回 True（有效）、False（已失效）、None（网络错误、限流等，无法判断）
+    """
+    try:
+        resp = session.get(
+            ehall_url("index"),
+            timeout=CONFIG["REQUEST_TIMEOUT"],
+            allow_redirects=False,
+            stream=True
+        )
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Cookie检查请求失败: {e}")
+        return None
+    
+    try:
+        if resp.is_redirect:
+            # 登录失效时会被重定向到统一身份认证
+            location = resp.headers.get('Location', '').lower()
+            return False if ('login' in location or 'authserver' in location) else None
+        if resp.status_code == 401:
+            return False
+        if resp.status_code != 200:
+            return None
+        
+        head = b''
+        for chunk in resp.iter_content(4096):
+            head += chunk
+            if len(head) >= 16384:
+                break
+        text = head.decode('utf-8', errors='ignore')
+        if "体育场馆" in text or "sportVenue" in text:
+            return True
+        if "统一身份认证" in text or "登录" in text:
+            return False
+        return None
+    finally:
+        resp.close()
+
 def auto_handle_cookie_expiry():
     """自动处理Cookie过期"""
     print("🔧 检测到Cookie可能已过期")
@@ -479,8 +942,11 @@ def auto_handle_cookie_expiry():
             import subprocess
             result = subprocess.run(["python", "cookie_manager.py", "update"], 
                                   capture_output=False, text=True)
-            if result.returncode == 0:
-                print("✅ Cookie更新完成，请重新启动脚本")
+            if result.returncode == 0 and cookie_holder.refresh():
+                print("✅ Cookie更新完成，已切换到新Cookie，继续运行")
+                return True
+            elif result.returncode == 0:
+                print("⚠️ Cookie未发生变化")
                 return False
             else:
                 print("❌ Cookie更新失败")
@@ -496,6 +962,42 @@ def auto_handle_cookie_expiry():
         print("程序退出")
         return False
 
+# 录制时作为敏感字符串替换的Cookie值的最短长度
+MIN_COOKIE_SECRET_LENGTH = 8
+
+def start_request_recording(directory=None):
+    """--record: 把本次运行的请求和响应保存到样本目录，学号、姓名、Cookie和Token自动脱敏"""
+    from recorder import start_recording, default_recording_dir, REDACTED
+    from config import get_campus_account
+    directory = directory or default_recording_dir()
+    # 当前Cookie的值也可能出现在Cookie请求头以外的地方（URL、重定向地址、页面内容）；
+    # 过短的值（如语言、开关）替换后会误伤正文，不作为敏感字符串
+    replacements = {value: REDACTED for value in cookie_holder.get().values()
+                    if isinstance(value, str) and len(value) >= MIN_COOKIE_SECRET_LENGTH}
+    replacements.update({
+        CONFIG["USER_INFO"]["YYRGH"]: "2300000000",
+        CONFIG["USER_INFO"]["YYRXM"]: "测试用户",
+        get_campus_account().get("username", ""): "2300000000"
+    })
+    start_recording(session, directory, replacements, lambda url: endpoint_name(url, CONFIG["ENDPOINTS"]))
+    logging.info(f"📼 录制模式：请求和响应将保存到 {directory}")
+    return directory
+
+def start_request_replay(directory, speed=1.0):
+    """--replay: 所有请求改为从样本目录回放，不访问真实系统"""
+    from recorder import start_replay
+    start_replay(session, directory, speed)
+    logging.info(f"📼 回放模式：使用 {directory} 中的录制样本（速度 x{speed}）")
+
+def argv_value(flag, default=None):
+    """读取命令行参数 flag 后面的值（如 --record fixtures/run1），没有值时返回default"""
+    if flag not in sys.argv:
+        return None
+    index = sys.argv.index(flag)
+    if index + 1 < len(sys.argv) and not sys.argv[index + 1].startswith('--'):
+        return sys.argv[index + 1]
+    return default
+
 def print_statistics(retry_count, start_time):
     """打印统计信息"""
     elapsed = datetime.now() - start_time
@@ -503,19 +1005,26 @@ def print_statistics(retry_count, start_time):
     print(f"   ⏱️  运行时间: {elapsed}")
     print(f"   🔄 查询次数: {retry_count}")
     print(f"   📅 目标日期: {CONFIG['TARGET_DATE']}")
+    
+    summary = request_metrics.summary_lines()
+    if len(summary) > 1:
+        print(f"\n📈 请求指标 (ms):")
+        for line in summary:
+            print(line)
 
 
 def debug_request_info():
     """调试请求信息"""
     print("\n🔍 调试信息:")
-    print(f"   目标URL: https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/sportVenue/bookVenue.do")
+    print(f"   目标URL: {ehall_url('book')}")
     print(f"   User-Agent: {headers.get('User-Agent', 'N/A')}")
+    cookies = cookie_holder.get()
     print(f"   Cookies数量: {len(cookies)}")
     print(f"   主要Cookie: {list(cookies.keys())[:3]}")
     
     # 测试基础连接
     try:
-        resp = session.get("https://ehall.szu.edu.cn", timeout=5, verify=False)
+        resp = session.get(ehall_url(), timeout=5)
         print(f"   基础连接: ✅ ({resp.status_code})")
     except Exception as e:
         print(f"   基础连接: ❌ ({e})")
@@ -529,7 +1038,8 @@ if __name__ == "__main__":
     print(f"🏫 校区: {'丽湖' if CONFIG['XQ'] == '2' else '粤海'}")
     print(f"🏸 项目: 羽毛球" if CONFIG['XMDM'] == '001' else f"🏓 项目: 其他")
     print(f"👤 预约人: {CONFIG['USER_INFO']['YYRXM']} ({CONFIG['USER_INFO']['YYRGH']})")
-    print(f"⏱️  重试间隔: {CONFIG['RETRY_INTERVAL']}秒")
+    scheduler = create_scheduler(CONFIG)
+    print(f"⏱️  重试间隔: {scheduler.describe()}")
     print(f"🔄 最大重试: {CONFIG['MAX_RETRY_TIMES']}次")
     print(f"🎯 预约目标: 最多2个不同时间段")
     print("=" * 60)
@@ -543,7 +1053,7 @@ if __name__ == "__main__":
     # 检查用户信息
     if (CONFIG["USER_INFO"]["YYRGH"] == "" or 
         CONFIG["USER_INFO"]["YYRXM"] == ""):
-        print("⚠️  警告：请在config.py中修改为您的真实学号和姓名！")
+        print("⚠️  警告：请在Web配置页面或config.py中修改为您的真实学号和姓名！")
         confirm = input("是否继续测试？(y/N): ")
         if confirm.lower() != 'y':
             print("程序退出。")
@@ -554,6 +1064,16 @@ if __name__ == "__main__":
         logging.getLogger().setLevel(logging.DEBUG)
         print("🐛 调试模式已启用")
     
+    # 录制 / 回放请求（python qiangpiao.py --record [目录] / --replay 目录 [--replay-speed 倍数]）
+    if "--replay" in sys.argv:
+        replay_dir = argv_value("--replay")
+        if not replay_dir:
+            print("❌ 请指定回放的样本目录: --replay 目录")
+            exit(1)
+        start_request_replay(replay_dir, float(argv_value("--replay-speed", "1")))
+    elif "--record" in sys.argv:
+        start_request_recording(argv_value("--record"))
+    
     logging.info("🚀 深圳大学体育场馆抢票脚本启动")
     
     # 显示调试信息
@@ -580,176 +1100,95 @@ if __name__ == "__main__":
     print("💡 如需调试信息，请使用: python qiangpiao.py --debug")
     print("-" * 60)
     
-    # 配置参数
-    MAX_RETRY_TIMES = CONFIG["MAX_RETRY_TIMES"]
-    RETRY_INTERVAL = CONFIG["RETRY_INTERVAL"]
-    
-    retry_count = 0
-    start_time = datetime.now()
-    
     # 预约成功记录
-    successful_bookings = []
     max_bookings = 2  # 最多预约2个时间段
     
+    # 场馆代码 -> 控制台显示的场馆类型
+    venue_labels = {VENUE_CODES["至快体育馆"]: "🏟️至快", VENUE_CODES["至畅体育馆"]: "🏛️至畅"}
+    
+    def print_engine_event(event, data):
+        """把抢票引擎的事件打印到控制台"""
+        if event == 'config_refreshed':
+            print("⚙️  检测到配置已更新，已加载新配置")
+        elif event == 'cookie_refreshed':
+            print("🍪 检测到Cookie已更新，已切换到新Cookie")
+        elif event == 'query':
+            current_time = datetime.now().strftime("%H:%M:%S")
+            print(f"\n[{current_time}] 📡 第 {data['retry_count']} 次查询... (已预约: {len(engine.bookings)}/{max_bookings})")
+        elif event == 'slots':
+            groups = data['groups']
+            if data['opened'] or data['closed']:
+                print(f"🔄 场地变化: 新开放 {len(data['opened'])} 个，不再可约 {len(data['closed'])} 个")
+            if not data['available']:
+                print("📭 暂无可预约时段")
+            elif not groups:
+                print(f"🎉 找到 {len(data['available'])} 个可预约时段!")
+                print("📭 当前可用时段都已预约过，继续监控新时段...")
+            else:
+                print(f"🎉 找到 {len(data['available'])} 个可预约时段!")
+                print(f"🔍 过滤后剩余 {sum(len(slots) for slots in groups.values())} 个新时段可预约:")
+                # 显示每个时间段的第一个场地（优先至快）
+                display_slots = [groups[t][0] for t in CONFIG["PREFERRED_TIMES"] if t in groups]
+                for i, slot in enumerate(display_slots, 1):
+                    venue_count = len(groups[slot.time_slot])
+                    venue_type = venue_labels.get(slot.venue_code, "🏢其他")
+                    print(f"   {i}. {slot.time_slot} ({venue_count}个场地可选) - {venue_type} - 优先级: {slot.priority}")
+        elif event == 'booking':
+            slot = data['slot']
+            print(f"\n🎯 尝试预约时间段 {slot.time_slot}:")
+            print(f"   选择场地: {slot.venue_name}")
+        elif event == 'booked':
+            print(f"🎉 预约成功！当前已预约 {len(engine.bookings)}/{max_bookings} 个时间段")
+            if len(engine.bookings) < max_bookings:
+                print(f"💡 继续尝试预约下一个时间段...")
+        elif event == 'booking_failed':
+            if data['result'].limit_reached:
+                print("🎊 检测到已达到预约上限，停止尝试")
+            else:
+                print(f"❌ 时间段 {data['slot'].time_slot} 预约失败，尝试下一个时间段...")
+        elif event == 'waiting':
+            print(f"\r⏱️  倒计时: {math.ceil(data['remaining'])} 秒 | 已预约: {len(engine.bookings)}/{max_bookings}", end="", flush=True)
+        elif event == 'state' and data['state'] == ENGINE_QUERYING:
+            print("\r" + " " * 50 + "\r", end="")  # 清除倒计时
+        elif event == 'error':
+            print(f"\n❌ 程序执行错误: {data['error']}")
+    
+    engine = BookingEngine(max_bookings=max_bookings, on_event=print_engine_event, scheduler=scheduler)
+    
     try:
-        while retry_count < MAX_RETRY_TIMES:
-            try:
-                current_time = datetime.now().strftime("%H:%M:%S")
-                print(f"\n[{current_time}] 📡 第 {retry_count + 1} 次查询... (已预约: {len(successful_bookings)}/{max_bookings})")
-                
-                # 如果已经预约满了，显示成功信息并退出
-                if len(successful_bookings) >= max_bookings:
-                    print(f"\n🎊 恭喜！已成功预约 {max_bookings} 个时间段！")
-                    print("\n📋 预约详情:")
-                    for i, booking in enumerate(successful_bookings, 1):
-                        print(f"   {i}. {booking['time_slot']} - {booking['venue_name']}")
-                        print(f"      📋 预约单号: {booking['dhid']}")
-                    print_statistics(retry_count, start_time)
-                    input("\n按回车键退出...")
-                    exit(0)
-                
-                available_slots = get_available_slots()
-                
-                if available_slots:
-                    print(f"🎉 找到 {len(available_slots)} 个可预约时段!")
-                    
-                    # 过滤掉已经预约过的时间段
-                    booked_time_slots = [booking['time_slot'] for booking in successful_bookings]
-                    remaining_slots = [slot for slot in available_slots 
-                                     if slot['time_slot'] not in booked_time_slots]
-                    
-                    if not remaining_slots:
-                        print("📭 当前可用时段都已预约过，继续监控新时段...")
-                    else:
-                        print(f"🔍 过滤后剩余 {len(remaining_slots)} 个新时段可预约:")
-                        
-                        # 按时间段分组，每个时间段优先显示至快体育馆
-                        time_slot_groups = {}
-                        for slot in remaining_slots:
-                            if slot['time_slot'] not in time_slot_groups:
-                                time_slot_groups[slot['time_slot']] = []
-                            time_slot_groups[slot['time_slot']].append(slot)
-                        
-                        # 对每个时间段的场地按场馆优先级排序
-                        for time_slot in time_slot_groups:
-                            time_slot_groups[time_slot].sort(key=lambda x: x['venue_priority'])
-                        
-                        # 显示每个时间段的第一个场地（优先至快）
-                        display_slots = []
-                        for time_slot in CONFIG["PREFERRED_TIMES"]:
-                            if time_slot in time_slot_groups:
-                                display_slots.append(time_slot_groups[time_slot][0])
-                        
-                        for i, slot in enumerate(display_slots, 1):
-                            venue_count = len(time_slot_groups[slot['time_slot']])
-                            venue_type = "🏟️至快" if "至快" in slot['venue_name'] else "🏛️至畅" if "至畅" in slot['venue_name'] else "🏢其他"
-                            print(f"   {i}. {slot['time_slot']} ({venue_count}个场地可选) - {venue_type} - 优先级: {slot['priority']}")
-                        
-                        # 按时间段优先级尝试预约
-                        for time_slot in CONFIG["PREFERRED_TIMES"]:
-                            # 如果已经预约满了，跳出循环
-                            if len(successful_bookings) >= max_bookings:
-                                break
-                            
-                            # 如果该时间段已经预约过，跳过
-                            if time_slot in booked_time_slots:
-                                continue
-                            
-                            # 如果该时间段有可用场地，尝试预约第一个
-                            if time_slot in time_slot_groups:
-                                slots_in_time = time_slot_groups[time_slot]
-                                first_slot = slots_in_time[0]  # 选择第一个可用场地
-                                
-                                print(f"\n🎯 尝试预约时间段 {time_slot}:")
-                                print(f"   选择场地: {first_slot['venue_name']} (共{len(slots_in_time)}个可选)")
-                                
-                                success = book_slot(first_slot['wid'], first_slot['name'])
-                                
-                                if success:
-                                    # 记录成功的预约
-                                    booking_record = {
-                                        'time_slot': first_slot['time_slot'],
-                                        'venue_name': first_slot['venue_name'],
-                                        'dhid': 'Unknown',  # 在book_slot函数中会更新
-                                        'slot_name': first_slot['name']
-                                    }
-                                    successful_bookings.append(booking_record)
-                                    
-                                    print(f"🎉 预约成功！当前已预约 {len(successful_bookings)}/{max_bookings} 个时间段")
-                                    
-                                    # 如果还没预约满，继续下一个时间段
-                                    if len(successful_bookings) < max_bookings:
-                                        print(f"💡 继续尝试预约下一个时间段...")
-                                        time.sleep(1)  # 短暂延迟
-                                    else:
-                                        # 预约满了，显示成功信息并退出
-                                        print(f"\n🎊 太棒了！已成功预约满 {max_bookings} 个时间段！")
-                                        print("\n📋 最终预约详情:")
-                                        for i, booking in enumerate(successful_bookings, 1):
-                                            print(f"   {i}. {booking['slot_name']}")
-                                        print_statistics(retry_count + 1, start_time)
-                                        input("\n按回车键退出...")
-                                        exit(0)
-                                else:
-                                    print(f"❌ 时间段 {time_slot} 预约失败，尝试下一个时间段...")
-                                    
-                                    # 检查是否是预约上限错误
-                                    if "只能预订2次" in str(logging.getLogger().handlers):
-                                        print("🎊 检测到已达到预约上限，停止尝试")
-                                        break
-                                    
-                                    time.sleep(1)  # 短暂延迟
-                        
-                        # 如果所有时间段都尝试过了但还没预约满
-                        if len(successful_bookings) < max_bookings:
-                            print("⚠️  所有可用时间段都尝试过了，继续监控...")
-                
-                else:
-                    print("📭 暂无可预约时段")
-                
-                retry_count += 1
-                
-                # 如果还没预约满且没有达到最大重试次数，继续监控
-                if len(successful_bookings) < max_bookings and retry_count < MAX_RETRY_TIMES:
-                    print(f"⏳ 等待 {RETRY_INTERVAL} 秒后重试...")
-                    for i in range(RETRY_INTERVAL, 0, -1):
-                        print(f"\r⏱️  倒计时: {i} 秒 | 已预约: {len(successful_bookings)}/{max_bookings}", end="", flush=True)
-                        time.sleep(1)
-                    print("\r" + " " * 50 + "\r", end="")  # 清除倒计时
-                
-            except KeyboardInterrupt:
-                print("\n\n⛔ 用户手动停止程序")
-                break
-            except Exception as e:
-                print(f"\n❌ 程序执行错误: {e}")
-                logging.error(f"程序执行错误: {e}")
-                retry_count += 1
-                if retry_count < MAX_RETRY_TIMES:
-                    time.sleep(RETRY_INTERVAL)
+        final_state = engine.run()
+        successful_bookings = engine.bookings
         
         print("\n⏹️  程序结束")
         
         # 显示最终统计
         if successful_bookings:
+            if final_state == ENGINE_COMPLETED:
+                print(f"\n🎊 太棒了！已成功预约满 {max_bookings} 个时间段！")
             print(f"\n🎉 预约成功统计: {len(successful_bookings)}/{max_bookings} 个时间段")
             print("📋 成功预约的时段:")
             for i, booking in enumerate(successful_bookings, 1):
                 print(f"   {i}. {booking['slot_name']}")
+                print(f"      📋 预约单号: {booking['dhid']}")
         else:
             print("\n😢 很遗憾，没有成功预约到任何时段")
         
-        print_statistics(retry_count, start_time)
+        if final_state == ENGINE_LIMIT_REACHED:
+            print("🎊 已达到当日预约上限")
+        
+        print_statistics(engine.retry_count, engine.start_time)
         
-        if retry_count >= MAX_RETRY_TIMES and len(successful_bookings) < max_bookings:
+        if final_state == ENGINE_EXHAUSTED:
             print(f"⏰ 已达到最大重试次数，当前预约 {len(successful_bookings)}/{max_bookings} 个时间段")
         
     except KeyboardInterrupt:
+        engine.stop()
         print("\n\n⛔ 程序被用户中断")
-        if successful_bookings:
-            print(f"\n📊 中断前已预约: {len(successful_bookings)}/{max_bookings} 个时间段")
-            for i, booking in enumerate(successful_bookings, 1):
+        if engine.bookings:
+            print(f"\n📊 中断前已预约: {len(engine.bookings)}/{max_bookings} 个时间段")
+            for i, booking in enumerate(engine.bookings, 1):
                 print(f"   {i}. {booking['slot_name']}")
-        print_statistics(retry_count, start_time)
+        print_statistics(engine.retry_count, engine.start_time or datetime.now())
     
     input("\n按回车键退出...")
 
@@ -830,20 +1269,11 @@ def test_cookie_validity(cookies_dict):
     print(f"开始测试Cookie有效性，共 {len(cookies_dict)} 个字段")
     
     try:
-        # 创建测试用的headers
-        test_headers = headers.copy()
-        test_headers.update({
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Cache-Control": "no-cache",
-            "Pragma": "no-cache"
-        })
-        
+        # 使用独立的Cookie罐测试，不影响正在使用的Cookie
         print("发送测试请求...")
-        resp = session.get(
-            "https://ehall.szu.edu.cn/qljfwapp/sys/lwSzuCgyy/index.do",
-            headers=test_headers,
-            cookies=cookies_dict,
-            verify=False,
+        resp = session_with_cookies(cookies_dict).get(
+            ehall_url("index"),
+            headers=PAGE_HEADERS,
             timeout=15,  # 增加超时时间
             allow_redirects=True
         )
@@ -911,69 +1341,20 @@ def test_cookie_validity(cookies_dict):
         return False, f"测试失败: {str(e)}"
 
 def update_cookie_in_file(new_cookie_text):
-    """更新文件中的Cookie"""
+    """更新Cookie存储"""
     try:
-        print(f"开始更新Cookie到文件，新Cookie长度: {len(new_cookie_text)}")
+        print(f"开始更新Cookie存储，新Cookie长度: {len(new_cookie_text)}")
         
-        # 读取原文件
         try:
-            with open('qiangpiao.py', 'r', encoding='utf-8') as f:
-                content = f.read()
-            print("成功读取qiangpiao.py文件")
+            cookie_store.save(new_cookie_text)
+            print(f"✅ Cookie已写入 {cookie_store.path}")
         except Exception as e:
-            print(f"读取文件失败: {e}")
+            print(f"写入Cookie存储失败: {e}")
             return False
         
-        # 查找并替换cookie
-        start_marker = 'raw_cookie = """'
-        end_marker = '"""'
-        
-        start_idx = content.find(start_marker)
-        if start_idx == -1:
-            print("❌ 未找到cookie起始位置")
-            return False
-        
-        start_idx += len(start_marker)
-        end_idx = content.find(end_marker, start_idx)
-        
-        if end_idx == -1:
-            print("❌ 未找到cookie结束位置")
-            return False
-        
-        print(f"找到Cookie位置: {start_idx} - {end_idx}")
-        
-        # 构造新内容
-        new_content = content[:start_idx] + '\n' + new_cookie_text + '\n' + content[end_idx:]
-        
-        # 写入新文件
-        try:
-            with open('qiangpiao.py', 'w', encoding='utf-8') as f:
-                f.write(new_content)
-            print("✅ Cookie写入文件成功")
-        except Exception as e:
-            print(f"写入文件失败: {e}")
-            return False
-        
-        # 验证写入结果
-        try:
-            with open('qiangpiao.py', 'r', encoding='utf-8') as f:
-                verify_content = f.read()
-            if new_cookie_text.strip() in verify_content:
-                print("✅ Cookie更新验证成功")
-            else:
-                print("⚠️ Cookie更新验证失败，内容可能不匹配")
-        except Exception as e:
-            print(f"验证更新失败: {e}")
-        
-        print("✅ Cookie更新成功！")
-        
-        # 重新加载cookies到全局变量
-        try:
-            global cookies
-            cookies = extract_cookies_from_text(new_cookie_text)
-            print(f"全局cookies已更新，字段数: {len(cookies)}")
-        except Exception as e:
-            print(f"更新全局cookies失败: {e}")
+        # 替换运行中使用的cookies，正在运行的抢票线程下一次请求即生效
+        cookies = cookie_holder.swap(cookie_store.get_cookies())
+        print(f"全局cookies已更新，字段数: {len(cookies)}")
         
         return True
         
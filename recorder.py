@@ -0,0 +1,260 @@
+# 请求录制/回放 - 把真实运行中的请求和响应保存为本地样本（自动脱敏），
+# 回放时按原始耗时返回这些样本，用于离线基准测试，不再访问真实系统
+import io
+import os
+import re
+import json
+import time
+import base64
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, quote, quote_plus
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# 默认样本目录（相对于工作目录）
+FIXTURES_DIR = 'fixtures'
+
+REDACTED = 'REDACTED'
+
+# Token类字段：csrfToken / _token / token / ticket 的值（JSON、表单、页面脚本、URL参数）
+TOKEN_PATTERN = re.compile(r'((?:csrf_?token|_token|token|ticket)["\']?\s*[:=]\s*["\']?)([^"\'&\s,;<>}]+)',
+                           re.IGNORECASE)
+
+# URL路径参数和重定向地址中的会话ID（;jsessionid=...）
+SESSION_ID_PATTERN = re.compile(r'(jsessionid=)([^;?&#"\'\s<>]+)', re.IGNORECASE)
+
+# Set-Cookie中每个Cookie的 名称=值（开头或逗号之后；Expires中的逗号后面没有等号，不会误匹配）
+SET_COOKIE_PATTERN = re.compile(r'(^|,\s*)([^=;,\s]+)=([^;,]*)')
+
+# 响应头中已按解码后的内容保存，不再适用的字段
+_DROPPED_RESPONSE_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+
+class Redactor:
+    """脱敏：Cookie值、Token，以及学号、姓名等敏感字符串（包括URL编码后的形式）"""
+
+    def __init__(self, replacements):
+        # 较长的字符串先替换，避免短字符串是长字符串一部分时替换不完整
+        self.replacements = []
+        for secret, placeholder in sorted(replacements.items(), key=lambda item: -len(item[0])):
+            if not secret:
+                continue
+            # URL编码后的形式替换为同样编码的占位符，表单内容仍然有效
+            for encode in (str, quote, quote_plus):
+                pair = (encode(secret), encode(placeholder))
+                if pair not in self.replacements:
+                    self.replacements.append(pair)
+
+    def text(self, value):
+        if not value:
+            return value
+        for secret, placeholder in self.replacements:
+            value = value.replace(secret, placeholder)
+        value = SESSION_ID_PATTERN.sub(lambda m: m.group(1) + REDACTED, value)
+        return TOKEN_PATTERN.sub(lambda m: m.group(1) + REDACTED, value)
+
+    @staticmethod
+    def cookie_header(value):
+        """Cookie请求头：保留名称，值全部替换"""
+        return '; '.join(
+            f"{item.split('=', 1)[0].strip()}={REDACTED}" if '=' in item else item.strip()
+            for item in value.split(';') if item.strip()
+        )
+
+    @staticmethod
+    def set_cookie_header(value):
+        """Set-Cookie响应头（多个Cookie会被合并为逗号分隔）：只替换值，保留Path、Expires等属性"""
+        return SET_COOKIE_PATTERN.sub(lambda m: f"{m.group(1)}{m.group(2)}={REDACTED}", value)
+
+    def headers(self, headers):
+        result = {}
+        for name, value in headers.items():
+            lower = name.lower()
+            if lower == 'cookie':
+                value = self.cookie_header(value)
+            elif lower == 'set-cookie':
+                value = self.set_cookie_header(value)
+            elif lower in ('authorization', 'proxy-authorization'):
+                value = REDACTED
+            else:
+                value = self.text(value)
+            result[name] = value
+        return result
+
+
+def _encode_body(content):
+    """响应体能按UTF-8解码时保存为文本，否则保存为base64"""
+    if content is None:
+        return None, 'text'
+    if isinstance(content, str):
+        return content, 'text'
+    try:
+        return content.decode('utf-8'), 'text'
+    except UnicodeDecodeError:
+        return base64.b64encode(content).decode('ascii'), 'base64'
+
+
+class RecordingAdapter(BaseAdapter):
+    """录制适配器：请求交给内部适配器发送，把脱敏后的请求和响应逐条写入样本目录"""
+
+    def __init__(self, inner, directory, redactor, endpoint_resolver):
+        super().__init__()
+        self.inner = inner
+        self.directory = directory
+        self.redactor = redactor
+        self.endpoint_resolver = endpoint_resolver
+        self._lock = threading.Lock()
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        resp = self.inner.send(request, **kwargs)
+        # 非流式请求在这里读取响应体，录制的耗时包含下载时间（与请求指标一致）
+        content = resp.content if not kwargs.get('stream') else None
+        elapsed = time.perf_counter() - started
+        try:
+            self._write(request, resp, content, elapsed)
+        except Exception as e:
+            # 录制失败不影响正常请求
+            print(f"请求录制: 保存样本失败 {e}")
+        return resp
+
+    def _write(self, request, resp, content, elapsed):
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', errors='replace')
+        response_body, body_encoding = _encode_body(content)
+        if body_encoding == 'text':
+            response_body = self.redactor.text(response_body)
+        response_headers = {name: value for name, value in resp.headers.items()
+                            if name.lower() not in _DROPPED_RESPONSE_HEADERS}
+        endpoint = self.endpoint_resolver(request.url)
+
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        fixture = {
+            'seq': seq,
+            'recorded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            'endpoint': endpoint,
+            'method': request.method,
+            'url': self.redactor.text(request.url),
+            'request_headers': self.redactor.headers(request.headers),
+            'request_body': self.redactor.text(body),
+            'status': resp.status_code,
+            'reason': resp.reason,
+            'headers': self.redactor.headers(response_headers),
+            'body': response_body,
+            'body_encoding': body_encoding,
+            'elapsed': round(elapsed, 6)
+        }
+        path = os.path.join(self.directory, f"{seq:05d}_{endpoint}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=2)
+
+    def close(self):
+        self.inner.close()
+
+
+def load_fixtures(directory):
+    """按录制顺序读取样本目录"""
+    if not directory or not os.path.isdir(directory):
+        raise FileNotFoundError(f"样本目录不存在: {directory}")
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+            fixtures.append(json.load(f))
+    if not fixtures:
+        raise FileNotFoundError(f"样本目录中没有录制文件: {directory}")
+    return fixtures
+
+
+class ReplayAdapter(BaseAdapter):
+    """回放适配器：按 (方法, URL路径) 依次返回录制的响应，用完后从头循环
+
+    speed 为回放速度倍数：1 按原始耗时等待，2 为两倍速，0 不等待。
+    """
+
+    def __init__(self, directory, speed=1.0):
+        super().__init__()
+        self.directory = directory
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._positions = {}
+        for fixture in load_fixtures(directory):
+            key = (fixture['method'].upper(), urlsplit(fixture['url']).path)
+            self._queues.setdefault(key, []).append(fixture)
+
+    def _next_fixture(self, method, url):
+        key = (method.upper(), urlsplit(url).path)
+        with self._lock:
+            fixtures = self._queues.get(key)
+            if not fixtures:
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+        return fixtures[position % len(fixtures)]
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        fixture = self._next_fixture(request.method, request.url)
+        if fixture is None:
+            return self._build_response(request, 404, 'Not Found', {'Content-Type': 'text/plain'},
+                                        b'No recorded fixture', 0.0)
+
+        if fixture.get('body_encoding') == 'base64':
+            content = base64.b64decode(fixture['body'] or '')
+        else:
+            content = (fixture['body'] or '').encode('utf-8')
+        elapsed = fixture.get('elapsed', 0.0)
+        if self.speed:
+            time.sleep(elapsed / self.speed)
+        return self._build_response(request, fixture['status'], fixture.get('reason'),
+                                    fixture.get('headers', {}), content, elapsed)
+
+    def _build_response(self, request, status, reason, headers, content, elapsed):
+        resp = requests.Response()
+        resp.status_code = status
+        resp.reason = reason
+        resp.headers = CaseInsensitiveDict(headers)
+        resp.headers['Content-Length'] = str(len(content))
+        resp._content = content
+        resp._content_consumed = True
+        resp.raw = io.BytesIO(content)
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        resp.elapsed = timedelta(seconds=elapsed)
+        return resp
+
+    def close(self):
+        pass
+
+
+def default_recording_dir():
+    """按开始时间命名的录制目录，如 fixtures/20250101_120000"""
+    return os.path.join(FIXTURES_DIR, datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+
+def start_recording(session, directory, replacements, endpoint_resolver):
+    """把session上已挂载的适配器替换为录制适配器"""
+    redactor = Redactor(replacements)
+    for prefix in ('https://', 'http://'):
+        session.mount(prefix, RecordingAdapter(session.get_adapter(prefix), directory, redactor, endpoint_resolver))
+    return directory
+
+
+def start_replay(session, directory, speed=1.0):
+    """session的所有请求改为从样本目录回放"""
+    adapter = ReplayAdapter(directory, speed)
+    for prefix in ('https://', 'http://'):
+        session.mount(prefix, adapter)
+    return adapter
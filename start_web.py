@@ -13,6 +13,19 @@ import atexit
 import threading
 from threading import Timer
 
+# 启动器（exe.py 测量冷启动时）通过该环境变量传入启动进程的时刻（time.time()），
+# 包含解释器启动和PyInstaller onefile解压
+LAUNCH_TIME_ENV = 'SZU_BOOKING_LAUNCH_TIME'
+
+# 本模块开始执行的时刻，没有更早的时间来源时作为起点
+MODULE_START = time.time()
+
+# 冷启动期间需要关注的重量级模块（应延迟到首次抢票/获取Cookie时才加载）
+HEAVY_MODULES = ('requests', 'selenium', 'qiangpiao', 'sqlite3')
+
+# Web界面冷启动时间预算（秒），--startup-profile 超出时给出提示
+STARTUP_BUDGET = 1.5
+
 # 处理PyInstaller打包后的资源路径
 def resource_path(relative_path):
     """获取资源文件的绝对路径，支持PyInstaller打包"""
@@ -51,8 +64,9 @@ def cleanup_on_exit():
         # 如果有web_app实例，停止抢票
         if app_instance:
             try:
-                from web_app import booking_status
-                booking_status['running'] = False
+                from web_app import booking_state, cookie_monitor
+                booking_state.request_stop()
+                cookie_monitor.stop()
             except:
                 pass
         
@@ -98,13 +112,13 @@ def setup_logging():
     warnings.filterwarnings("ignore", message=".*SSL.*")
     warnings.filterwarnings("ignore", message=".*certificate.*")
     
-    # 设置urllib3日志级别，减少SSL警告
-    try:
-        import urllib3
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        urllib3.disable_warnings(urllib3.exceptions.SubjectAltNameWarning)
-    except:
-        pass
+    # 设置urllib3日志级别，减少SSL警告（未加载时不提前导入，qiangpiao导入时会自行处理）
+    urllib3 = sys.modules.get('urllib3')
+    if urllib3 is not None:
+        try:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        except Exception:
+            pass
 
 def cleanup_files():
     """清理历史记录和日志文件"""
@@ -170,25 +184,83 @@ def force_reset_booking_status():
         # 在导入前先清理
         if 'web_app' in sys.modules:
             web_app_module = sys.modules['web_app']
-            if hasattr(web_app_module, 'booking_status'):
-                web_app_module.booking_status = {
-                    'running': False,
-                    'thread': None,
-                    'results': [],
-                    'current_status': '未开始',
-                    'retry_count': 0,
-                    'start_time': None,
-                    'stop_event': None
-                }
+            if hasattr(web_app_module, 'booking_state'):
+                web_app_module.booking_state.reset()
     except Exception:
         pass
 
+def process_start_time():
+    """返回 (起点时刻, 说明)：优先用启动器传入的时刻，其次用psutil读取进程创建时间，
+    都没有时退回本模块开始执行的时刻（不含解释器启动和解压）"""
+    try:
+        return float(os.environ[LAUNCH_TIME_ENV]), '启动器启动进程'
+    except (KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().create_time(), '进程创建'
+    except Exception:
+        return MODULE_START, '启动脚本开始执行'
+
+def loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+class ImportProfiler:
+    """记录每个模块首次导入的耗时（含子模块 / 仅自身），用于 --startup-profile"""
+    
+    def __init__(self):
+        self.records = {}
+        self._stack = []
+        self._original_import = None
+    
+    def start(self):
+        import builtins
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+    
+    def stop(self):
+        import builtins
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+    
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # 已导入的模块和包内相对导入不单独计时（相对导入计入外层模块）
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        started = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.records.setdefault(name, (elapsed, elapsed - children))
+    
+    def print_report(self, phases, heavy_at_startup, top=15):
+        """打印各阶段耗时、最慢的模块，以及启动完成时和强制导入qiangpiao后加载的重量级模块"""
+        print("\n⏱️  启动耗时分析")
+        print("-" * 50)
+        for name, seconds in phases:
+            print(f"   {name:<24}{seconds * 1000:>10.1f} ms")
+        
+        print(f"\n   最慢的{top}个模块（仅自身 / 含子模块，ms）:")
+        slowest = sorted(self.records.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        for name, (inclusive, own) in slowest:
+            print(f"   {name:<32}{own * 1000:>9.1f}{inclusive * 1000:>10.1f}")
+        
+        print(f"\n   启动完成时已加载的重量级模块: {', '.join(heavy_at_startup) or '无'}")
+        print(f"   导入qiangpiao后已加载的重量级模块: {', '.join(loaded_heavy_modules()) or '无'}")
+        print("-" * 50)
+
 def check_files():
     """检查必要文件"""
     print("� 检查必要文件...")
     
     # 检查Python文件
-    required_files = ['web_app.py', 'config.py', 'qiangpiao.py']
+    required_files = ['web_app.py', 'config.py', 'qiangpiao.py', 'cookie_store.py', 'history_store.py', 'poll_scheduler.py', 'metrics.py', 'cookie_monitor.py', 'recorder.py', 'http_session.py']
     missing_files = []
     
     for file in required_files:
@@ -211,15 +283,29 @@ def check_files():
 def main():
     global app_instance
     
+    # --startup-profile: 打印启动各阶段和各模块的导入耗时
+    profiler = None
+    phases = []
+    started_at, started_label = process_start_time()
+    if '--startup-profile' in sys.argv:
+        profiler = ImportProfiler()
+        profiler.start()
+        phases.append((f'{started_label}到main', time.time() - started_at))
+    
+    # --startup-check: 完成启动后立即退出，不打开浏览器、不启动服务（exe.py 用它测量打包后的冷启动时间）
+    startup_check = '--startup-check' in sys.argv
+    
     print("🚀 深大体育场馆预约系统 v1.0")
     print("=" * 50)
     
     # 初始化错误抑制（在其他导入之前）
+    phase_start = time.perf_counter()
     try:
         from error_filter import initialize_error_suppression
         initialize_error_suppression()
     except ImportError:
         pass  # 如果没有错误过滤器模块，继续正常运行
+    phases.append(('错误过滤器', time.perf_counter() - phase_start))
     
     # 显示运行环境信息
     if getattr(sys, 'frozen', False):
@@ -262,24 +348,58 @@ def main():
         print("-" * 50)
 
         # 延迟3秒后打开浏览器
-        browser_timer = Timer(3.0, open_browser)
-        browser_timer.daemon = True  # 设置为守护线程
-        browser_timer.start()
-        active_threads.append(browser_timer)
+        if not startup_check:
+            browser_timer = Timer(3.0, open_browser)
+            browser_timer.daemon = True  # 设置为守护线程
+            browser_timer.start()
+            active_threads.append(browser_timer)
         
         # 强制重置状态
         force_reset_booking_status()
         
-        # 启动Flask应用
+        # 启动Flask应用（qiangpiao、requests、selenium 在首次使用时才加载）
         print("📦 导入Web应用模块...")
+        phase_start = time.perf_counter()
         from web_app import app
         app_instance = app
+        phases.append(('导入web_app', time.perf_counter() - phase_start))
+        
+        if profiler:
+            startup_total = time.time() - started_at
+            phases.append((f'冷启动合计（自{started_label}）', startup_total))
+            heavy_at_startup = loaded_heavy_modules()
+            # 单独测量首次抢票/Cookie操作时才会发生的延迟加载
+            phase_start = time.perf_counter()
+            import qiangpiao
+            phases.append(('(延迟) 导入qiangpiao', time.perf_counter() - phase_start))
+            profiler.stop()
+            profiler.print_report(phases, heavy_at_startup)
+            if startup_total > STARTUP_BUDGET:
+                print(f"⚠️ 冷启动 {startup_total:.2f}秒，超出预算 {STARTUP_BUDGET}秒")
+            else:
+                print(f"✅ 冷启动 {startup_total:.2f}秒，在预算 {STARTUP_BUDGET}秒以内")
         
         # 再次确保状态重置
         print("✨ 初始化应用状态...")
-        from web_app import reset_booking_status
+        from web_app import reset_booking_status, cookie_monitor
         reset_booking_status()
         
+        if startup_check:
+            print(f"✅ 启动检查完成（自{started_label} {time.time() - started_at:.2f}秒）")
+            return
+        
+        # 录制 / 回放请求（--record [目录] / --replay 目录 [--replay-speed 倍数]），用于离线测试Web状态页面
+        if '--replay' in sys.argv or '--record' in sys.argv:
+            import qiangpiao
+            if '--replay' in sys.argv:
+                qiangpiao.start_request_replay(qiangpiao.argv_value('--replay'),
+                                               float(qiangpiao.argv_value('--replay-speed', '1')))
+            else:
+                qiangpiao.start_request_recording(qiangpiao.argv_value('--record'))
+        
+        # 后台低频检查Cookie是否有效，预计过期前自动重新获取
+        cookie_monitor.start()
+        
         print("🌐 Web服务器启动成功！")
         print("💡 首次启动可能需要几秒钟...")
         
@@ -1,32 +1,151 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, Response
 import json
-import os
 import threading
-import time
-from datetime import datetime, timedelta
-import logging
-from qiangpiao import get_available_slots, book_slot, check_login_status, extract_cookies_from_text, test_cookie_validity, update_cookie_in_file
-from config import CONFIG, SPORT_CODES, CAMPUS_CODES, TIME_SLOTS, get_campus_account, update_campus_account
+from datetime import datetime
+from config import CONFIG, SPORT_CODES, CAMPUS_CODES, TIME_SLOTS, ConfigError, config_store, get_campus_account, update_campus_account
+from cookie_store import cookie_store
+from cookie_monitor import CookieMonitor
 
 app = Flask(__name__)
 app.secret_key = 'qiangpiao_secret_key_2024'
 
+class BookingState:
+    """线程安全的抢票状态：加锁更新，按版本号缓存不可变的状态快照"""
+    
+    __slots__ = ('_condition', 'version', 'running', 'results', 'current_status', 'retry_count',
+                 'start_time', 'end_time', 'last_error', 'next_query_at', 'thread', 'stop_event',
+                 '_snapshot_version', '_snapshot_json')
+    
+    # 变化时需要推送给前端的状态字段
+    # next_query_at 每次等待只设置一次，倒计时由浏览器本地计算，避免每秒产生一次状态变化
+    PUBLISHED_FIELDS = ('running', 'results', 'current_status', 'retry_count', 'next_query_at')
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.version = 0
+        self._snapshot_version = None
+        self._snapshot_json = None
+        self._set_defaults()
+    
+    def _set_defaults(self):
+        self.running = False
+        self.results = ()
+        self.current_status = '未开始'
+        self.retry_count = 0
+        self.start_time = None
+        self.end_time = None
+        self.last_error = None
+        self.next_query_at = None
+        self.thread = None
+        self.stop_event = None
+    
+    def _bump(self):
+        """版本号加一并唤醒等待者（调用方需持有锁）"""
+        self.version += 1
+        self._condition.notify_all()
+    
+    def reset(self):
+        """重置为初始状态"""
+        with self._condition:
+            self._set_defaults()
+            self._bump()
+    
+    def begin(self, thread, stop_event):
+        """原子地标记为运行中，已在运行或上一个工作线程尚未退出时返回False"""
+        with self._condition:
+            if self.running or (self.thread is not None and self.thread.is_alive()):
+                return False
+            self.running = True
+            self.results = ()
+            self.current_status = '正在启动...'
+            self.retry_count = 0
+            self.start_time = datetime.now()
+            self.end_time = None
+            self.last_error = None
+            self.next_query_at = None
+            self.thread = thread
+            self.stop_event = stop_event
+            self._bump()
+            return True
+    
+    def update(self, **changes):
+        """更新状态字段，仅在推送字段变化时增加版本号"""
+        with self._condition:
+            return self._update(changes)
+    
+    def update_for(self, stop_event, **changes):
+        """工作线程的状态更新：只有该线程仍是当前这次抢票（stop_event相同）时才生效"""
+        with self._condition:
+            if self.stop_event is not stop_event:
+                return False
+            return self._update(changes)
+    
+    def _update(self, changes):
+        """更新状态字段（调用方需持有锁）"""
+        changed = False
+        for key, value in changes.items():
+            if key == 'results':
+                # 保存副本，避免与工作线程中的列表共享
+                value = tuple(dict(item) for item in value)
+            if key in self.PUBLISHED_FIELDS and getattr(self, key) != value:
+                changed = True
+                if key == 'running' and not value:
+                    self.end_time = datetime.now()
+            setattr(self, key, value)
+        if changed:
+            self._bump()
+        return changed
+    
+    def request_stop(self):
+        """发出停止信号；running 保持为True直到工作线程退出（由工作线程最后一次更新置为False）"""
+        with self._condition:
+            stop_event = self.stop_event
+            if stop_event is None or not self.running:
+                return
+            stop_event.set()
+            self._update({'current_status': '正在停止...', 'next_query_at': None})
+    
+    def snapshot_json(self):
+        """返回 (版本号, JSON快照)，版本未变化时直接复用已序列化的结果"""
+        with self._condition:
+            if self._snapshot_version != self.version:
+                self._snapshot_json = json.dumps({
+                    'version': self.version,
+                    'running': self.running,
+                    'results': list(self.results),
+                    'current_status': self.current_status,
+                    'retry_count': self.retry_count,
+                    'next_query_at': self.next_query_at,
+                    'start_timestamp': self.start_time.timestamp() if self.start_time else None,
+                    'end_timestamp': self.end_time.timestamp() if self.end_time else None
+                }, ensure_ascii=False)
+                self._snapshot_version = self.version
+            return self.version, self._snapshot_json
+    
+    def wait_for_change(self, last_version, timeout):
+        """等待版本号变化，返回最新版本号（超时时返回原版本号）"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != last_version, timeout)
+            return self.version
+
+
+# 全局抢票状态
+booking_state = BookingState()
+
+
 def reset_booking_status():
     """重置抢票状态"""
-    global booking_status
-    booking_status = {
-        'running': False,
-        'thread': None,
-        'results': [],
-        'current_status': '未开始',
-        'retry_count': 0,
-        'start_time': None,
-        'stop_event': None
-    }
-
-# 全局变量 - 初始化时重置
-booking_status = {}
-reset_booking_status()
+    booking_state.reset()
+
+
+def update_booking_status(**changes):
+    """更新抢票状态，仅在推送字段变化时通知订阅者"""
+    return booking_state.update(**changes)
+
+@app.before_request
+def refresh_config():
+    """每个请求前同步config.json的修改（文件未变化时只有一次stat）"""
+    config_store.refresh()
 
 @app.route('/')
 def index():
@@ -42,6 +161,7 @@ def config_page():
     """配置页面"""
     return render_template('config.html', 
                          config=CONFIG, 
+                         target_date_auto=config_store.target_date_is_auto(),
                          sport_codes=SPORT_CODES, 
                          campus_codes=CAMPUS_CODES,
                          time_slots=TIME_SLOTS)
@@ -54,40 +174,50 @@ def cookie_page():
 @app.route('/booking')
 def booking_page():
     """抢票页面"""
-    return render_template('booking.html', status=booking_status)
+    return render_template('booking.html', status=booking_state)
 
 @app.route('/api/config', methods=['POST'])
 def update_config():
-    """更新配置"""
+    """更新配置（校验后原子写入config.json，正在运行的抢票在下一次循环生效）"""
     try:
         data = request.json
         
-        # 更新CONFIG
+        changes = {}
         if 'XQ' in data:
-            CONFIG['XQ'] = data['XQ']
+            changes['XQ'] = data['XQ']
         if 'XMDM' in data:
-            CONFIG['XMDM'] = data['XMDM']
+            changes['XMDM'] = data['XMDM']
         if 'TARGET_DATE' in data:
-            CONFIG['TARGET_DATE'] = data['TARGET_DATE']
+            # 留空表示自动使用明天
+            changes['TARGET_DATE'] = (data['TARGET_DATE'] or '').strip()
         if 'PREFERRED_TIMES' in data:
-            CONFIG['PREFERRED_TIMES'] = [t.strip() for t in data['PREFERRED_TIMES'] if t.strip()]
+            changes['PREFERRED_TIMES'] = [t.strip() for t in data['PREFERRED_TIMES'] if t.strip()]
         if 'USER_INFO' in data:
-            CONFIG['USER_INFO'].update(data['USER_INFO'])
+            changes['USER_INFO'] = dict(data['USER_INFO'])
         if 'MAX_RETRY_TIMES' in data:
-            CONFIG['MAX_RETRY_TIMES'] = int(data['MAX_RETRY_TIMES'])
+            changes['MAX_RETRY_TIMES'] = int(data['MAX_RETRY_TIMES'])
         if 'RETRY_INTERVAL' in data:
-            CONFIG['RETRY_INTERVAL'] = int(data['RETRY_INTERVAL'])
+            changes['RETRY_INTERVAL'] = int(data['RETRY_INTERVAL'])
+        if 'SCHEDULER' in data:
+            changes['SCHEDULER'] = data['SCHEDULER']
+        if 'OPENING_TIME' in data:
+            changes['OPENING_TIME'] = data['OPENING_TIME'].strip()
+        if 'VENUE_PRIORITY' in data:
+            changes['VENUE_PRIORITY'] = {str(code): int(priority) for code, priority in data['VENUE_PRIORITY'].items()}
         
         # 保存到文件
-        save_config_to_file()
+        config_store.update(changes)
         
         return jsonify({'success': True, 'message': '配置更新成功！'})
+    except ConfigError as e:
+        return jsonify({'success': False, 'message': f'配置无效: {str(e)}'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'配置更新失败: {str(e)}'})
 
 @app.route('/api/cookie/test', methods=['POST'])
 def test_cookie():
     """测试Cookie有效性"""
+    from qiangpiao import extract_cookies_from_text, test_cookie_validity
     try:
         data = request.json
         cookie_text = data.get('cookie', '').strip()
@@ -152,6 +282,7 @@ def test_cookie():
 @app.route('/api/cookie/update', methods=['POST'])
 def update_cookie():
     """更新Cookie"""
+    from qiangpiao import extract_cookies_from_text, test_cookie_validity, update_cookie_in_file
     try:
         data = request.json
         cookie_text = data.get('cookie', '').strip()
@@ -200,7 +331,7 @@ def update_cookie():
                 print("✅ Cookie更新成功")
                 return jsonify({
                     'success': True, 
-                    'message': 'Cookie更新成功！请刷新页面查看最新状态',
+                    'message': 'Cookie更新成功，已立即生效！',
                     'cookie_count': len(cookies)
                 })
             else:
@@ -220,28 +351,23 @@ def update_cookie():
 @app.route('/api/booking/start', methods=['POST'])
 def start_booking():
     """开始抢票"""
+    from qiangpiao import check_login_status, cookie_holder
     try:
-        if booking_status['running']:
+        if booking_state.running:
             return jsonify({'success': False, 'message': '抢票已在运行中'})
         
-        # 检查登录状态
+        # 检查登录状态（先同步外部写入cookies.json的新Cookie）
+        cookie_holder.refresh()
         if not check_login_status():
             return jsonify({'success': False, 'message': 'Cookie已失效，请更新Cookie'})
         
-        # 创建停止事件
+        # 创建停止事件和抢票线程
         stop_event = threading.Event()
-        booking_status['stop_event'] = stop_event
-        
-        # 启动抢票线程
-        booking_status['running'] = True
-        booking_status['results'] = []
-        booking_status['current_status'] = '正在启动...'
-        booking_status['retry_count'] = 0
-        booking_status['start_time'] = datetime.now()
-        
         thread = threading.Thread(target=booking_worker, args=(stop_event,))
         thread.daemon = True  # 设置为守护线程，主程序退出时会自动结束
-        booking_status['thread'] = thread
+        
+        if not booking_state.begin(thread, stop_event):
+            return jsonify({'success': False, 'message': '抢票已在运行中'})
         thread.start()
         
         return jsonify({'success': True, 'message': '抢票已启动！'})
@@ -252,10 +378,7 @@ def start_booking():
 def stop_booking():
     """停止抢票"""
     try:
-        booking_status['running'] = False
-        if booking_status['stop_event']:
-            booking_status['stop_event'].set()  # 设置停止信号
-        booking_status['current_status'] = '正在停止...'
+        booking_state.request_stop()  # 设置停止信号
         
         return jsonify({'success': True, 'message': '正在停止抢票...'})
     except Exception as e:
@@ -263,74 +386,75 @@ def stop_booking():
 
 @app.route('/api/booking/status')
 def booking_status_api():
-    """获取抢票状态"""
-    # 创建状态副本，排除不可序列化的对象
-    status = {
-        'running': booking_status['running'],
-        'results': booking_status['results'],
-        'current_status': booking_status['current_status'],
-        'retry_count': booking_status['retry_count']
-    }
-    
-    if booking_status['start_time']:
-        elapsed = datetime.now() - booking_status['start_time']
-        status['elapsed_time'] = str(elapsed).split('.')[0]  # 去掉微秒
-    else:
-        status['elapsed_time'] = '00:00:00'
+    """获取抢票状态（版本未变化时复用缓存的快照，支持If-None-Match）"""
+    version, payload = booking_state.snapshot_json()
+    etag = f'"{version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+    return Response(payload, mimetype='application/json', headers={'ETag': etag})
+
+@app.route('/api/booking/events')
+def booking_events():
+    """抢票状态推送（Server-Sent Events），仅在状态变化时发送"""
+    def event_stream():
+        version, payload = booking_state.snapshot_json()
+        yield f"data: {payload}\n\n"
+        while True:
+            new_version = booking_state.wait_for_change(version, timeout=15)
+            if new_version == version:
+                # 心跳，保持连接并及时发现已关闭的页面
+                yield ": keepalive\n\n"
+                continue
+            version, payload = booking_state.snapshot_json()
+            yield f"data: {payload}\n\n"
     
-    return jsonify(status)
+    return Response(event_stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/history')
+def booking_history():
+    """分页查询抢票历史（每次查询/预约请求的耗时、状态码和服务器返回）
+    参数: page, page_size, endpoint=query|book, success=1|0
+    """
+    from history_store import history_store
+    try:
+        success = request.args.get('success')
+        records, total = history_store.query(
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('page_size', 50, type=int),
+            endpoint=request.args.get('endpoint') or None,
+            success=None if success in (None, '') else success in ('1', 'true')
+        )
+        return jsonify({
+            'success': True,
+            'total': total,
+            'records': records
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'查询历史失败: {str(e)}'})
+
+@app.route('/api/metrics')
+def metrics_api():
+    """请求指标（Prometheus文本格式）：各接口耗时分布、状态码、错误、流量和循环耗时"""
+    from metrics import request_metrics
+    return Response(request_metrics.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/api/cookie/current', methods=['GET'])
 def get_current_cookie():
     """获取当前Cookie状态"""
+    from qiangpiao import test_cookie_validity
     try:
         print("获取当前Cookie状态...")
         
-        # 读取qiangpiao.py文件中的Cookie
-        try:
-            with open('qiangpiao.py', 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            print(f"读取文件失败: {e}")
-            return jsonify({
-                'success': False, 
-                'message': f'读取qiangpiao.py文件失败: {str(e)}'
-            })
-        
-        # 提取当前Cookie
-        start_marker = 'raw_cookie = """'
-        end_marker = '"""'
-        
-        start_idx = content.find(start_marker)
-        if start_idx == -1:
-            return jsonify({
-                'success': False, 
-                'message': '未找到Cookie定义，请检查qiangpiao.py文件格式'
-            })
-        
-        start_idx += len(start_marker)
-        end_idx = content.find(end_marker, start_idx)
-        
-        if end_idx == -1:
-            return jsonify({
-                'success': False, 
-                'message': 'Cookie格式错误，缺少结束标记'
-            })
-        
-        current_cookie_text = content[start_idx:end_idx].strip()
+        # 从Cookie存储读取（内存缓存，文件变化时才重新加载）
+        current_cookie_text = cookie_store.get_text()
         print(f"提取到Cookie文本长度: {len(current_cookie_text)}")
         
-        # 解析Cookie字段
-        try:
-            cookie_fields = extract_cookies_from_text(current_cookie_text)
-            print(f"解析到Cookie字段: {len(cookie_fields)} 个")
-        except Exception as e:
-            print(f"Cookie解析失败: {e}")
-            return jsonify({
-                'success': False,
-                'message': f'Cookie解析失败: {str(e)}',
-                'cookie_text': current_cookie_text
-            })
+        # 已解析的Cookie字段（随存储一起缓存）
+        cookie_fields = cookie_store.get_cookies()
+        print(f"解析到Cookie字段: {len(cookie_fields)} 个")
         
         # 测试Cookie有效性
         print("测试当前Cookie有效性...")
@@ -342,14 +466,8 @@ def get_current_cookie():
             is_valid = False
             message = f"测试失败: {str(e)}"
         
-        # 获取文件修改时间
-        last_update = None
-        try:
-            import os
-            stat = os.stat('qiangpiao.py')
-            last_update = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-        except Exception as e:
-            print(f"获取文件修改时间失败: {e}")
+        # 获取Cookie最后更新时间
+        last_update = cookie_store.get_updated_at()
         
         # 检查关键Cookie字段
         key_cookies = ['route', 'JSESSIONID', 'MOD_AUTH_CAS']
@@ -382,6 +500,136 @@ def get_current_cookie():
             'message': f'获取Cookie失败: {str(e)}'
         })
 
+# 同一时间只允许一个浏览器获取Cookie（网页按钮和后台Cookie监控共用）
+cookie_refresh_lock = threading.Lock()
+
+def run_auto_get_cookie(username, password, timeout=180):
+    """启动浏览器登录获取Cookie并更新到存储，返回结果字典"""
+    if not cookie_refresh_lock.acquire(blocking=False):
+        return {'success': False, 'message': '正在获取Cookie，请在已打开的浏览器中完成登录'}
+    
+    # 导入并调用获取cookie的函数
+    worker_started = False
+    try:
+        from get_cookie import auto_login_and_get_cookies
+        from qiangpiao import update_cookie_in_file
+        
+        print(f"启动浏览器获取Cookie... 用户: {username}")
+        
+        # 创建一个回调函数来更新状态
+        status_messages = []
+        def status_callback(message):
+            status_messages.append(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+            print(f"Cookie获取状态: {message}")
+        
+        # 使用线程来避免阻塞web请求
+        result = {'success': False, 'message': '', 'cookie': '', 'status_log': []}
+        
+        def get_cookie_worker():
+            try:
+                print("开始Cookie获取工作线程...")
+                cookie_str = auto_login_and_get_cookies(username, password, status_callback)
+                print(f"Cookie获取结果: {'成功' if cookie_str else '失败'}")
+                
+                if cookie_str:
+                    # 尝试更新到文件
+                    print("尝试更新Cookie到文件...")
+                    success = update_cookie_in_file(cookie_str)
+                    if success:
+                        result.update({
+                            'success': True, 
+                            'cookie': cookie_str,
+                            'message': 'Cookie获取并更新成功！',
+                            'status_log': status_messages
+                        })
+                        print("✅ Cookie获取和更新都成功")
+                    else:
+                        result.update({
+                            'success': False, 
+                            'message': 'Cookie获取成功但更新到文件失败',
+                            'cookie': cookie_str,
+                            'status_log': status_messages
+                        })
+                        print("⚠️ Cookie获取成功但文件更新失败")
+                else:
+                    result.update({
+                        'success': False, 
+                        'message': 'Cookie获取失败，请检查账号密码或网络连接',
+                        'status_log': status_messages
+                    })
+                    print("❌ Cookie获取失败")
+            except Exception as e:
+                error_msg = f'获取过程出错: {str(e)}'
+                result.update({
+                    'success': False,
+                    'message': error_msg,
+                    'status_log': status_messages
+                })
+                print(f"❌ Cookie获取线程异常: {e}")
+                import traceback
+                traceback.print_exc()
+            finally:
+                # 浏览器关闭后才允许下一次获取（等待超时时线程仍在运行）
+                cookie_refresh_lock.release()
+        
+        # 启动获取线程并等待完成
+        thread = threading.Thread(target=get_cookie_worker)
+        thread.daemon = True
+        thread.start()
+        worker_started = True
+        
+        print("等待Cookie获取线程完成...")
+        thread.join(timeout=timeout)
+        
+        if thread.is_alive():
+            result.update({
+                'success': False,
+                'message': '获取超时，请检查是否在浏览器中完成了登录。如遇验证码请及时输入。',
+                'status_log': status_messages
+            })
+            print("⚠️ Cookie获取超时")
+        
+        print(f"返回结果: success={result['success']}, message_length={len(result.get('message', ''))}")
+        return result
+        
+    except ImportError as e:
+        error_msg = f'获取Cookie模块导入失败: {str(e)}'
+        print(f"❌ 导入错误: {error_msg}")
+        return {'success': False, 'message': error_msg}
+    except Exception as e:
+        error_msg = f'模块加载出错: {str(e)}'
+        print(f"❌ 模块错误: {error_msg}")
+        import traceback
+        traceback.print_exc()
+        return {'success': False, 'message': error_msg}
+    finally:
+        # 工作线程未启动时由这里释放，否则由工作线程结束时释放
+        if not worker_started:
+            cookie_refresh_lock.release()
+
+def auto_refresh_cookie():
+    """Cookie监控的刷新回调：使用保存的校园网账户自动获取Cookie"""
+    account = get_campus_account()
+    username = account.get('username', '')
+    password = account.get('password', '')
+    if not username or not password:
+        return False, '未保存校园网账户密码，无法自动刷新Cookie'
+    result = run_auto_get_cookie(username, password)
+    return result['success'], result['message']
+
+def probe_cookie():
+    from qiangpiao import probe_login_status, cookie_holder
+    # 先同步cookies.json（可能被cookie_manager.py或get_cookie.py改写），保证检查的就是监控记录的那组Cookie
+    cookie_holder.refresh()
+    return probe_login_status()
+
+cookie_monitor = CookieMonitor(cookie_store, check=probe_cookie, refresh=auto_refresh_cookie, config=CONFIG)
+
+@app.route('/api/cookie/health', methods=['GET'])
+def cookie_health():
+    """Cookie健康状态：获取时间、最后有效时间、学习到的有效期、预计刷新时间"""
+    return jsonify(cookie_monitor.snapshot())
+
 @app.route('/api/cookie/auto_get', methods=['POST'])
 def auto_get_cookie():
     """自动获取Cookie - 使用有界面浏览器"""
@@ -408,95 +656,7 @@ def auto_get_cookie():
             update_campus_account(username, password)
             print(f"使用新密码并保存，用户: {username}")
         
-        # 导入并调用获取cookie的函数
-        try:
-            from get_cookie import auto_login_and_get_cookies
-            
-            print(f"启动浏览器获取Cookie... 用户: {username}")
-            
-            # 创建一个回调函数来更新状态
-            status_messages = []
-            def status_callback(message):
-                status_messages.append(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
-                print(f"Cookie获取状态: {message}")
-            
-            # 使用线程来避免阻塞web请求
-            import threading
-            result = {'success': False, 'message': '', 'cookie': '', 'status_log': []}
-            
-            def get_cookie_worker():
-                try:
-                    print("开始Cookie获取工作线程...")
-                    cookie_str = auto_login_and_get_cookies(username, password, status_callback)
-                    print(f"Cookie获取结果: {'成功' if cookie_str else '失败'}")
-                    
-                    if cookie_str:
-                        # 尝试更新到文件
-                        print("尝试更新Cookie到文件...")
-                        success = update_cookie_in_file(cookie_str)
-                        if success:
-                            result.update({
-                                'success': True, 
-                                'cookie': cookie_str,
-                                'message': 'Cookie获取并更新成功！',
-                                'status_log': status_messages
-                            })
-                            print("✅ Cookie获取和更新都成功")
-                        else:
-                            result.update({
-                                'success': False, 
-                                'message': 'Cookie获取成功但更新到文件失败',
-                                'cookie': cookie_str,
-                                'status_log': status_messages
-                            })
-                            print("⚠️ Cookie获取成功但文件更新失败")
-                    else:
-                        result.update({
-                            'success': False, 
-                            'message': 'Cookie获取失败，请检查账号密码或网络连接',
-                            'status_log': status_messages
-                        })
-                        print("❌ Cookie获取失败")
-                except Exception as e:
-                    error_msg = f'获取过程出错: {str(e)}'
-                    result.update({
-                        'success': False,
-                        'message': error_msg,
-                        'status_log': status_messages
-                    })
-                    print(f"❌ Cookie获取线程异常: {e}")
-                    import traceback
-                    traceback.print_exc()
-            
-            # 启动获取线程并等待完成
-            thread = threading.Thread(target=get_cookie_worker)
-            thread.daemon = True
-            thread.start()
-            
-            print("等待Cookie获取线程完成...")
-            thread.join(timeout=180)  # 减少到3分钟
-            
-            if thread.is_alive():
-                result.update({
-                    'success': False,
-                    'message': '获取超时，请检查是否在浏览器中完成了登录。如遇验证码请及时输入。',
-                    'status_log': status_messages
-                })
-                print("⚠️ Cookie获取超时")
-            
-            print(f"返回结果: success={result['success']}, message_length={len(result.get('message', ''))}")
-            return jsonify(result)
-            
-        except ImportError as e:
-            error_msg = f'获取Cookie模块导入失败: {str(e)}'
-            print(f"❌ 导入错误: {error_msg}")
-            return jsonify({'success': False, 'message': error_msg})
-        except Exception as e:
-            error_msg = f'模块加载出错: {str(e)}'
-            print(f"❌ 模块错误: {error_msg}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'success': False, 'message': error_msg})
+        return jsonify(run_auto_get_cookie(username, password))
             
     except Exception as e:
         error_msg = f'操作失败: {str(e)}'
@@ -537,11 +697,8 @@ def update_campus_account_api():
             current_account = get_campus_account()
             password = current_account.get('password', '')
         
-        # 更新内存中的账户信息
-        update_campus_account(username, password)
-        
-        # 保存到配置文件
-        save_success = save_config_to_file()
+        # 保存账户信息（account.json，仅当前用户可读写）
+        save_success = update_campus_account(username, password)
         
         if save_success:
             return jsonify({'success': True, 'message': '账户信息更新成功'})
@@ -553,6 +710,7 @@ def update_campus_account_api():
 @app.route('/api/cookie/clear', methods=['POST'])
 def clear_cookie():
     """清空Cookie"""
+    from qiangpiao import update_cookie_in_file, cookie_holder
     try:
         print("开始清空Cookie...")
         
@@ -562,6 +720,7 @@ def clear_cookie():
             success = clear_cookie_in_file()
             
             if success:
+                cookie_holder.refresh()
                 print("✅ Cookie清空成功")
                 return jsonify({
                     'success': True, 
@@ -590,229 +749,68 @@ def clear_cookie():
         return jsonify({'success': False, 'message': f'清空失败: {str(e)}'})
 
 def booking_worker(stop_event):
-    """抢票工作线程"""
+    """抢票工作线程：运行共用的抢票引擎，把引擎事件同步到 booking_state"""
+    from qiangpiao import BookingEngine, ENGINE_STOPPED, ENGINE_COMPLETED, ENGINE_LIMIT_REACHED
+    max_bookings = 2
+    
+    def update_status(**changes):
+        # 已被新的一次抢票取代时（停止后立即重新开始），不再覆盖新一次的状态
+        return booking_state.update_for(stop_event, **changes)
+    
+    def on_engine_event(event, data):
+        if event == 'query':
+            update_status(retry_count=data['retry_count'], current_status=f'第{data["retry_count"]}次查询中...',
+                          next_query_at=None)
+        elif event == 'slots':
+            # 只在可约场地变化时更新状态
+            if data['groups']:
+                opened = f'（新开放{len(data["opened"])}个）' if data['opened'] else ''
+                update_status(current_status=f'发现{len(data["available"])}个可用场地{opened}，开始预约...')
+            elif not data['available']:
+                update_status(current_status='暂无可预约时段，继续监控...')
+        elif event == 'booking':
+            slot = data['slot']
+            update_status(current_status=f'尝试预约: {slot.time_slot} - {slot.venue_name}')
+        elif event == 'booked':
+            update_status(
+                results=engine.bookings,
+                current_status=f'预约成功！已预约{len(engine.bookings)}/{max_bookings}个时间段'
+            )
+        elif event == 'booking_failed':
+            result = data['result']
+            update_status(
+                current_status=f'时间段{data["slot"].time_slot}预约失败，继续尝试下一个...',
+                last_error=result.msg
+            )
+        elif event == 'waiting':
+            # 同一次等待内 next_query_at 不变，只有第一次会产生状态变化
+            update_status(current_status='等待中...', next_query_at=round(data['next_query_at'], 3))
+        elif event == 'error':
+            update_status(current_status=f'执行错误: {str(data["error"])}', last_error=str(data['error']))
+    
+    engine = BookingEngine(max_bookings=max_bookings, stop_event=stop_event, on_event=on_engine_event)
+    
     try:
-        max_bookings = 2
-        successful_bookings = []
-        
-        while (booking_status['running'] and 
-               booking_status['retry_count'] < CONFIG['MAX_RETRY_TIMES'] and
-               not stop_event.is_set()):  # 检查停止信号
-            try:
-                booking_status['retry_count'] += 1
-                booking_status['current_status'] = f'第{booking_status["retry_count"]}次查询中...'
-                
-                # 如果已经预约满了
-                if len(successful_bookings) >= max_bookings:
-                    booking_status['current_status'] = f'已成功预约{max_bookings}个时间段'
-                    booking_status['running'] = False
-                    break
-                
-                # 检查停止信号
-                if stop_event.is_set():
-                    break
-                
-                available_slots = get_available_slots()
-                
-                if available_slots:
-                    booking_status['current_status'] = f'发现{len(available_slots)}个可用时段，开始预约...'
-                    
-                    # 过滤已预约的时间段
-                    booked_time_slots = [b['time_slot'] for b in successful_bookings]
-                    remaining_slots = [s for s in available_slots if s['time_slot'] not in booked_time_slots]
-                    
-                    if remaining_slots:
-                        # 按时间段分组
-                        time_slot_groups = {}
-                        for slot in remaining_slots:
-                            if slot['time_slot'] not in time_slot_groups:
-                                time_slot_groups[slot['time_slot']] = []
-                            time_slot_groups[slot['time_slot']].append(slot)
-                        
-                        # 尝试预约
-                        for time_slot in CONFIG["PREFERRED_TIMES"]:
-                            if not booking_status['running'] or stop_event.is_set():
-                                break
-                            
-                            if len(successful_bookings) >= max_bookings:
-                                break
-                            
-                            if time_slot in booked_time_slots:
-                                continue
-                            
-                            if time_slot in time_slot_groups:
-                                slots_in_time = time_slot_groups[time_slot]
-                                first_slot = slots_in_time[0]
-                                
-                                booking_status['current_status'] = f'尝试预约: {time_slot} - {first_slot["venue_name"]}'
-                                
-                                success = book_slot(first_slot['wid'], first_slot['name'])
-                                
-                                if success:
-                                    booking_record = {
-                                        'time_slot': first_slot['time_slot'],
-                                        'venue_name': first_slot['venue_name'],
-                                        'slot_name': first_slot['name'],
-                                        'timestamp': datetime.now().strftime('%H:%M:%S')
-                                    }
-                                    successful_bookings.append(booking_record)
-                                    booking_status['results'] = successful_bookings
-                                    
-                                    booking_status['current_status'] = f'预约成功！已预约{len(successful_bookings)}/{max_bookings}个时间段'
-                                    
-                                    if len(successful_bookings) >= max_bookings:
-                                        booking_status['running'] = False
-                                        break
-                                    
-                                    # 可中断的延迟
-                                    if stop_event.wait(1):  # 等待1秒或收到停止信号
-                                        break
-                                else:
-                                    # 检查是否是预约上限错误
-                                    booking_status['current_status'] = f'时间段{time_slot}预约失败，继续尝试下一个...'
-                                    
-                                    # 如果检测到预约上限，停止尝试
-                                    if "只能预订2次" in booking_status['current_status'] or "已预订2次" in str(booking_status.get('last_error', '')):
-                                        booking_status['current_status'] = '🎊 已达到当日预约上限！'
-                                        booking_status['running'] = False
-                                        break
-                                    
-                                    # 可中断的延迟
-                                    if stop_event.wait(1):
-                                        break
-                
-                else:
-                    booking_status['current_status'] = '暂无可预约时段，继续监控...'
-                
-                # 可中断的等待
-                if booking_status['running'] and len(successful_bookings) < max_bookings:
-                    for i in range(CONFIG['RETRY_INTERVAL']):
-                        if not booking_status['running'] or stop_event.is_set():
-                            break
-                        booking_status['current_status'] = f'等待中... {CONFIG["RETRY_INTERVAL"]-i}秒后重试'
-                        if stop_event.wait(1):  # 等待1秒或收到停止信号
-                            break
-                
-            except Exception as e:
-                booking_status['current_status'] = f'执行错误: {str(e)}'
-                booking_status['last_error'] = str(e)
-                # 可中断的延迟
-                if stop_event.wait(CONFIG['RETRY_INTERVAL']):
-                    break
+        final_state = engine.run()
         
         # 设置最终状态
-        if stop_event.is_set():
-            booking_status['current_status'] = '⛔ 用户手动停止'
-        elif len(successful_bookings) >= max_bookings:
-            booking_status['current_status'] = f'✅ 抢票完成！成功预约{len(successful_bookings)}个时间段'
+        count = len(engine.bookings)
+        if final_state == ENGINE_STOPPED:
+            final_status = '⛔ 用户手动停止'
+        elif final_state == ENGINE_COMPLETED:
+            final_status = f'✅ 抢票完成！成功预约{count}个时间段'
+        elif final_state == ENGINE_LIMIT_REACHED:
+            final_status = f'🎊 已达到当日预约上限！本次成功预约{count}个时间段'
         else:
-            booking_status['current_status'] = f'⏰ 达到最大重试次数，当前预约{len(successful_bookings)}个时间段'
+            final_status = f'⏰ 达到最大重试次数，当前预约{count}个时间段'
         
-        booking_status['running'] = False
+        update_status(current_status=final_status, running=False, next_query_at=None)
         
     except Exception as e:
-        booking_status['current_status'] = f'❌ 程序错误: {str(e)}'
-        booking_status['running'] = False
-
-def save_config_to_file():
-    """保存配置到文件"""
-    try:
-        # 获取项目名称（通过代码查找）
-        sport_name = "未知项目"
-        for name, code in SPORT_CODES.items():
-            if code == CONFIG['XMDM']:
-                sport_name = name
-                break
-        
-        # 获取校园网账户信息
-        campus_account = get_campus_account()
-        
-        config_content = f'''# 配置文件
-from datetime import datetime, timedelta
-
-current_date = datetime.now()
-# 计算目标日期（当前日期 + 1 天）
-target_date = current_date + timedelta(days=1)
-# 格式化目标日期为字符串
-target_date = target_date.strftime('%Y-%m-%d')
-
-# 基础配置
-CONFIG = {{
-    # 查询参数
-    "XQ": "{CONFIG['XQ']}",        # 校区：1=粤海, 2=丽湖
-    "YYLX": "1.0",    # 预约类型
-    "XMDM": "{CONFIG['XMDM']}",    # 项目代码：001=羽毛球  003=排球 004=网球 005=篮球 009=游泳 013=乒乓球 016=桌球
-    
-    # 运行参数
-    "MAX_RETRY_TIMES": {CONFIG['MAX_RETRY_TIMES']},    # 最大重试次数
-    "RETRY_INTERVAL": {CONFIG['RETRY_INTERVAL']},       # 重试间隔（秒）
-    "REQUEST_TIMEOUT": 10,     # 请求超时时间（秒）
-    # 预约日期
-    "TARGET_DATE": "{CONFIG['TARGET_DATE']}",
-
-    # 优先预约的时段关键词（按优先级排序）
-    "PREFERRED_TIMES": {CONFIG['PREFERRED_TIMES']},
-    
-    # 用户信息配置
-    "USER_INFO": {{
-        "YYRGH": "{CONFIG['USER_INFO']['YYRGH']}",  # 学号/工号
-        "YYRXM": "{CONFIG['USER_INFO']['YYRXM']}"   # 姓名
-    }}
-}}
-
-# 项目代码映射
-SPORT_CODES = {{
-    "羽毛球": "001",
-    "排球": "003",
-    "网球": "004",
-    "篮球": "005",
-    "游泳": "009",
-    "乒乓球": "013",
-    "桌球": "016"
-}}
-
-# 校区代码映射
-CAMPUS_CODES = {{
-    "粤海": "1",
-    "丽湖": "2"
-}}
-
-# 可选时间段（每小时一个时段）
-TIME_SLOTS = [
-    "08:00-09:00", "09:00-10:00", "10:00-11:00", "11:00-12:00",
-    "12:00-13:00", "13:00-14:00", "14:00-15:00", "15:00-16:00",
-    "16:00-17:00", "17:00-18:00", "18:00-19:00", "19:00-20:00",
-    "20:00-21:00", "21:00-22:00"
-]
-
-# 校园网账户
-CAMPUS_ACCOUNT = {{
-    "username": "{campus_account['username']}",  # 学号或工号
-    "password": "{campus_account['password']}"
-}}
-
-# 导出配置供其他模块使用
-def get_campus_account():
-    """获取校园网账户信息"""
-    return CAMPUS_ACCOUNT.copy()
-
-def update_campus_account(username, password):
-    """更新校园网账户信息"""
-    global CAMPUS_ACCOUNT
-    CAMPUS_ACCOUNT["username"] = username
-    CAMPUS_ACCOUNT["password"] = password
-    return True
-'''
-        
-        with open('config.py', 'w', encoding='utf-8') as f:
-            f.write(config_content)
-        
-        return True
-    except Exception as e:
-        logging.error(f"保存配置失败: {e}")
-        return False
+        update_status(current_status=f'❌ 程序错误: {str(e)}', running=False, next_query_at=None)
 
 if __name__ == '__main__':
     # 启动前重置状态
     reset_booking_status()
+    cookie_monitor.start()
     app.run(debug=False, host='0.0.0.0', port=5000)